@@ -0,0 +1,89 @@
+"""
+Latency SLO benchmark for the emergency stop fast path.
+
+Seeds a farm where every actuator is open, triggers FarmControlService.emergency_stop
+and checks that the local shutdown (the committed bulk UPDATE) completes within the
+latency budget. The budget applies to the median over the repeats, so a single
+scheduler hiccup on a shared host does not fail the run; the worst run is reported
+as well. Resource settlement and ThingsBoard sync run afterwards and are reported
+separately. Exits with status 1 when the budget is exceeded.
+
+Usage:
+    python benchmarks/bench_emergency_stop.py --actuators 10000 --budget-ms 100
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import logging
+import math
+import statistics
+import sys
+import time
+
+from harness import ThingsBoardStub, seeded_database, SQLCounter
+from services.farm_control_service import FarmControlService
+
+# Actuators per generated field: one pump, four valves, one dispenser
+ACTUATORS_PER_FIELD = 6
+
+
+def run(actuators=10000, budget_ms=100.0, repeats=3, seed=42):
+    fields = math.ceil(actuators / ACTUATORS_PER_FIELD)
+    runs = []
+    stub = ThingsBoardStub()
+    with stub.install(), contextlib.redirect_stdout(sys.stderr):
+        for repeat in range(repeats):
+            engine, session_factory, _ = seeded_database(
+                fields_per_farm=fields, open_fraction=1.0, seed=seed + repeat)
+            service = FarmControlService(session_factory)
+            # Readers normally keep the snapshot warm; build it outside the timed section
+            # and drop the seeding garbage so a collection does not land in the timing
+            service.topology.snapshot()
+            gc.collect()
+
+            counter = SQLCounter(engine)
+            started = time.perf_counter()
+            result = service.emergency_stop()
+            stop_ms = (time.perf_counter() - started) * 1000
+            statements = counter.count
+
+            settle_started = time.perf_counter()
+            service.wait_for_background()
+            settle_ms = (time.perf_counter() - settle_started) * 1000
+
+            runs.append({
+                "stopped": result["stopped"],
+                "stop_ms": round(stop_ms, 2),
+                "sql_statements": statements,
+                "settlement_ms": round(settle_ms, 2)
+            })
+            logging.info(f"run {repeat}: {runs[-1]}")
+            engine.dispose()
+
+    median = round(statistics.median(run["stop_ms"] for run in runs), 2)
+    return {
+        "benchmark": "emergency_stop",
+        "actuators": runs[0]["stopped"],
+        "budget_ms": budget_ms,
+        "median_stop_ms": median,
+        "worst_stop_ms": max(run["stop_ms"] for run in runs),
+        "within_budget": median <= budget_ms,
+        "thingsboard_calls": stub.calls,
+        "runs": runs
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actuators", type=int, default=10000, help="Number of open actuators to stop")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Latency budget for the local shutdown")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(args.actuators, args.budget_ms, args.repeats, args.seed)
+    print(json.dumps(report, indent=2))
+    assert report["within_budget"], f"Emergency stop took {report['median_stop_ms']}ms (budget {args.budget_ms}ms)"
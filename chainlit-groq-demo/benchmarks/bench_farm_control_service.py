@@ -0,0 +1,106 @@
+"""
+Scaling benchmark for FarmControlService.
+
+Seeds a synthetic farm per topology size, stubs out ThingsBoard so results are
+not network-bound and records wall time, SQL statement count, peak memory and
+serialized payload size per service method. Results are emitted as JSON.
+
+Usage:
+    python benchmarks/bench_farm_control_service.py --fields 5,20,50 --output bench.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import platform
+import sys
+
+from sqlalchemy import update
+
+from harness import ThingsBoardStub, seeded_database, measure
+from models.models import Resource
+from services.farm_control_service import FarmControlService
+
+
+def benchmark_cases(service, topology):
+    fields = topology["fields"]
+    valves = [a for a in topology["actuators"] if a["type"] == "water_valves" and a["status"] == "close"]
+    valve_ids = [valve["id"] for valve in valves]
+    field_name = fields[len(fields) // 2]["name"]
+    # One 15-30 minute run per field: every field has its own pump and a full water tank
+    demands = [{"field_id": field["id"], "volume": 100 + 25 * (i % 7), "priority": i % 3,
+                "window": {"start": "05:00", "end": "10:00"} if i % 2 else None}
+               for i, field in enumerate(fields)]
+
+    def plan_irrigation(run):
+        plan = service.plan_irrigation(demands)
+        if len(plan["scheduled"]) != len(demands):
+            raise RuntimeError(f"plan_irrigation placed {len(plan['scheduled'])} of {len(demands)} runs: "
+                               f"{plan['unscheduled'][:3]}")
+        return plan
+
+    return {
+        "get_all_farms": lambda run: service.get_all_farms(),
+        "get_farm_summary": lambda run: service.get_farm_summary(),
+        "get_actuators_by_field_name": lambda run: service.get_actuators_by_field_name(field_name),
+        # Before the cases that open valves and drain the tanks
+        "plan_irrigation": plan_irrigation,
+        "update_actuator_status": lambda run: service.update_actuator_status(valves[run]["id"], "open"),
+        "update_actuator_statuses": lambda run: service.update_actuator_statuses(valve_ids, "open" if run == 0 else "close"),
+        "update_all_open_actuator_resources": lambda run: service.update_all_open_actuator_resources(),
+    }
+
+
+def run(field_counts, farms=1, open_fraction=0.2, seed=42, methods=None):
+    results = []
+    stub = ThingsBoardStub()
+    # The service prints diagnostics; keep stdout clean for the JSON report
+    with stub.install(), contextlib.redirect_stdout(sys.stderr):
+        for field_count in field_counts:
+            engine, session_factory, topology = seeded_database(
+                farms=farms, fields_per_farm=field_count, water_tanks_per_farm=field_count,
+                open_fraction=open_fraction, seed=seed)
+            with session_factory() as session:
+                session.execute(update(Resource).values(current_level=Resource.capacity))
+                session.commit()
+            service = FarmControlService(session_factory)
+            size = {name: len(rows) for name, rows in topology.items()}
+            for name, case in benchmark_cases(service, topology).items():
+                if methods and name not in methods:
+                    continue
+                metrics = measure(engine, case)
+                results.append({"method": name, "fields": field_count * farms, "topology": size, **metrics})
+                logging.info(f"{name} @ {field_count * farms} fields: {metrics}")
+            engine.dispose()
+
+    return {
+        "benchmark": "farm_control_service",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "seed": seed,
+        "thingsboard_calls": stub.calls,
+        "results": results
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fields", default="5,20,50", help="Comma separated fields-per-farm sizes")
+    parser.add_argument("--farms", type=int, default=1)
+    parser.add_argument("--open-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--methods", help="Comma separated subset of service methods to run")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    methods = args.methods.split(",") if args.methods else None
+    report = run([int(size) for size in args.fields.split(",")], args.farms, args.open_fraction, args.seed, methods)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
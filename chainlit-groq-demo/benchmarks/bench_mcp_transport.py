@@ -0,0 +1,166 @@
+"""
+Tool-call latency: a server process per call over stdio vs one long-lived
+networked server.
+
+Seeds a farm database in a temporary directory and serves it with
+farm_control_server.py in two ways:
+
+- spawn: the client's former fallback, a new server process over stdio for every
+  call (interpreter start, imports, Whisper load, init_db, MCP handshake, call)
+- http: one long-lived server on streamable HTTP; each simulated chat session
+  holds one MCPConnection and calls over it, `--sessions` sessions concurrently
+
+Reports per-call latency percentiles for both, the server start-up time and the
+p50 speed-up. The servers use the configured ThingsBoard host, so only read-only
+tools that stay local are called.
+
+Usage:
+    python benchmarks/bench_mcp_transport.py --calls 30 --sessions 4 --spawn-calls 5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import seeded_database
+from utils.mcp_connection import MCPConnection
+
+SERVER = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/farm_control_server.py'))
+
+
+def _summary(samples):
+    times = sorted(samples)
+    return {
+        "calls": len(times),
+        "p50_ms": round(times[len(times) // 2] * 1000, 2),
+        "p95_ms": round(times[min(int(len(times) * 0.95), len(times) - 1)] * 1000, 2),
+        "max_ms": round(times[-1] * 1000, 2)
+    }
+
+
+def tool_calls(topology, calls):
+    field = topology["fields"][0]
+    cycle = [
+        ("find_field_by_name", {"field_name": field["name"]}),
+        ("get_field_actuators", {"field_id": field["id"]}),
+        ("get_resource_levels", {})
+    ]
+    return [cycle[i % len(cycle)] for i in range(calls)]
+
+
+async def _call(connection, name, arguments):
+    result = await connection.call_tool(name, arguments)
+    if result.isError:
+        raise RuntimeError(f"{name} failed: {result.content}")
+
+
+async def spawn_per_call(directory, calls):
+    latencies = []
+    for name, arguments in calls:
+        started = time.perf_counter()
+        connection = MCPConnection(url="", server_script=SERVER, cwd=directory)
+        try:
+            await _call(connection, name, arguments)
+        finally:
+            await connection.close()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def long_lived(url, calls, sessions):
+    connections = [MCPConnection(url=url) for _ in range(sessions)]
+    await asyncio.gather(*(connection.connect() for connection in connections))
+    latencies = []
+
+    async def chat_session(connection):
+        for name, arguments in calls:
+            started = time.perf_counter()
+            await _call(connection, name, arguments)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat_session(connection) for connection in connections))
+    wall = time.perf_counter() - started
+    for connection in connections:
+        await connection.close()
+    return latencies, wall
+
+
+@contextlib.contextmanager
+def networked_server(directory, timeout=120.0):
+    """Run the server on streamable HTTP; yields (url, seconds until it accepted connections)"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, SERVER, "--transport", "streamable-http", "--port", str(port)],
+        cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("Server did not start")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}/mcp", time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+async def run(fields=20, calls=30, sessions=4, spawn_calls=5, seed=42):
+    # The server opens farm_control.db in its working directory
+    directory = tempfile.mkdtemp(prefix="farm-bench-")
+    with contextlib.redirect_stdout(sys.stderr):
+        engine, _, topology = seeded_database(directory, filename="farm_control.db", fields_per_farm=fields, seed=seed)
+    engine.dispose()
+
+    spawn = await spawn_per_call(directory, tool_calls(topology, spawn_calls))
+    logging.info(f"spawn: {_summary(spawn)}")
+    with networked_server(directory) as (url, startup):
+        http, wall = await long_lived(url, tool_calls(topology, calls), sessions)
+    logging.info(f"http: {_summary(http)}")
+
+    spawn_summary, http_summary = _summary(spawn), _summary(http)
+    return {
+        "benchmark": "mcp_transport",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "fields": fields,
+        "spawn_per_call": spawn_summary,
+        "long_lived_http": {
+            **http_summary,
+            "sessions": sessions,
+            "server_startup_ms": round(startup * 1000, 2),
+            "calls_per_second": round(len(http) / wall, 1)
+        },
+        "p50_speedup": round(spawn_summary["p50_ms"] / max(http_summary["p50_ms"], 0.01), 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fields", type=int, default=20, help="Fields in the generated farm")
+    parser.add_argument("--calls", type=int, default=30, help="Calls per session on the long-lived server")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent client sessions on the long-lived server")
+    parser.add_argument("--spawn-calls", type=int, default=5, help="Calls with a server process each")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print(json.dumps(asyncio.run(run(args.fields, args.calls, args.sessions, args.spawn_calls, args.seed)), indent=2))
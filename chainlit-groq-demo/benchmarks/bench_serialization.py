@@ -0,0 +1,99 @@
+"""
+Serialization microbenchmark for large farms.
+
+Compares the recursive ORM path (selectin eager load, Farm.to_dict, str()) with
+tuple-based rows from services.serialization, both for the full farm tree and for
+a narrow field projection, and the JSON encoders on the same payload. Records wall
+time, SQL statement count, peak memory and output size per case.
+
+Usage:
+    python benchmarks/bench_serialization.py --fields 10000
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import platform
+import sys
+
+from sqlalchemy.orm import selectinload
+
+from harness import seeded_database, measure
+from models.models import Farm, Field
+from services import serialization
+
+SUMMARY_FIELDS = ["id", "name", "fields.id", "fields.name", "fields.crop", "fields.actuators.id",
+                  "fields.actuators.status"]
+
+
+def benchmark_cases(session_factory):
+    def orm_to_dict(run):
+        with session_factory() as session:
+            # Joined loads of the three child lists multiply into a cartesian product, and the
+            # models join their own relationships; Field.to_dict does not recurse past the children
+            farms = session.query(Farm).options(
+                selectinload(Farm.fields).options(
+                    selectinload(Field.sensors).lazyload("*"),
+                    selectinload(Field.actuators).lazyload("*"),
+                    selectinload(Field.resources).lazyload("*"))
+            ).all()
+            return str([farm.to_dict(include_related=True) for farm in farms])
+
+    def rows(fields):
+        def case(run):
+            with session_factory() as session:
+                return serialization.dumps(serialization.load_tree(session, "farm", fields))
+        return case
+
+    with session_factory() as session:
+        payload = serialization.load_tree(session, "farm")
+
+    return {
+        "orm_to_dict_str": orm_to_dict,
+        "rows_full_dumps": rows(None),
+        "rows_projected_dumps": rows(SUMMARY_FIELDS),
+        "encode_json_default_str": lambda run: json.dumps(payload, default=str),
+        "encode_dumps": lambda run: serialization.dumps(payload),
+    }
+
+
+def run(fields=10000, seed=42):
+    results = []
+    # The importer logs progress; keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        engine, session_factory, topology = seeded_database(fields_per_farm=fields, seed=seed)
+        for name, case in benchmark_cases(session_factory).items():
+            metrics = measure(engine, case)
+            # measure() sizes the payload by re-encoding it; report the string we produced
+            metrics["output_bytes"] = len(case(0))
+            del metrics["payload_bytes"]
+            results.append({"case": name, "fields": fields, **metrics})
+            logging.info(f"{name} @ {fields} fields: {metrics}")
+        engine.dispose()
+
+    return {
+        "benchmark": "serialization",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "orjson": serialization.orjson is not None,
+        "seed": seed,
+        "results": results
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fields", type=int, default=10000, help="Fields in the generated farm")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    output = json.dumps(run(args.fields, args.seed), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
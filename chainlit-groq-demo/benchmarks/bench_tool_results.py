@@ -0,0 +1,92 @@
+"""
+Tool-result size benchmark: Python repr vs compact JSON.
+
+For a set of representative tool calls on a seeded farm, compares what the LLM
+received before (the tool's str() output, wrapped by the client in a
+{"content": [{"type": "text", "text": ...}]} JSON document) with the compact JSON
+the tools return now and the client forwards unchanged. Reports bytes and tokens
+per tool; tokens are counted with tiktoken (cl100k_base) when it is installed and
+estimated as bytes / 4 otherwise.
+
+Usage:
+    python benchmarks/bench_tool_results.py --fields 20
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import platform
+import sys
+
+from harness import ThingsBoardStub, seeded_database
+from services.farm_control_service import FarmControlService
+from services.serialization import dumps
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+
+def count_tokens(text):
+    return len(_encoding.encode(text)) if _encoding is not None else round(len(text.encode()) / 4)
+
+
+def tool_results(service, topology):
+    """Service results as the corresponding tools return them"""
+    field = topology["fields"][0]
+    valves = [a["id"] for a in topology["actuators"] if a["field_id"] == field["id"] and a["type"] == "water_valves"]
+    return {
+        "get_farm_details": service.get_farm_by_id(topology["farms"][0]["id"]),
+        "find_field_by_name": service.get_field_by_name(field["name"]),
+        "get_field_actuators": service.get_actuators_by_field(field["id"]),
+        "get_field_sensors": service.get_sensors_by_field(field["id"]),
+        "get_resource_levels": service.get_resource_levels(),
+        "get_actuator_status": service.get_actuator_by_id(valves[0]),
+        "batch_control_actuators": service.update_actuator_statuses(valves, "open"),
+    }
+
+
+def run(fields=20, seed=42):
+    results = []
+    with ThingsBoardStub().install(), contextlib.redirect_stdout(sys.stderr):
+        engine, session_factory, topology = seeded_database(fields_per_farm=fields, seed=seed)
+        service = FarmControlService(session_factory)
+        for tool, result in tool_results(service, topology).items():
+            before = json.dumps({"content": [{"type": "text", "text": str(result)}]})
+            after = dumps(result)
+            results.append({
+                "tool": tool,
+                "before_bytes": len(before.encode()),
+                "after_bytes": len(after.encode()),
+                "before_tokens": count_tokens(before),
+                "after_tokens": count_tokens(after)
+            })
+            results[-1]["token_reduction"] = round(1 - results[-1]["after_tokens"] / max(results[-1]["before_tokens"], 1), 3)
+            logging.info(f"{tool}: {results[-1]}")
+        service.wait_for_background()
+        engine.dispose()
+
+    return {
+        "benchmark": "tool_results",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "tokenizer": "cl100k_base" if _encoding is not None else "bytes/4 estimate",
+        "fields": fields,
+        "total_before_tokens": sum(r["before_tokens"] for r in results),
+        "total_after_tokens": sum(r["after_tokens"] for r in results),
+        "results": results
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fields", type=int, default=20, help="Fields in the generated farm")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print(json.dumps(run(args.fields, args.seed), indent=2))
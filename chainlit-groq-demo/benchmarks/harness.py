@@ -0,0 +1,116 @@
+"""
+Shared helpers for the farm control benchmarks: a ThingsBoard HTTP stub, a SQL
+statement counter and a seeded temporary database built from the synthetic
+farm generator.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import contextlib
+import json
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+from models.models import init_db, get_session_factory
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import utils.thingsboard as thingsboard
+
+
+class _StubResponse:
+    status_code = 200
+    text = "ok"
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class ThingsBoardStub:
+    """Replace the HTTP calls made by utils.thingsboard with instant local responses"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = {"get": 0, "post": 0}
+
+    def _get(self, url, **kwargs):
+        self.calls["get"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return _StubResponse({"credentialsId": "stub-device-token"})
+
+    def _post(self, url, **kwargs):
+        self.calls["post"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return _StubResponse({"token": "stub-jwt", "id": {"id": "stub-device"}})
+
+    @contextlib.contextmanager
+    def install(self):
+        original = (thingsboard.requests.get, thingsboard.requests.post, thingsboard.jwt_token)
+        thingsboard.requests.get, thingsboard.requests.post = self._get, self._post
+        thingsboard.jwt_token = None
+        thingsboard.device_token_cache.clear()
+        try:
+            yield self
+        finally:
+            thingsboard.requests.get, thingsboard.requests.post, thingsboard.jwt_token = original
+            thingsboard.device_token_cache.clear()
+
+
+class SQLCounter:
+    """Count statements executed on an engine"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def seeded_database(directory=None, filename="bench.db", **generator_args):
+    """Create a SQLite database seeded with a generated topology"""
+    directory = directory or tempfile.mkdtemp(prefix="farm-bench-")
+    engine = init_db(os.path.join(directory, filename))
+    session_factory = get_session_factory(engine)
+    topology = generate_farm_topology(**generator_args)
+    report = TopologyImporter(session_factory).import_topology(topology)
+    if "error" in report:
+        raise RuntimeError(f"Seeding failed: {report}")
+    return engine, session_factory, topology
+
+
+def measure(engine, fn):
+    """
+    Run `fn` twice: once for wall time and SQL statement count, once under
+    tracemalloc for peak memory.
+
+    `fn` receives the run number (0 or 1) so mutating cases can pick a different
+    target per run.
+    """
+    counter = SQLCounter(engine)
+    started = time.perf_counter()
+    result = fn(0)
+    wall = time.perf_counter() - started
+    statements = counter.count
+    event.remove(engine, "before_cursor_execute", counter._on_execute)
+
+    tracemalloc.start()
+    fn(1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall_ms": round(wall * 1000, 3),
+        "sql_statements": statements,
+        "peak_memory_kb": round(peak / 1024, 1),
+        "payload_bytes": len(json.dumps(result, default=str))
+    }
@@ -10,6 +10,7 @@ import os
 from typing import Dict, Any, List
 from groq import AsyncGroq
 from utils.chainlit_voice_integration import ChainlitVoiceIntegration
+from utils.mcp_connection import MCPConnection
 import logging
 
 # Initialize conversation history
@@ -18,49 +19,33 @@ mcp_tools_cache = {}
 
 logger = logging.getLogger("chainlit-voice")
 
+# Farm control server connection shared by all chat sessions: the networked server
+# at FARM_MCP_URL, or one farm_control_server.py process over stdio when it is unset
+mcp_connection = MCPConnection()
+
 
 async def connect_to_mcp_server():
     """Connect to the real MCP farm control server"""
-    from mcp import StdioServerParameters, ClientSession
-    from mcp.client.stdio import stdio_client
-    
     try:
-        print("🔧 Connecting to real MCP farm control server...")
+        print(f"🔧 Connecting to real MCP farm control server ({mcp_connection.transport})...")
         
-        # Create server parameters for the farm control server
-        server_params = StdioServerParameters(
-            command="python",
-            args=["farm_control_server.py"],
-            env=None,
-        )
+        # The connection stays open and is shared by every chat session
+        result = await mcp_connection.list_tools()
         
-        # Create a persistent connection that we can store
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                # Initialize the session
-                await session.initialize()
-                
-                # Get the real tools from the server
-                result = await session.list_tools()
-                
-                tools = [
-                    {
-                        "name": t.name,
-                        "description": t.description,
-                        "input_schema": t.inputSchema,
-                    }
-                    for t in result.tools
-                ]
-                
-                print(f"✅ Real MCP tools loaded: {len(tools)} tools available")
-                for tool in tools:
-                    print(f"   • {tool['name']}: {tool['description']}")
-                
-                # Store the session for later use
-                mcp_tools_cache["session"] = session
-                mcp_tools_cache["server_params"] = server_params
-                
-                return tools
+        tools = [
+            {
+                "name": t.name,
+                "description": t.description,
+                "input_schema": t.inputSchema,
+            }
+            for t in result
+        ]
+        
+        print(f"✅ Real MCP tools loaded: {len(tools)} tools available")
+        for tool in tools:
+            print(f"   • {tool['name']}: {tool['description']}")
+        
+        return tools
                 
     except Exception as e:
         print(f"❌ Failed to connect to real MCP server: {e}")
@@ -136,13 +121,10 @@ async def start():
 @cl.step(type="tool")
 async def execute_tool(tool_name: str, tool_input: Dict[str, Any]):
     """Execute a real MCP farm control tool."""
-    from mcp import StdioServerParameters, ClientSession
-    from mcp.client.stdio import stdio_client
-    
     print(f"🔧 Executing real tool: {tool_name} with input: {tool_input}")
     
     try:
-        # First try to use a cached session if available
+        # Tools of MCP servers added through the Chainlit UI use their own session
         for session_key, session in mcp_tools_cache.items():
             if session_key.startswith("session_") and session:
                 try:
@@ -150,26 +132,13 @@ async def execute_tool(tool_name: str, tool_input: Dict[str, Any]):
                     print(f"✅ Real tool result (cached session): {result}")
                     return result
                 except Exception as e:
-                    print(f"⚠️ Cached session failed, creating new connection: {e}")
+                    print(f"⚠️ Cached session failed, using the farm control server connection: {e}")
                     break
         
-        # Fallback: Create a new connection for each tool call
-        server_params = StdioServerParameters(
-            command="python",
-            args=["farm_control_server.py"],
-            env=None,
-        )
-        
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                # Initialize the session
-                await session.initialize()
-                
-                # Call the actual tool
-                result = await session.call_tool(tool_name, tool_input)
-                
-                print(f"✅ Real tool result (new session): {result}")
-                return result
+        # Shared long-lived connection to the farm control server
+        result = await mcp_connection.call_tool(tool_name, tool_input)
+        print(f"✅ Real tool result: {result}")
+        return result
                 
     except Exception as e:
         print(f"❌ Error executing real tool {tool_name}: {str(e)}")
@@ -205,11 +174,34 @@ async def format_tools_for_groq(tools: List[Dict[str, Any]]) -> List[Dict[str, A
     return groq_tools
 
 
+def _tool_result_text(result):
+    """The text of a tool result made of a single text item, else None"""
+    content = getattr(result, "content", None)
+    if isinstance(content, list) and len(content) == 1 and isinstance(getattr(content[0], "text", None), str):
+        return content[0].text
+    return None
+
+
 def serialize_tool_result(result):
-    """Helper function to serialize tool results for display."""
+    """
+    Helper function to serialize tool results for display.
+    
+    The farm control tools answer with compact JSON: MCP structured content when
+    the server provides it, otherwise a single JSON text item, which is returned
+    already parsed.
+    """
     if isinstance(result, dict):
         return result
-    elif hasattr(result, "content") and isinstance(result.content, list):
+    structured = getattr(result, "structuredContent", None)
+    if structured is not None:
+        return structured
+    text = _tool_result_text(result)
+    if text is not None:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return {"type": "text", "text": text}
+    if hasattr(result, "content") and isinstance(result.content, list):
         # Handle MCP CallToolResult with content list
         serialized_content = []
         for item in result.content:
@@ -234,6 +226,14 @@ def serialize_tool_result(result):
     return str(result)
 
 
+def tool_message_content(result):
+    """Tool result as sent to the LLM: the server's JSON text as is, without re-encoding"""
+    text = _tool_result_text(result)
+    if text is not None:
+        return text
+    return json.dumps(serialize_tool_result(result), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
 def format_farm_response(tool_name: str, result: Any, user_query: str) -> str:
     """Format tool results in a farm-friendly way, with audio widget and auto-playback for TTS."""
     try:
@@ -255,7 +255,9 @@ def format_farm_response(tool_name: str, result: Any, user_query: str) -> str:
             elif "audio_path" in serialized:
                 audio_path = serialized["audio_path"]
             else:
-                text_content = json.dumps(serialized, indent=2)
+                text_content = json.dumps(serialized, indent=2, ensure_ascii=False)
+        elif isinstance(serialized, list):
+            text_content = json.dumps(serialized, indent=2, ensure_ascii=False)
         else:
             text_content = str(serialized)
         # If this is a TTS tool, add an audio widget and auto-play if possible
@@ -424,7 +426,7 @@ async def on_message(message: cl.Message):
                             logger.warning(f"TTS audio file not found. Attempted paths: {attempted_paths}")
                             await cl.Message(content=f"⚠️ TTS audio file was not found or invalid. Attempted: {attempted_paths}").send()
                     # Add tool response to history
-                    tool_response_content = json.dumps(serialize_tool_result(tool_result))
+                    tool_response_content = tool_message_content(tool_result)
                     message_history.append({
                         "role": "tool",
                         "tool_call_id": tool_call.id,
@@ -1,12 +1,23 @@
 # farm_control_server_enhanced.py
 
 from mcp.server.fastmcp import FastMCP
+from mcp.types import ToolAnnotations
 from models.models import Farm, Field, Sensor, Actuator, Resource, get_session_factory, init_db
 from services.farm_control_service import FarmControlService
+from services.sensor_ingestion import SensorIngestionPipeline
+from services.serialization import stream_json, decode_cursor, dumps
+from services.tool_cache import ToolResultCache
+from services.tool_executor import ToolExecutor
+from services.resource_notifier import ResourceNotifier, RESOURCE_LEVELS_URI
 from utils.voice_utils import VoiceManager
+import argparse
+import datetime
 import json
 import logging
 import asyncio
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, 
@@ -16,16 +27,79 @@ logger = logging.getLogger('farm_control_server')
 # Initialize database and session factory
 session_factory = get_session_factory(init_db())
 farm_service = FarmControlService(session_factory)
+ingestion_pipeline = SensorIngestionPipeline(session_factory)
+
+# Results of read-only tools; writes committed by the service drop the entries they affect
+tool_cache = ToolResultCache(farm_service.topology, ttls={
+    "get_farm_overview": 300.0,
+    "get_farm_details": 30.0,
+    "get_fields_for_farm": 30.0,
+    "find_field_by_name": 60.0,
+    "get_field_crop_info": 300.0
+})
+farm_service.add_change_listener(tool_cache.on_change)
+
+# Update notifications of subscribed resources, one per resource per 250ms window
+resource_notifier = ResourceNotifier(farm_service.topology, window=0.25)
+farm_service.add_change_listener(resource_notifier.on_change)
 
 # Create FastMCP instance
 mcp = FastMCP("farm_control_server")
 
+# Blocking handlers run on worker threads rather than FastMCP's event loop. Long-running
+# admin tools have their own lane, and emergency stop never waits behind other calls
+tool_executor = ToolExecutor(lanes={"default": 8, "admin": 2, "priority": 1})
+
+# Default-lane tools run_batch may call: name -> (handler, read_only)
+batch_tools = {}
+
+def tool(lane="default", max_concurrent=None, read_only=False):
+    """
+    Register a blocking tool handler, run on `lane` of the tool executor.
+    Read-only tools are annotated as such for clients and may share a snapshot in run_batch.
+    """
+    def decorator(fn):
+        annotations = ToolAnnotations(readOnlyHint=True) if read_only else None
+        mcp.add_tool(tool_executor.wrap(fn, lane, max_concurrent), annotations=annotations)
+        if lane == "default":
+            batch_tools[fn.__name__] = (fn, read_only)
+        # The module keeps the plain function, callable from other handlers
+        return fn
+    return decorator
+
+def resource(uri, lane="default"):
+    """Register a blocking resource handler, run on `lane` of the tool executor"""
+    def decorator(fn):
+        mcp.resource(uri)(tool_executor.wrap(fn, lane))
+        return fn
+    return decorator
+
 # Initialize VoiceManager
 voice_manager = VoiceManager()
 
+# Byte budget of collection tool responses; larger results continue with next_cursor
+DEFAULT_RESPONSE_BYTES = 64 * 1024
+MAX_RESPONSE_BYTES = 1024 * 1024
+# Records per page of collection tools
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# Calls per run_batch request, and threads running a batch's reads concurrently
+MAX_BATCH_CALLS = 25
+batch_read_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="batch-read")
+
 # Track active operations for UI
 active_operations = {}
 
+# Resources projected to run dry within the forecast horizon
+depletion_alerts = []
+
+def _on_depletion_alert(alert):
+    logger.warning(f"Resource {alert['resource_name']} will run dry at {alert['depletes_at']}")
+    depletion_alerts.append(alert)
+    del depletion_alerts[:-50]
+
+farm_service.forecast.add_alert_listener(_on_depletion_alert)
+
 @mcp.prompt()
 def direct_control_instruction() -> str:
     """
@@ -41,7 +115,27 @@ def direct_control_instruction() -> str:
     6. Keep your responses concise and action-oriented
     """
 
-@mcp.resource("farms://search/{farm_name}")
+def _stream_response(records_for, cursor, max_bytes, collection, head=None, limit=None):
+    """
+    Stream records_for(after, fetch) into one JSON response of at most max_bytes
+    (clamped to MAX_RESPONSE_BYTES) and limit records (clamped to MAX_PAGE_SIZE),
+    with next_cursor set when it was cut short. records_for receives one more
+    than the limit as `fetch`, to tell whether the list continues.
+    """
+    try:
+        after = decode_cursor(cursor)
+    except ValueError as e:
+        return dumps({"error": str(e)})
+    max_bytes = min(max(max_bytes, 1024), MAX_RESPONSE_BYTES)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE) if limit else None
+    try:
+        records = records_for(after, limit + 1 if limit else None)
+        return b"".join(stream_json(records, max_bytes, collection, head, limit=limit)).decode()
+    except ValueError as e:
+        # Unknown projection fields
+        return dumps({"error": str(e)})
+
+@resource("farms://search/{farm_name}")
 def search_farms(farm_name: str) -> str:
     """
     Find farms whose names match or contain the search term.
@@ -50,25 +144,83 @@ def search_farms(farm_name: str) -> str:
         farm_name: e.g. "Green Valley"
 
     Returns:
-        JSON list of matching farms
+        JSON object with matching farms (id, name, address, fields) and next_cursor
     """
-    farms = farm_service.get_all_farms()
-    matching_farms = [farm for farm in farms if farm_name.lower() in farm['name'].lower()]
-    return str(matching_farms)
+    return _stream_response(
+        lambda after, fetch: farm_service.iter_farms("id,name,address,fields.id,fields.name,fields.crop",
+                                                     after=after, limit=fetch, name_contains=farm_name),
+        "", DEFAULT_RESPONSE_BYTES, "farms", limit=DEFAULT_PAGE_SIZE)
+
+# FastMCP has no subscription API; the handlers go on its low-level server, which
+# advertises resources without subscribe support unless told otherwise
+@mcp._mcp_server.subscribe_resource()
+async def subscribe_resource(uri) -> None:
+    resource_notifier.subscribe(str(uri), mcp.get_context().session)
+
+@mcp._mcp_server.unsubscribe_resource()
+async def unsubscribe_resource(uri) -> None:
+    resource_notifier.unsubscribe(str(uri), mcp.get_context().session)
+
+_get_capabilities = mcp._mcp_server.get_capabilities
+
+def _get_capabilities_with_subscribe(*args, **kwargs):
+    capabilities = _get_capabilities(*args, **kwargs)
+    if capabilities.resources is not None:
+        capabilities.resources.subscribe = True
+    return capabilities
 
-@mcp.resource("farms://all")
+mcp._mcp_server.get_capabilities = _get_capabilities_with_subscribe
+
+@resource("actuators://{actuator_id}")
+def actuator_state(actuator_id: str) -> str:
+    """Current status of an actuator. Subscribe to be notified when it changes."""
+    return dumps(farm_service.get_actuator_by_id(actuator_id) or {"error": f"Actuator {actuator_id} not found"})
+
+@resource("fields://{field_id}/state")
+def field_state(field_id: str) -> str:
+    """Sensors, actuator statuses and resource levels of a field. Subscribe to be notified when they change."""
+    return dumps(farm_service.get_field_by_id(field_id) or {"error": f"Field {field_id} not found"})
+
+@resource(RESOURCE_LEVELS_URI)
+def resource_levels() -> str:
+    """Current level of every resource. Subscribe to be notified when levels change."""
+    return dumps(farm_service.get_resource_levels())
+
+@resource("farms://all")
 def all_farms() -> str:
-    """List all farms in the system."""
-    farms = farm_service.get_all_farms()
-    return str(farms)
+    """List all farms in the system (continue with farms://all/{cursor} when next_cursor is set)."""
+    return all_farms_page("")
 
-@mcp.tool()
-def list_all_farms() -> str:
-    """Get a list of all registered farms."""
-    farms = farm_service.get_all_farms()
-    return str(farms)
+@resource("farms://all/{cursor}")
+def all_farms_page(cursor: str) -> str:
+    """Continue the farms://all listing from a next_cursor."""
+    return _stream_response(lambda after, fetch: farm_service.iter_farms(after=after, limit=fetch),
+                            cursor, DEFAULT_RESPONSE_BYTES, "farms", limit=DEFAULT_PAGE_SIZE)
 
-@mcp.tool()
+@tool(read_only=True)
+def list_all_farms(cursor: str = "", limit: int = DEFAULT_PAGE_SIZE, name_prefix: str = "", fields: str = "",
+                   max_bytes: int = DEFAULT_RESPONSE_BYTES) -> str:
+    """
+    Get a list of registered farms with their fields, sensors, actuators and resources.
+
+    Args:
+        cursor: next_cursor of the previous response, to continue a long list
+        limit: maximum number of farms
+        name_prefix: only farms whose name starts with this
+        fields: comma separated projection, e.g. "id,name,fields.id,fields.crop,fields.actuators.status";
+            empty for everything
+        max_bytes: response size limit
+
+    Returns:
+        JSON object with farms and next_cursor (null when complete); farms too large
+        for one response are listed under "skipped", use get_farm_details for them
+    """
+    return _stream_response(
+        lambda after, fetch: farm_service.iter_farms(fields or None, after=after, limit=fetch,
+                                                     name_prefix=name_prefix or None),
+        cursor, max_bytes, "farms", limit=limit)
+
+@tool(read_only=True)
 def get_farm_overview() -> str:
     """
     Get a summary of all farms, including their status and key metrics.
@@ -76,7 +228,11 @@ def get_farm_overview() -> str:
     Returns:
         JSON object with farm summaries
     """
-    farms = farm_service.get_all_farms()
+    # Farm and field names only change with the topology, which clears the cache
+    return tool_cache.get_or_compute("get_farm_overview", {}, _farm_overview)
+
+def _farm_overview():
+    farms = farm_service.get_all_farms(fields=["id", "name", "fields.id"])
     farm_summaries = []
     for farm in farms:
         summary = {
@@ -88,23 +244,35 @@ def get_farm_overview() -> str:
             "resources": farm.get("resources", {}),
         }
         farm_summaries.append(summary)
-    return str(farm_summaries)
+    return dumps(farm_summaries)
     
-@mcp.tool()
-def get_farm_details(farm_id: str) -> str:
+@tool(read_only=True)
+def get_farm_details(farm_id: str, cursor: str = "", limit: int = 0, fields: str = "",
+                     max_bytes: int = DEFAULT_RESPONSE_BYTES) -> str:
     """
     Get complete information about a specific farm.
 
     Args:
         farm_id: e.g. "1"
+        cursor: next_cursor of the previous response, to continue with more fields
+        limit: maximum number of fields (0: as many as fit in max_bytes)
+        fields: comma separated field projection, e.g. "id,name,crop,actuators.status"
+        max_bytes: response size limit
 
     Returns:
-        JSON object with farm details
+        JSON object with farm details, its fields and next_cursor (null when complete)
     """
-    farm = farm_service.get_farm_by_id(farm_id)
-    return str(farm)
+    args = {"farm_id": farm_id, "cursor": cursor, "limit": limit, "fields": fields, "max_bytes": max_bytes}
+    return tool_cache.get_or_compute("get_farm_details", args, lambda: _farm_details(**args), [("farm", farm_id)])
 
-@mcp.tool()
+def _farm_details(farm_id, cursor, limit, fields, max_bytes):
+    farm = farm_service.get_farm_by_id(farm_id, include_related=False)
+    if not farm:
+        return dumps({"error": f"Farm {farm_id} not found"})
+    return _stream_response(lambda after, fetch: farm_service.iter_fields(farm_id, fields or None, after=after, limit=fetch),
+                            cursor, max_bytes, "fields", head=farm, limit=limit)
+
+@tool(read_only=True)
 def get_fields_for_farm(farm_id: str) -> str:
     """
     Get all fields for a specific farm.
@@ -115,12 +283,20 @@ def get_fields_for_farm(farm_id: str) -> str:
     Returns:
         JSON list of field information
     """
+    return tool_cache.get_or_compute("get_fields_for_farm", {"farm_id": farm_id},
+                                     lambda: _fields_for_farm(farm_id), [("farm", farm_id)])
+
+def _fields_for_farm(farm_id):
     farm = farm_service.get_farm_by_id(farm_id)
     if farm and 'fields' in farm:
-        return str(farm['fields'])
-    return "No fields found for this farm"
+        return dumps(farm['fields'])
+    return dumps({"error": f"No fields found for farm {farm_id}"})
 
-@mcp.tool()
+def _field_tags(field_name):
+    """Cache tags of the fields with this name (an unknown name only changes with the topology)"""
+    return [("field", field_id) for field_id in farm_service.topology.snapshot().field_ids_by_name(field_name)]
+
+@tool(read_only=True)
 def get_sensor_data(sensor_id: str) -> str:
     """
     Retrieve latest sensor readings for a given sensor.
@@ -132,33 +308,104 @@ def get_sensor_data(sensor_id: str) -> str:
         JSON object with sensor metrics
     """
     sensor = farm_service.get_sensor_by_id(sensor_id)
-    return str(sensor)
+    return dumps(sensor or {"error": f"Sensor {sensor_id} not found"})
 
-@mcp.tool()
-def control_actuator(actuator_id: str, status: str) -> str:
+@tool()
+def ingest_sensor_readings(readings: list[dict]) -> str:
+    """
+    Ingest a bulk of sensor readings: store them locally and forward them to ThingsBoard.
+
+    Args:
+        readings: list of readings, e.g. [{"sensor_id": "S001", "key": "soil_moisture", "value": 41.2, "ts": 1718000000000}]
+            or {"sensor_id": "S001", "values": {"temperature": 21.5, "humidity": 60}} for several keys
+
+    Returns:
+        JSON object with accepted and rejected counts, per-reading errors, and the
+        positions of deferred readings to resend (deferred_indices)
+    """
+    result = ingestion_pipeline.ingest(readings, timeout=5.0)
+    return dumps(result)
+
+@tool(read_only=True)
+def get_ingestion_stats() -> str:
+    """Get per-stage throughput, queue depth and backpressure state of sensor ingestion."""
+    return dumps(ingestion_pipeline.get_stats())
+
+def _track_operations(actuator_ids, status, field_id=None):
+    """Update the active operations shown in the UI"""
+    for actuator_id in actuator_ids:
+        if status == "open":
+            active_operations[actuator_id] = {"type": "actuator", "status": "active", "field": field_id}
+        else:
+            active_operations.pop(actuator_id, None)
+    farm_service.versions.touch("operation", actuator_ids)
+
+def _track_applied(result, status, field_id=None):
+    """Track the actuators a batch status update changed or confirmed, not those that failed"""
+    if "error" in result:
+        return
+    applied = [actuator_id for actuator_id, outcome in result["results"].items() if "error" not in outcome]
+    _track_operations(applied, status, field_id)
+
+@tool()
+def control_actuator(actuator_id: str, status: str, idempotency_key: str = "") -> str:
     """
     Change the state of any actuator (e.g., pumps, dispensers) without confirmation.
+    Repeated or contradictory commands for the same actuator are coalesced.
 
     Args:
         actuator_id: e.g. "FD-0900"
         status: "open" or "close"
+        idempotency_key: optional key; retrying with the same key does not run the command again
 
     Returns:
         Confirmation message or error details
     """
     logger.info(f"Controlling actuator {actuator_id} to {status}")
     
-    # Update active operations tracking
-    if status == "open":
-        active_operations[actuator_id] = {"type": "actuator", "status": "active"}
-    else:
-        if actuator_id in active_operations:
-            del active_operations[actuator_id]
-    
-    result = farm_service.update_actuator_status(actuator_id, status)
-    return str(result)
+    if status not in ("open", "close", "changing state"):
+        return dumps({"error": "Invalid status. Must be one of ['open', 'close', 'changing state']"})
+    command = farm_service.commands.submit(actuator_id, status, idempotency_key or None)
+    result = farm_service.commands.wait(command["command_id"], timeout=10.0)
+    # A superseded command resolves to its successor, whose status is the one that took effect
+    if result and result["state"] == "applied":
+        _track_operations([actuator_id], result["status"])
+    return dumps(result)
 
-@mcp.tool()
+@tool(read_only=True)
+def get_command_status(command_id: int) -> str:
+    """
+    Look up an actuator command submitted by control_actuator.
+
+    Args:
+        command_id: the command_id returned by control_actuator
+
+    Returns:
+        JSON object with the command state (queued, running, applied, superseded, failed) and result
+    """
+    return dumps(farm_service.commands.get(command_id) or {"error": f"Command {command_id} not found"})
+
+@tool(read_only=True)
+def get_tool_cache_stats() -> str:
+    """Get hit/miss counters, size and invalidations of the read-only tool result cache."""
+    return dumps(tool_cache.get_stats())
+
+@tool(read_only=True)
+def get_tool_execution_stats() -> str:
+    """Get per-lane worker usage and per-tool call counts, queue times and run times of tool handlers."""
+    return dumps(tool_executor.get_stats())
+
+@tool(read_only=True)
+def get_subscription_stats() -> str:
+    """Get resource subscription counts and how many update notifications were sent, coalesced or failed."""
+    return dumps(resource_notifier.get_stats())
+
+@tool(read_only=True)
+def get_command_queue_stats() -> str:
+    """Get actuator command queue depth, coalescing/duplicate counts and time-to-apply percentiles."""
+    return dumps(farm_service.commands.get_stats())
+
+@tool()
 def batch_control_actuators(field_id: str, actuator_type: str, status: str) -> str:
     """
     Control multiple actuators in a field at once.
@@ -184,24 +431,14 @@ def batch_control_actuators(field_id: str, actuator_type: str, status: str) -> s
                 filtered_actuators.append(actuator)
         actuators = filtered_actuators
     
-    # Control each actuator
-    results = {}
-    for actuator in actuators:
-        actuator_id = actuator.get("id")
-        if actuator_id:
-            # Update tracking
-            if status == "open":
-                active_operations[actuator_id] = {"type": "actuator", "status": "active", "field": field_id}
-            else:
-                if actuator_id in active_operations:
-                    del active_operations[actuator_id]
-            
-            result = farm_service.update_actuator_status(actuator_id, status)
-            results[actuator_id] = result
-    
-    return str(results)
+    actuator_ids = [actuator["id"] for actuator in actuators if actuator.get("id")]
+    
+    # Control all actuators in one transaction
+    result = farm_service.update_actuator_statuses(actuator_ids, status)
+    _track_applied(result, status, field_id)
+    return dumps(result)
 
-@mcp.tool()
+@tool()
 def field_irrigation_control(field_name: str, action: str) -> str:
     """
     Control irrigation for a field by name with simplified commands.
@@ -221,48 +458,45 @@ def field_irrigation_control(field_name: str, action: str) -> str:
     # Find field by name
     field = farm_service.get_field_by_name(field_name)
     if not field:
-        return f"Field '{field_name}' not found"
+        return dumps({"error": f"Field '{field_name}' not found"})
     
     field_id = field.get("id")
     
     # Get irrigation actuators for the field (pumps and water valves)
     actuators = farm_service.get_actuators_by_field(field_id)
     
-    # Control irrigation actuators
-    results = {}
-    for actuator in actuators:
-        actuator_id = actuator.get("id")
-        actuator_type = actuator.get("type")
-        
-        # Only control water-related actuators (pumps and water valves)
-        if actuator_type in ["pumps", "water_valves"]:
-            # Update tracking
-            if status == "open":
-                active_operations[actuator_id] = {"type": "actuator", "status": "active", "field": field_id}
-            else:
-                if actuator_id in active_operations:
-                    del active_operations[actuator_id]
-                    
-            result = farm_service.update_actuator_status(actuator_id, status)
-            results[actuator_id] = result
-    
-    return str(results)
+    # Only control water-related actuators (pumps and water valves)
+    actuator_ids = [actuator["id"] for actuator in actuators if actuator.get("type") in ["pumps", "water_valves"]]
+    
+    result = farm_service.update_actuator_statuses(actuator_ids, status)
+    _track_applied(result, status, field_id)
+    return dumps(result)
 
-@mcp.tool()
-def get_field_actuators(field_id: str) -> str:
+@tool(read_only=True)
+def get_field_actuators(field_id: str, actuator_type: str = "", status: str = "", name_prefix: str = "",
+                        fields: str = "", cursor: str = "", limit: int = DEFAULT_PAGE_SIZE) -> str:
     """
-    Get all actuators associated with a field.
+    Get the actuators of a field.
 
     Args:
         field_id: e.g. "1"
+        actuator_type: only "pumps", "water_valves" or "fertilizer_dispensers"
+        status: only actuators in this status, "open" or "close"
+        name_prefix: only actuators whose name starts with this
+        fields: comma separated projection, e.g. "id,name,status"
+        cursor: next_cursor of the previous response
+        limit: maximum number of actuators
 
     Returns:
-        JSON list of actuators
+        JSON object with actuators and next_cursor (null when complete)
     """
-    actuators = farm_service.get_actuators_by_field(field_id)
-    return str(actuators)
+    return _stream_response(
+        lambda after, fetch: farm_service.iter_actuators(
+            fields or None, after=after, limit=fetch, status=status or None,
+            actuator_type=actuator_type or None, field_id=field_id, name_prefix=name_prefix or None),
+        cursor, DEFAULT_RESPONSE_BYTES, "actuators", limit=limit)
 
-@mcp.tool()
+@tool(read_only=True)
 def get_field_sensors(field_id: str) -> str:
     """
     Get all sensors associated with a field.
@@ -274,15 +508,118 @@ def get_field_sensors(field_id: str) -> str:
         JSON list of sensors
     """
     sensors = farm_service.get_sensors_by_field(field_id)
-    return str(sensors)
+    return dumps(sensors)
 
-@mcp.tool()
-def get_resource_levels() -> str:
-    """List current levels of all resources like water or fertilizer."""
-    levels = farm_service.get_resource_levels()
-    return str(levels)
+@tool(read_only=True)
+def get_resource_levels(since_version: str = "") -> str:
+    """
+    List current levels of resources like water or fertilizer.
 
-@mcp.tool()
+    Args:
+        since_version: version from a previous response; only resources that changed
+            since then are returned
+
+    Returns:
+        JSON object with version and resources by ID ("full": true when all are
+        included), or {"version", "not_modified": true} when nothing changed
+    """
+    return dumps(farm_service.get_resource_levels_since(since_version or None))
+
+@tool(read_only=True)
+def get_depletion_forecast(n: int = 5) -> str:
+    """
+    List the resources (tanks) projected to run dry first at current consumption.
+
+    Args:
+        n: number of resources to return, soonest first
+
+    Returns:
+        JSON object with projected level, consumption rate and depletion time per resource
+    """
+    forecast = farm_service.forecast.get_depletion_forecast(n)
+    forecast["recent_alerts"] = depletion_alerts[-10:]
+    return dumps(forecast)
+
+@tool(lane="admin", max_concurrent=2, read_only=True)
+def get_usage_report(scope: str = "actuator", ids: str = "", field_name: str = "", actuator_type: str = "",
+                     days: int = 7) -> str:
+    """
+    How long actuators ran and how much water/fertilizer was used, per day rollups.
+    E.g. "how long did the North Field pump run this week":
+    scope="actuator", field_name="North Field", actuator_type="pumps", days=7.
+
+    Args:
+        scope: "actuator", "field" or "resource"
+        ids: optional comma separated IDs of actuators, fields or resources
+        field_name: report on this field (or, with scope "actuator"/"resource", its actuators/tanks)
+        actuator_type: with scope "actuator": "pumps", "water_valves" or "fertilizer_dispensers"
+        days: number of days up to and including today
+
+    Returns:
+        JSON object with runtime (seconds and hours) and estimated volume (L) per ID
+    """
+    id_list = [item.strip() for item in ids.split(",") if item.strip()]
+    report = farm_service.get_usage_report(scope, id_list, field_name or None, actuator_type or None, days)
+    return dumps(report)
+
+def _parse_time(value):
+    return datetime.datetime.fromisoformat(value) if value else datetime.datetime.now()
+
+@tool(read_only=True)
+def get_actuator_events(after_seq: int = 0, limit: int = 100, actuator_id: str = "") -> str:
+    """
+    Read the actuator transition log (who changed what, when and why) in order.
+
+    Args:
+        after_seq: return events after this sequence number (use next_seq to continue)
+        limit: maximum number of events
+        actuator_id: optional actuator to filter by
+
+    Returns:
+        JSON object with events (seq, actuator_id, from, to, ts, cause, batch_id) and next_seq
+    """
+    return dumps(farm_service.event_log.read(after_seq, min(limit, 1000), actuator_id or None))
+
+@tool(read_only=True)
+def get_actuator_state_at(timestamp: str, actuator_ids: str = "") -> str:
+    """
+    Reconstruct actuator statuses as they were at a point in time.
+
+    Args:
+        timestamp: ISO date/time, e.g. "2025-06-02T06:30:00"
+        actuator_ids: optional comma separated actuator IDs (default: all)
+
+    Returns:
+        JSON object mapping actuator ID to its status and since when
+    """
+    ids = [actuator_id.strip() for actuator_id in actuator_ids.split(",") if actuator_id.strip()] or None
+    try:
+        state = farm_service.event_log.state_at(_parse_time(timestamp), ids)
+    except ValueError as e:
+        return dumps({"error": str(e)})
+    return dumps(state)
+
+@tool(read_only=True)
+def get_actuator_runtime(start: str, end: str = "", actuator_ids: str = "") -> str:
+    """
+    Total time actuators spent open in a period, from the transition log.
+
+    Args:
+        start: ISO date/time of the period start
+        end: ISO date/time of the period end (default: now)
+        actuator_ids: optional comma separated actuator IDs (default: all)
+
+    Returns:
+        JSON object mapping actuator ID to seconds open
+    """
+    ids = [actuator_id.strip() for actuator_id in actuator_ids.split(",") if actuator_id.strip()] or None
+    try:
+        runtime = farm_service.event_log.runtime(_parse_time(start), _parse_time(end), ids)
+    except ValueError as e:
+        return dumps({"error": str(e)})
+    return dumps(runtime)
+
+@tool()
 def update_resource_level(resource_id: str, new_level: float) -> str:
     """
     Set a new level for a resource.
@@ -295,9 +632,9 @@ def update_resource_level(resource_id: str, new_level: float) -> str:
         Confirmation or error message
     """
     result = farm_service.update_resource_level(resource_id, new_level)
-    return str(result)
+    return dumps(result)
 
-@mcp.tool()
+@tool(read_only=True)
 def get_actuator_status(actuator_id: str) -> str:
     """
     Check the current status of a specific actuator.
@@ -309,15 +646,56 @@ def get_actuator_status(actuator_id: str) -> str:
         JSON object with actuator status
     """
     actuator = farm_service.get_actuator_by_id(actuator_id)
-    return str(actuator)
+    return dumps(actuator or {"error": f"Actuator {actuator_id} not found"})
 
-@mcp.tool()
-def get_active_actuators() -> str:
-    """List all actuators that are currently turned on (open)."""
-    actuators = farm_service.get_active_actuators()
-    return str(actuators)
+@tool(read_only=True)
+def get_active_actuators(actuator_type: str = "", field_id: str = "", fields: str = "", cursor: str = "",
+                         limit: int = DEFAULT_PAGE_SIZE, max_bytes: int = DEFAULT_RESPONSE_BYTES,
+                         since_version: str = "") -> str:
+    """
+    List actuators that are currently turned on (open).
 
-@mcp.tool()
+    Args:
+        actuator_type: only "pumps", "water_valves" or "fertilizer_dispensers"
+        field_id: only actuators of this field
+        fields: comma separated projection, e.g. "id,name,field_id"
+        cursor: next_cursor of the previous response, to continue a long list
+        limit: maximum number of actuators
+        max_bytes: response size limit
+        since_version: version from a previous response; only actuators that opened
+            (under "actuators") or closed (under "removed") since then are returned
+
+    Returns:
+        JSON object with version, actuators and next_cursor (null when complete);
+        "full": false for a change list, {"version", "not_modified": true} when
+        nothing changed
+    """
+    token, changed = farm_service.versions.changes("actuator", since_version or None)
+    if changed is not None and not changed:
+        return dumps({"version": token, "not_modified": True})
+    if changed is not None and len(changed) <= MAX_PAGE_SIZE:
+        if actuator_type or field_id:
+            # Only changes the filtered list could have contained
+            actuators = farm_service.topology.snapshot().actuators
+            changed = {aid for aid in changed if aid in actuators
+                       and (not actuator_type or actuators[aid]["type"] == actuator_type)
+                       and (not field_id or actuators[aid]["field_id"] == field_id)}
+        try:
+            opened = list(farm_service.iter_actuators(
+                fields or None, status='open', actuator_type=actuator_type or None,
+                field_id=field_id or None, ids=changed))
+        except ValueError as e:
+            return dumps({"error": str(e)})
+        open_ids = {actuator["id"] for actuator in opened}
+        return dumps({"version": token, "full": False, "actuators": opened,
+                      "removed": sorted(changed - open_ids), "next_cursor": None})
+    return _stream_response(
+        lambda after, fetch: farm_service.iter_actuators(
+            fields or None, after=after, limit=fetch, status='open',
+            actuator_type=actuator_type or None, field_id=field_id or None),
+        cursor, max_bytes, "actuators", head={"version": token, "full": True}, limit=limit)
+
+@tool(read_only=True)
 def find_field_by_name(field_name: str) -> str:
     """
     Look up field info by field name.
@@ -328,17 +706,23 @@ def find_field_by_name(field_name: str) -> str:
     Returns:
         JSON object with field data
     """
+    return tool_cache.get_or_compute("find_field_by_name", {"field_name": field_name},
+                                     lambda: _find_field(field_name), _field_tags(field_name))
+
+def _find_field(field_name):
     field = farm_service.get_field_by_name(field_name)
-    return str(field)
+    return dumps(field or {"error": f"Field '{field_name}' not found"})
 
-@mcp.tool()
-def create_irrigation_schedule(field_id: str, schedule_data: str) -> str:
+@tool()
+def create_irrigation_schedule(field_id: str, schedule_data: dict) -> str:
     """
-    Set a new irrigation schedule for a field.
+    Set a new recurring irrigation schedule for a field.
 
     Args:
         field_id: ID of the field
-        schedule_data: JSON string with time and days
+        schedule_data: object with start_time, duration (minutes) and days;
+            optional jitter_seconds (spread the start) and catch_up ("remaining",
+            "full" or "skip": what to do with a start missed while the server was down)
 
     Example:
         {"field_id": "1", "schedule_data": {"start_time": "06:00", "duration": 30, "days": ["Monday", "Wednesday"]}}
@@ -347,9 +731,78 @@ def create_irrigation_schedule(field_id: str, schedule_data: str) -> str:
         Confirmation or scheduling errors
     """
     result = farm_service.create_irrigation_schedule(field_id, schedule_data)
-    return str(result)
+    return dumps(result)
 
-@mcp.tool()
+@tool(read_only=True)
+def list_irrigation_schedules(field_id: str = "") -> str:
+    """
+    List irrigation schedules with their next run, soonest first.
+
+    Args:
+        field_id: optional field ID to filter by
+
+    Returns:
+        JSON list of schedules
+    """
+    return dumps(farm_service.scheduler.list_schedules(field_id or None))
+
+@tool()
+def pause_irrigation_schedule(schedule_id: str, paused: bool = True) -> str:
+    """
+    Pause or resume an irrigation schedule. A running irrigation finishes normally.
+
+    Args:
+        schedule_id: e.g. "SCH-1a2b3c4d"
+        paused: true to pause, false to resume
+
+    Returns:
+        The updated schedule or an error
+    """
+    return dumps(farm_service.scheduler.set_paused(schedule_id, paused))
+
+@tool()
+def delete_irrigation_schedule(schedule_id: str) -> str:
+    """
+    Delete an irrigation schedule, stopping its irrigation if it is running.
+
+    Args:
+        schedule_id: e.g. "SCH-1a2b3c4d"
+
+    Returns:
+        Confirmation or an error
+    """
+    return dumps(farm_service.scheduler.delete_schedule(schedule_id))
+
+@tool(lane="admin", max_concurrent=2)
+def plan_irrigation(demand: list[dict], execute: bool = False, slot_minutes: int = 15,
+                    horizon_hours: int = 24, reserve_fraction: float = 0.1) -> str:
+    """
+    Plan irrigation for many fields at once, staggering runs so shared pumps are not
+    overloaded and tanks keep a reserve.
+
+    Args:
+        demand: list of {"field_id" or "field_name", "volume" (L) or
+            "duration_minutes", optional "priority" (higher first) and
+            "window" ({"start": "HH:MM", "end": "HH:MM"})}
+        execute: also schedule the planned runs (runs due now start immediately)
+        slot_minutes: planning resolution in minutes
+        horizon_hours: how far ahead runs may be placed
+        reserve_fraction: share of each tank's capacity to keep in reserve
+
+    Example:
+        {"demand": [{"field_name": "North Field", "volume": 2000, "window": {"start": "05:00", "end": "09:00"}}]}
+
+    Returns:
+        JSON plan with scheduled runs, unscheduled demands with reasons and pump/tank usage
+    """
+    try:
+        result = farm_service.plan_irrigation(demand, execute=execute, slot_minutes=slot_minutes,
+                                              horizon_hours=horizon_hours, reserve_fraction=reserve_fraction)
+    except (ValueError, TypeError) as e:
+        result = {"error": f"Invalid demand: {str(e)}"}
+    return dumps(result)
+
+@tool(lane="priority")
 def emergency_stop_all() -> str:
     """
     Stop all actuators immediately (emergency shutdown).
@@ -359,66 +812,76 @@ def emergency_stop_all() -> str:
     """
     logger.info("Emergency stop triggered - stopping all actuators")
     
-    # Get all active actuators
-    actuators = farm_service.get_active_actuators()
-    
-    # Stop each one
-    results = {}
-    for actuator in actuators:
-        actuator_id = actuator.get("id")
-        if actuator_id:
-            result = farm_service.update_actuator_status(actuator_id, "close")
-            results[actuator_id] = result
-            
-            # Update tracking
-            if actuator_id in active_operations:
-                del active_operations[actuator_id]
+    # Close everything in one UPDATE; settlement and ThingsBoard sync follow in the background
+    result = farm_service.emergency_stop()
+    
+    # Every actuator changed; the transitions are only published after settlement
+    tool_cache.invalidate()
     
     # Clear the active operations tracking
+    farm_service.versions.touch("operation", list(active_operations))
     active_operations.clear()
     
-    return str(results)
+    return dumps(result)
 
-@mcp.tool()
-def get_active_operations() -> str:
-    """
-    Get a list of currently active operations for the UI.
-    
-    Returns:
-        JSON object with active operations
-    """
-    # Format active operations for display
-    formatted_operations = []
-    
-    for actuator_id, operation in active_operations.items():
-        # Get actuator details
-        actuator = farm_service.get_actuator_by_id(actuator_id)
-        if actuator:
-            actuator_name = actuator.get("name", actuator_id)
-            actuator_type = actuator.get("type", "unknown")
-            field_id = operation.get("field", "unknown")
-            
-            # Get field name if possible
-            field_name = "Unknown Field"
-            if field_id != "unknown":
-                field = farm_service.get_field_by_id(field_id)
-                if field:
-                    field_name = field.get("name", field_id)
-            
-            # Format the operation description
-            operation_type = "Unknown operation"
-            if actuator_type == "pumps":
-                operation_type = "Pumping"
-            elif actuator_type == "water_valves":
-                operation_type = "Watering"
-            elif actuator_type == "fertilizer_dispensers":
-                operation_type = "Fertilizing"
-            
-            formatted_operations.append(f"{operation_type} in {field_name} ({actuator_name})")
-    
-    return json.dumps(formatted_operations)
+def _describe_operation(actuator_id, operation):
+    """UI description of an active operation, e.g. "Watering in North Field (Valve 1)" """
+    actuator = farm_service.get_actuator_by_id(actuator_id, include_related=False)
+    if not actuator:
+        return None
+    actuator_name = actuator.get("name", actuator_id)
+    actuator_type = actuator.get("type", "unknown")
+    field_id = operation.get("field") or actuator.get("field_id")
+    
+    # Get field name if possible
+    field_name = "Unknown Field"
+    if field_id:
+        field = farm_service.get_field_by_id(field_id, include_related=False)
+        if field:
+            field_name = field.get("name", field_id)
+    
+    # Format the operation description
+    operation_type = "Unknown operation"
+    if actuator_type == "pumps":
+        operation_type = "Pumping"
+    elif actuator_type == "water_valves":
+        operation_type = "Watering"
+    elif actuator_type == "fertilizer_dispensers":
+        operation_type = "Fertilizing"
+    
+    return f"{operation_type} in {field_name} ({actuator_name})"
 
-@mcp.tool()
+@tool(read_only=True)
+def get_active_operations(since_version: str = "") -> str:
+    """
+    Get the currently active operations for the UI.
+    
+    Args:
+        since_version: version from a previous response; only operations that started
+            (under "operations") or ended (under "removed") since then are returned
+    
+    Returns:
+        JSON object with version and operations by actuator ID ("full": true when all
+        are included), or {"version", "not_modified": true} when nothing changed
+    """
+    token, changed = farm_service.versions.changes("operation", since_version or None)
+    if changed is not None and not changed:
+        return dumps({"version": token, "not_modified": True})
+    
+    actuator_ids = list(active_operations) if changed is None else sorted(changed)
+    operations = {}
+    for actuator_id in actuator_ids:
+        operation = active_operations.get(actuator_id)
+        description = _describe_operation(actuator_id, operation) if operation else None
+        if description:
+            operations[actuator_id] = description
+    
+    result = {"version": token, "full": changed is None, "operations": operations}
+    if changed is not None:
+        result["removed"] = [actuator_id for actuator_id in actuator_ids if actuator_id not in operations]
+    return dumps(result)
+
+@tool(read_only=True)
 def get_field_crop_info(field_name: str) -> str:
     """
     Get crop information for a specific field.
@@ -429,9 +892,13 @@ def get_field_crop_info(field_name: str) -> str:
     Returns:
         JSON object with crop details
     """
+    return tool_cache.get_or_compute("get_field_crop_info", {"field_name": field_name},
+                                     lambda: _field_crop_info(field_name), _field_tags(field_name))
+
+def _field_crop_info(field_name):
     field = farm_service.get_field_by_name(field_name)
     if not field:
-        return f"Field '{field_name}' not found"
+        return dumps({"error": f"Field '{field_name}' not found"})
     
     crop_info = {
         "field_name": field.get("name"),
@@ -452,9 +919,111 @@ def get_field_crop_info(field_name: str) -> str:
                 "unit": sensor.get("unit", "")
             }
     
-    return json.dumps(crop_info)
+    return dumps(crop_info)
 
-@mcp.tool()
+def _batch_call_name(call):
+    """The tool name of a run_batch entry, or None when it has none"""
+    name = call.get("tool") if isinstance(call, dict) else None
+    return name if isinstance(name, str) else None
+
+def _batch_call_error(call):
+    """Why a run_batch entry is malformed, or None"""
+    if not isinstance(call, dict):
+        return "Each call must be an object with tool and args"
+    if not isinstance(call.get("tool"), str):
+        return "tool must be a tool name"
+    if not isinstance(call.get("args") or {}, dict):
+        return "args must be an object"
+    return None
+
+def _batch_call(call, snapshot=None):
+    """Run one run_batch entry on this thread, in a read snapshot when `snapshot` is given"""
+    name = _batch_call_name(call)
+    error = _batch_call_error(call)
+    if error:
+        return {"tool": name, "error": error}
+    if name not in batch_tools or name == "run_batch":
+        return {"tool": name, "error": f"Tool {name} cannot be batched"}
+    fn, read_only = batch_tools[name]
+    args = call.get("args") or {}
+    try:
+        inspect.signature(fn).bind(**args)
+    except TypeError as e:
+        return {"tool": name, "error": f"Invalid arguments: {str(e)}"}
+    try:
+        if snapshot is not None:
+            with farm_service.read_snapshot(snapshot):
+                result = fn(**args)
+        else:
+            result = fn(**args)
+    except Exception as e:
+        logger.exception(f"Batched call to {name} failed")
+        return {"tool": name, "error": str(e)}
+    try:
+        result = json.loads(result)
+    except (TypeError, ValueError):
+        pass
+    if isinstance(result, dict) and "error" in result:
+        return {"tool": name, "error": result["error"]}
+    return {"tool": name, "result": result}
+
+@tool()
+def run_batch(calls: list[dict], concurrent_reads: bool = False, stop_on_error: bool = True) -> str:
+    """
+    Run several farm tools in one request and return all their results together.
+    Use it to check several fields or control several actuators at once.
+
+    Calls run in the given order. Consecutive read-only calls see one consistent
+    state of the farm; writes run one at a time between them.
+
+    Args:
+        calls: list of {"tool": name, "args": {...}}, e.g.
+            [{"tool": "find_field_by_name", "args": {"field_name": "North Field"}},
+             {"tool": "control_actuator", "args": {"actuator_id": "V1", "status": "open"}}]
+        concurrent_reads: run consecutive read-only calls in parallel
+        stop_on_error: skip the remaining calls after a call fails
+
+    Returns:
+        JSON object with "results": one {"tool", "result"} or {"tool", "error"} per
+        call, in order ({"tool", "skipped": true} for calls not run)
+    """
+    if not isinstance(calls, list) or not calls:
+        return dumps({"error": "calls must be a non-empty list"})
+    if len(calls) > MAX_BATCH_CALLS:
+        return dumps({"error": f"At most {MAX_BATCH_CALLS} calls per batch"})
+
+    def is_read(call):
+        return _batch_call_error(call) is None and batch_tools.get(call["tool"], (None, False))[1]
+
+    results = []
+    while len(results) < len(calls):
+        if stop_on_error and any("error" in r for r in results):
+            results.extend({"tool": _batch_call_name(c), "skipped": True} for c in calls[len(results):])
+            break
+        start = len(results)
+        if not is_read(calls[start]):
+            results.append(_batch_call(calls[start]))
+            continue
+        end = start
+        while end < len(calls) and is_read(calls[end]):
+            end += 1
+        group = calls[start:end]
+        if concurrent_reads and len(group) > 1:
+            # Sessions are per thread, so parallel reads share the topology snapshot
+            # but each read has its own database session
+            snapshot = farm_service.topology.snapshot()
+            results.extend(batch_read_pool.map(lambda call: _batch_call(call, snapshot), group))
+        else:
+            # One session and read transaction for the whole group
+            with farm_service.read_snapshot():
+                for call in group:
+                    results.append(_batch_call(call))
+                    if stop_on_error and "error" in results[-1]:
+                        break
+
+    return dumps({"results": results, "failed": sum("error" in r for r in results)})
+
+@tool(lane="admin", max_concurrent=1)
 def create_custom_rulechain(telemtery_key:str,threshold_value:str)->str:
     """
     Create a custom rule chain for a specific sensor.
@@ -468,7 +1037,18 @@ def create_custom_rulechain(telemtery_key:str,threshold_value:str)->str:
         Confirmation message or error details
     """
     result = farm_service.create_custom_rulechain(telemtery_key, threshold_value)
-    return str(result)
+    return dumps(result)
+
+@tool(lane="admin", max_concurrent=1)
+def sync_all_devices() -> str:
+    """
+    Create or update every sensor, actuator and resource as a ThingsBoard device
+    and send its initial telemetry. Slow on large farms.
+
+    Returns:
+        JSON object with the synced devices per kind
+    """
+    return dumps(farm_service.sync_all_devices_with_thingsboard())
 
 @mcp.tool()
 async def transcribe_audio(audio_file_path: str) -> str:
@@ -495,4 +1075,25 @@ async def speak_text(text: str) -> str:
     return audio_path or "Audio synthesis failed."
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Farm control MCP server")
+    # stdio serves one client; sse and streamable-http serve any number of client
+    # sessions from this one long-lived process
+    parser.add_argument("--transport", choices=["stdio", "sse", "streamable-http"],
+                        default=os.environ.get("FARM_MCP_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=os.environ.get("FARM_MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("FARM_MCP_PORT", "8765")))
+    args = parser.parse_args()
+
+    # Validate the pump/valve graph and build the interlock counters
+    farm_service.interlocks.rebuild()
+    # Anchor the transition log for actuators that have no events yet
+    farm_service.event_log.ensure_baseline()
+    # Settle consumption of open actuators periodically
+    farm_service.tick_engine.start()
+    # Load persisted schedules (catching up on missed runs) and start dispatching
+    farm_service.scheduler.start()
+    if args.transport != "stdio":
+        # Clients connect to http://<host>:<port>/mcp (streamable-http) or /sse
+        mcp.settings.host, mcp.settings.port = args.host, args.port
+        logger.info(f"Serving {args.transport} on {args.host}:{args.port}")
+    mcp.run(transport=args.transport)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, JSON, create_engine, Table, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, JSON, create_engine, Table, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.sql import func
@@ -224,7 +224,119 @@ class Resource(Base):
             })
         
         return result
+
+class SensorReading(Base):
+    __tablename__ = 'sensor_readings'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sensor_id = Column(String, ForeignKey('sensors.id'), index=True, nullable=False)
+    key = Column(String, nullable=False)
+    value = Column(Float)
+    ts = Column(DateTime, nullable=False, index=True)
+    
+    def to_dict(self, include_related=False):
+        return {
+            "id": self.id,
+            "sensor_id": self.sensor_id,
+            "key": self.key,
+            "value": self.value,
+            "ts": self.ts
+        }
+    
+class IrrigationSchedule(Base):
+    __tablename__ = 'irrigation_schedules'
+    
+    id = Column(String, primary_key=True)
+    field_id = Column(String, ForeignKey('fields.id'), index=True, nullable=False)
+    # Explicit actuators; None runs the field's pumps and water valves
+    actuator_ids = Column(JSON, nullable=True)
+    start_time = Column(String, nullable=False)  # "HH:MM"
+    duration_minutes = Column(Integer, nullable=False)
+    days = Column(JSON, nullable=True)  # weekday names; None means every day
+    once = Column(Boolean, default=False)  # one-off run at next_run_at
+    jitter_seconds = Column(Integer, default=0)
+    catch_up = Column(String, default='remaining')  # 'remaining', 'full' or 'skip'
+    status = Column(String, default='active')  # 'active', 'paused' or 'completed' (one-off runs)
+    next_run_at = Column(DateTime, index=True)
+    active_until = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    modified_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
+    def to_dict(self, include_related=False):
+        return {
+            "id": self.id,
+            "field_id": self.field_id,
+            "actuator_ids": self.actuator_ids,
+            "start_time": self.start_time,
+            "duration_minutes": self.duration_minutes,
+            "days": self.days,
+            "once": self.once,
+            "jitter_seconds": self.jitter_seconds,
+            "catch_up": self.catch_up,
+            "status": self.status,
+            "next_run_at": self.next_run_at,
+            "active_until": self.active_until,
+            "last_run_at": self.last_run_at,
+            "created_at": self.created_at,
+            "modified_at": self.modified_at
+        }
+
+class ActuatorEvent(Base):
+    """Append-only log of actuator status transitions; `seq` orders the stream"""
+    __tablename__ = 'actuator_events'
+    __table_args__ = (Index('ix_actuator_events_actuator_seq', 'actuator_id', 'seq'),)
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    actuator_id = Column(String, nullable=False)
+    field_id = Column(String, nullable=True)
+    from_status = Column(String, nullable=True)  # None for baseline events
+    to_status = Column(String, nullable=False)
+    ts = Column(DateTime, nullable=False, index=True)
+    cause = Column(String, nullable=True)
+    batch_id = Column(String, nullable=True, index=True)
+    
+    def to_dict(self, include_related=False):
+        return {
+            "seq": self.seq,
+            "actuator_id": self.actuator_id,
+            "field_id": self.field_id,
+            "from": self.from_status,
+            "to": self.to_status,
+            "ts": self.ts,
+            "cause": self.cause,
+            "batch_id": self.batch_id
+        }
+
+class EventCursor(Base):
+    """Last event sequence number processed by a named consumer"""
+    __tablename__ = 'event_cursors'
+    
+    consumer = Column(String, primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+    modified_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class UsageRollup(Base):
+    """Runtime and estimated volume per day for an actuator, field or resource"""
+    __tablename__ = 'usage_rollups'
+    
+    scope = Column(String, primary_key=True)  # 'actuator', 'field' or 'resource'
+    key = Column(String, primary_key=True)  # id of the actuator, field or resource
+    day = Column(String, primary_key=True)  # "YYYY-MM-DD"
+    runtime_seconds = Column(Float, nullable=False, default=0.0)
+    volume = Column(Float, nullable=False, default=0.0)
+    modified_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    def to_dict(self, include_related=False):
+        return {
+            "scope": self.scope,
+            "key": self.key,
+            "day": self.day,
+            "runtime_seconds": self.runtime_seconds,
+            "volume": self.volume,
+            "modified_at": self.modified_at
+        }
+
 # Database initialization function
 def init_db(db_path="farm_control.db"):
     engine = create_engine(f"sqlite:///{db_path}")
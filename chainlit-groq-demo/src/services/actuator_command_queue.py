@@ -0,0 +1,255 @@
+from collections import OrderedDict, deque
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger("ActuatorCommandQueue")
+
+# Command states
+QUEUED, RUNNING, APPLIED, SUPERSEDED, FAILED = "queued", "running", "applied", "superseded", "failed"
+
+
+class _Command:
+    __slots__ = ("id", "actuator_id", "status", "cause", "idempotency_key", "state", "result",
+                 "superseded_by", "submitted_at", "applied_at", "done")
+
+    def __init__(self, command_id, actuator_id, status, cause, idempotency_key):
+        self.id = command_id
+        self.actuator_id = actuator_id
+        self.status = status
+        self.cause = cause
+        self.idempotency_key = idempotency_key
+        self.state = QUEUED
+        self.result = None
+        self.superseded_by = None
+        self.submitted_at = time.monotonic()
+        self.applied_at = None
+        self.done = threading.Event()
+
+    def finish(self, state, result=None):
+        self.state = state
+        self.result = result
+        self.applied_at = time.monotonic()
+        self.done.set()
+
+    def to_dict(self):
+        return {
+            "command_id": self.id,
+            "actuator_id": self.actuator_id,
+            "status": self.status,
+            "state": self.state,
+            "idempotency_key": self.idempotency_key,
+            "superseded_by": self.superseded_by,
+            "time_to_apply_ms": round((self.applied_at - self.submitted_at) * 1000, 2) if self.applied_at else None,
+            "result": self.result
+        }
+
+
+class ActuatorCommandQueue:
+    """
+    Asynchronous actuator command executor with one logical queue per actuator.
+
+    `submit()` returns immediately. Each actuator holds at most one pending command:
+    a newer command for the same actuator supersedes the pending one (only the last
+    requested state matters), so "open, open, close" within a second applies at most
+    the command already running plus the final close. Commands carrying an
+    idempotency key seen within `idempotency_ttl` seconds return the original command
+    instead of running again.
+
+    Worker threads take ready actuators in submission order, group them by target
+    status and apply each group with one `update_actuator_statuses` batch (one
+    transaction and one ThingsBoard flush). An actuator is never in two batches at
+    once, which keeps per-device order while different actuators run in parallel.
+    """
+
+    def __init__(self, farm_service, workers=4, max_batch=500, idempotency_ttl=600.0, max_tracked=10000):
+        self.farm_service = farm_service
+        self.workers = workers
+        self.max_batch = max_batch
+        self.idempotency_ttl = idempotency_ttl
+        self.max_tracked = max_tracked
+
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._pending = {}  # actuator_id -> _Command waiting to run
+        self._ready = deque()  # actuator ids with a pending command and none in flight
+        self._in_flight = set()
+        self._commands = OrderedDict()  # command_id -> _Command (bounded)
+        self._keys = OrderedDict()  # idempotency key -> (command_id, expires_at)
+        self._apply_times = deque(maxlen=1000)
+        self._threads = []
+        self._stopping = False
+        self.counters = {"submitted": 0, "coalesced": 0, "duplicates": 0, "applied": 0, "failed": 0, "batches": 0}
+
+    # Lifecycle
+    def start(self):
+        """Start the worker threads (idempotent); `submit` starts them on first use"""
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            self._threads = [threading.Thread(target=self._worker, name=f"actuator-commands-{i}", daemon=True)
+                             for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    # Submission
+    def submit(self, actuator_id, status, idempotency_key=None, cause="command"):
+        """
+        Queue a status change for an actuator.
+
+        Returns:
+            Command dictionary (command_id, state, ...); for a repeated idempotency
+            key, the original command
+        """
+        self.start()
+        now = time.monotonic()
+        with self._cond:
+            if idempotency_key:
+                self._expire_keys(now)
+                known = self._keys.get(idempotency_key)
+                if known and known[0] in self._commands:
+                    self.counters["duplicates"] += 1
+                    return self._commands[known[0]].to_dict()
+
+            command = _Command(next(self._ids), actuator_id, status, cause, idempotency_key)
+            self.counters["submitted"] += 1
+            self._track(command)
+            if idempotency_key:
+                self._keys[idempotency_key] = (command.id, now + self.idempotency_ttl)
+
+            previous = self._pending.get(actuator_id)
+            self._pending[actuator_id] = command
+            if previous is not None:
+                previous.superseded_by = command.id
+                previous.finish(SUPERSEDED)
+                self.counters["coalesced"] += 1
+            elif actuator_id not in self._in_flight:
+                self._ready.append(actuator_id)
+                self._cond.notify()
+            return command.to_dict()
+
+    def _track(self, command):
+        self._commands[command.id] = command
+        while len(self._commands) > self.max_tracked:
+            _, oldest = next(iter(self._commands.items()))
+            if not oldest.done.is_set():
+                break
+            self._commands.popitem(last=False)
+
+    def _expire_keys(self, now):
+        while self._keys:
+            key, (_, expires_at) = next(iter(self._keys.items()))
+            if expires_at > now:
+                break
+            self._keys.popitem(last=False)
+
+    # Results
+    def get(self, command_id):
+        with self._cond:
+            command = self._commands.get(command_id)
+            return command.to_dict() if command else None
+
+    def wait(self, command_id, timeout=None):
+        """
+        Block until a command (or the command that superseded it) has been applied.
+
+        Returns:
+            Final command dictionary, the current one on timeout, or None if unknown
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            command = self._commands.get(command_id)
+        while command is not None:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not command.done.wait(remaining):
+                return command.to_dict()
+            if command.state != SUPERSEDED:
+                return command.to_dict()
+            with self._cond:
+                successor = self._commands.get(command.superseded_by)
+            if successor is None:
+                return command.to_dict()
+            command = successor
+        return None
+
+    # Execution
+    def _take_batch(self):
+        batch = []
+        while self._ready and len(batch) < self.max_batch:
+            actuator_id = self._ready.popleft()
+            command = self._pending.pop(actuator_id, None)
+            if command is None:
+                continue
+            command.state = RUNNING
+            self._in_flight.add(actuator_id)
+            batch.append(command)
+        return batch
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                batch = self._take_batch()
+            try:
+                self._apply(batch)
+            finally:
+                with self._cond:
+                    for command in batch:
+                        self._in_flight.discard(command.actuator_id)
+                        # Commands that arrived while this one ran go next
+                        if command.actuator_id in self._pending:
+                            self._ready.append(command.actuator_id)
+                    self._cond.notify_all()
+
+    def _apply(self, batch):
+        groups = {}
+        for command in batch:
+            groups.setdefault((command.status, command.cause), []).append(command)
+        for (status, cause), commands in groups.items():
+            try:
+                result = self.farm_service.update_actuator_statuses(
+                    [command.actuator_id for command in commands], status, cause=cause)
+            except Exception as e:
+                logger.error(f"Command batch failed: {str(e)}", exc_info=True)
+                result = {"error": str(e)}
+            with self._cond:
+                self.counters["batches"] += 1
+                for command in commands:
+                    if "error" in result:
+                        command.finish(FAILED, {"error": result["error"]})
+                        self.counters["failed"] += 1
+                        continue
+                    outcome = result["results"].get(command.actuator_id)
+                    failed = outcome is None or "error" in outcome
+                    command.finish(FAILED if failed else APPLIED, outcome)
+                    self.counters["failed" if failed else "applied"] += 1
+                    self._apply_times.append(command.applied_at - command.submitted_at)
+
+    # Metrics
+    def get_stats(self):
+        with self._cond:
+            times = sorted(self._apply_times)
+            return {
+                **self.counters,
+                "queue_depth": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "workers": len(self._threads),
+                "time_to_apply_ms": {
+                    "p50": round(times[len(times) // 2] * 1000, 2),
+                    "p95": round(times[min(int(len(times) * 0.95), len(times) - 1)] * 1000, 2),
+                    "max": round(times[-1] * 1000, 2)
+                } if times else None
+            }
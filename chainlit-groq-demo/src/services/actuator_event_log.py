@@ -0,0 +1,212 @@
+from models.models import Actuator, ActuatorEvent, EventCursor
+from sqlalchemy import insert, select, func, exists
+import datetime
+import logging
+import threading
+
+logger = logging.getLogger("ActuatorEventLog")
+
+# Upper bound on ids per IN (...) clause
+IN_CLAUSE_CHUNK = 5000
+
+
+class ActuatorEventLog:
+    """
+    Append-only log of actuator status transitions.
+
+    Writers append the transitions of a batch inside their own database transaction
+    (one Core executemany insert), so the log commits or rolls back together with the
+    status change; `seq` gives the total order of the stream. Status at any time T
+    is rebuilt from the latest event per actuator at or before T, and runtimes are
+    folded from the open/close intervals, without touching the mutable `actuators`
+    table. A baseline event per actuator (`from` = None, cause "baseline") anchors
+    replay for actuators that have not changed since the log was introduced.
+
+    Consumers (ThingsBoard sync, the UI) read the stream from a persisted cursor with
+    `consume()` and advance it with `commit_cursor()` once processed; `wait()` blocks
+    until events past a sequence number are committed, so nobody polls tables.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._cond = threading.Condition()
+        self._generation = 0
+        self.appended = 0
+
+    # Writing
+    def append(self, session, transitions):
+        """
+        Append transitions inside the caller's transaction.
+
+        Args:
+            session: session with an open transaction
+            transitions: dicts with actuator_id, field_id, from, to, ts, cause and
+                optionally batch_id (the shape published as "actuator_status" events)
+
+        Returns:
+            Number of events written
+        """
+        rows = [{
+            "actuator_id": t["actuator_id"], "field_id": t.get("field_id"), "from_status": t["from"],
+            "to_status": t["to"], "ts": t["ts"], "cause": t.get("cause"), "batch_id": t.get("batch_id")
+        } for t in transitions]
+        if rows:
+            session.connection().execute(insert(ActuatorEvent.__table__), rows)
+        return len(rows)
+
+    def committed(self, count):
+        """Wake consumers after a transaction with `count` appended events committed"""
+        if not count:
+            return
+        with self._cond:
+            self.appended += count
+            self._generation += 1
+            self._cond.notify_all()
+
+    def ensure_baseline(self, now=None):
+        """
+        Write a baseline event for every actuator that has none yet (at startup).
+
+        Returns:
+            Number of baseline events written
+        """
+        now = now or datetime.datetime.now()
+        with self.session_factory() as session:
+            with session.begin():
+                missing = session.execute(select(Actuator.id, Actuator.field_id, Actuator.status).where(
+                    ~exists().where(ActuatorEvent.actuator_id == Actuator.id))).all()
+                count = self.append(session, [{
+                    "actuator_id": row.id, "field_id": row.field_id, "from": None, "to": row.status or 'close',
+                    "ts": now, "cause": "baseline"
+                } for row in missing])
+        self.committed(count)
+        if count:
+            logger.info(f"Wrote {count} baseline actuator events")
+        return count
+
+    # Reading
+    def head(self):
+        """Sequence number of the latest committed event (0 when empty)"""
+        with self.session_factory() as session:
+            return session.execute(select(func.max(ActuatorEvent.seq))).scalar() or 0
+
+    def read(self, after_seq=0, limit=1000, actuator_id=None):
+        """
+        Events with seq > after_seq in stream order.
+
+        Returns:
+            Dictionary with the events and the cursor to continue from
+        """
+        stmt = select(ActuatorEvent).where(ActuatorEvent.seq > after_seq)
+        if actuator_id:
+            stmt = stmt.where(ActuatorEvent.actuator_id == actuator_id)
+        with self.session_factory() as session:
+            events = [event.to_dict() for event in session.execute(stmt.order_by(ActuatorEvent.seq).limit(limit)).scalars()]
+        return {
+            "events": events,
+            "next_seq": events[-1]["seq"] if events else after_seq,
+            "has_more": len(events) == limit
+        }
+
+    def wait(self, after_seq, timeout=None):
+        """Block until an event with seq > after_seq is committed; returns False on timeout"""
+        with self._cond:
+            generation = self._generation
+        if self.head() > after_seq:
+            return True
+        with self._cond:
+            self._cond.wait_for(lambda: self._generation != generation, timeout)
+        return self.head() > after_seq
+
+    # Consumer cursors
+    def get_cursor(self, consumer):
+        with self.session_factory() as session:
+            cursor = session.get(EventCursor, consumer)
+            return cursor.seq if cursor else 0
+
+    def commit_cursor(self, consumer, seq):
+        """Record that `consumer` has processed every event up to `seq`"""
+        with self.session_factory() as session:
+            cursor = session.get(EventCursor, consumer)
+            if cursor is None:
+                session.add(EventCursor(consumer=consumer, seq=seq))
+            elif seq > cursor.seq:
+                cursor.seq = seq
+            session.commit()
+        return seq
+
+    def consume(self, consumer, limit=1000, timeout=0):
+        """
+        Read the next events for a consumer from its persisted cursor, optionally
+        waiting up to `timeout` seconds for new ones. The cursor only advances when
+        the consumer calls `commit_cursor(consumer, result["next_seq"])`.
+        """
+        after_seq = self.get_cursor(consumer)
+        if timeout:
+            self.wait(after_seq, timeout)
+        return {"consumer": consumer, **self.read(after_seq, limit)}
+
+    # Replay
+    def _latest_before(self, session, ts, actuator_ids=None):
+        latest = select(func.max(ActuatorEvent.seq)).where(ActuatorEvent.ts <= ts).group_by(ActuatorEvent.actuator_id)
+        stmt = select(ActuatorEvent.actuator_id, ActuatorEvent.to_status, ActuatorEvent.ts)
+        if actuator_ids is None:
+            return session.execute(stmt.where(ActuatorEvent.seq.in_(latest))).all()
+        rows = []
+        for offset in range(0, len(actuator_ids), IN_CLAUSE_CHUNK):
+            chunk = actuator_ids[offset:offset + IN_CLAUSE_CHUNK]
+            rows.extend(session.execute(stmt.where(ActuatorEvent.seq.in_(
+                latest.where(ActuatorEvent.actuator_id.in_(chunk))))))
+        return rows
+
+    def state_at(self, ts, actuator_ids=None):
+        """
+        Rebuild actuator status as of `ts` from the log.
+
+        Returns:
+            {actuator_id: {"status": ..., "since": ts of the transition}} for actuators
+            with at least one event at or before `ts`
+        """
+        with self.session_factory() as session:
+            return {row.actuator_id: {"status": row.to_status, "since": row.ts}
+                    for row in self._latest_before(session, ts, actuator_ids)}
+
+    def runtime(self, start, end, actuator_ids=None):
+        """
+        Seconds each actuator spent open within [start, end], folded from the log.
+
+        Returns:
+            {actuator_id: seconds} for actuators that were open at some point
+        """
+        open_since = {}
+        totals = {}
+        with self.session_factory() as session:
+            for row in self._latest_before(session, start, actuator_ids):
+                if row.to_status == 'open':
+                    open_since[row.actuator_id] = start
+            stmt = select(ActuatorEvent.actuator_id, ActuatorEvent.to_status, ActuatorEvent.ts).where(
+                ActuatorEvent.ts > start, ActuatorEvent.ts <= end).order_by(ActuatorEvent.seq)
+            wanted = set(actuator_ids) if actuator_ids is not None else None
+            for row in session.execute(stmt.execution_options(yield_per=5000)):
+                if wanted is not None and row.actuator_id not in wanted:
+                    continue
+                since = open_since.pop(row.actuator_id, None)
+                if since is not None:
+                    totals[row.actuator_id] = totals.get(row.actuator_id, 0.0) + (row.ts - since).total_seconds()
+                if row.to_status == 'open':
+                    open_since[row.actuator_id] = row.ts
+        for actuator_id, since in open_since.items():
+            totals[actuator_id] = totals.get(actuator_id, 0.0) + (end - since).total_seconds()
+        return {actuator_id: round(seconds, 3) for actuator_id, seconds in totals.items() if seconds > 0}
+
+    def get_stats(self):
+        with self.session_factory() as session:
+            events = session.execute(select(func.count(ActuatorEvent.seq))).scalar()
+            cursors = {row.consumer: row.seq for row in session.execute(select(EventCursor.consumer, EventCursor.seq))}
+        head = self.head()
+        return {
+            "events": events,
+            "head_seq": head,
+            "appended_since_start": self.appended,
+            "consumer_lag": {consumer: head - seq for consumer, seq in cursors.items()}
+        }
@@ -0,0 +1,223 @@
+from utils.measurements import to_number
+import datetime
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger("DepletionForecast")
+
+
+def _epoch(value):
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value.timestamp() if isinstance(value, datetime.datetime) else value
+
+
+class DepletionForecast:
+    """
+    Continuously maintained index of projected resource depletion times.
+
+    Resource levels are settled lazily (when an actuator closes or on a tick), so the
+    projected level of a resource at time t is
+
+        stored_level - sum(flow_i * (t - open_since_i))  over its open actuators
+        = offset - rate * t
+
+    with `offset = stored_level + sum(flow_i * open_since_i)` and `rate = sum(flow_i)`.
+    Both terms are updated incrementally from the service's change events (O(links)
+    per transition), and each change pushes the new depletion time `offset / rate`
+    onto a min-heap. Superseded heap entries are skipped lazily, so reading the
+    soonest depletions costs O(log n) per entry without rescanning actuators or
+    resources.
+
+    Alert listeners are called once when a resource's projected depletion falls
+    within `horizon` seconds; they are re-armed when it leaves the horizon again.
+    """
+
+    def __init__(self, topology, horizon=3600.0):
+        self.topology = topology
+        self.horizon = horizon
+
+        self._lock = threading.RLock()
+        self._dirty = True
+        self._resources = {}
+        self._open = {}
+        self._flows = {}
+        self._links = {}
+        self._heap = []
+        self._alerted = set()
+        self._alert_listeners = []
+
+    def add_alert_listener(self, listener):
+        """Register a callback invoked as listener(forecast_entry) when a resource will run dry within the horizon"""
+        self._alert_listeners.append(listener)
+
+    # Index maintenance
+    def rebuild(self):
+        """Rebuild the index from the topology snapshot"""
+        snapshot = self.topology.snapshot()
+        with self._lock:
+            self._links = snapshot.edges["resources_by_actuator"]
+            self._flows = {aid: to_number(actuator["base_speed"]) / 3600.0
+                           for aid, actuator in snapshot.actuators.items()}
+            self._open = {aid: _epoch(actuator["last_state_change"])
+                          for aid, actuator in snapshot.actuators.items()
+                          if actuator["status"] == 'open' and actuator["last_state_change"]}
+            self._resources = {rid: {
+                "name": resource["name"],
+                "stored": to_number(resource["current_level"]),
+                "offset": to_number(resource["current_level"]),
+                "rate": 0.0,
+                "version": 0
+            } for rid, resource in snapshot.resources.items()}
+            for aid, since in self._open.items():
+                self._add_flow(aid, since)
+            self._heap = []
+            for rid in self._resources:
+                self._push(rid)
+            self._dirty = False
+        logger.info(f"Depletion forecast built for {len(self._resources)} resources, {len(self._open)} open actuators")
+
+    def _ensure_built(self):
+        if self._dirty:
+            self.rebuild()
+
+    def _add_flow(self, actuator_id, since, sign=1):
+        flow = self._flows.get(actuator_id, 0.0)
+        if not flow:
+            return ()
+        touched = []
+        for rid in self._links.get(actuator_id, ()):
+            state = self._resources.get(rid)
+            if state is not None:
+                state["offset"] += sign * flow * since
+                state["rate"] += sign * flow
+                touched.append(rid)
+        return touched
+
+    def _push(self, resource_id):
+        state = self._resources[resource_id]
+        state["version"] += 1
+        if state["rate"] > 1e-12:
+            heapq.heappush(self._heap, (state["offset"] / state["rate"], state["version"], resource_id))
+        else:
+            self._alerted.discard(resource_id)
+        # Drop superseded entries once they dominate the heap (amortized O(1) per push)
+        if len(self._heap) > 2 * len(self._resources) + 64:
+            self._heap = [entry for entry in self._heap if self._valid(entry)]
+            heapq.heapify(self._heap)
+
+    def on_change(self, event_type, payload):
+        """Change listener for FarmControlService events"""
+        with self._lock:
+            if event_type == "topology":
+                self._dirty = True
+                return
+            if self._dirty:
+                return
+
+            touched = set()
+            if event_type == "actuator_status":
+                for transition in payload["transitions"]:
+                    actuator_id = transition["actuator_id"]
+                    if actuator_id in self._open:
+                        touched.update(self._add_flow(actuator_id, self._open.pop(actuator_id), sign=-1))
+                    if transition["to"] == 'open':
+                        since = _epoch(transition["ts"])
+                        self._open[actuator_id] = since
+                        touched.update(self._add_flow(actuator_id, since))
+            elif event_type == "actuator_timers":
+                since = _epoch(payload["ts"])
+                for actuator_id in payload["actuator_ids"]:
+                    if actuator_id in self._open:
+                        touched.update(self._add_flow(actuator_id, self._open[actuator_id], sign=-1))
+                        self._open[actuator_id] = since
+                        touched.update(self._add_flow(actuator_id, since))
+            elif event_type == "resource_level":
+                for update in payload["resources"]:
+                    state = self._resources.get(update["resource_id"])
+                    if state is None:
+                        continue
+                    stored = to_number(update["new_level"])
+                    state["offset"] += stored - state["stored"]
+                    state["stored"] = stored
+                    touched.add(update["resource_id"])
+
+            for resource_id in touched:
+                self._push(resource_id)
+        if touched:
+            self.check_alerts()
+
+    # Queries
+    def _valid(self, entry):
+        _, version, resource_id = entry
+        state = self._resources.get(resource_id)
+        return state is not None and state["version"] == version
+
+    def _pop_valid(self):
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._valid(entry):
+                return entry
+        return None
+
+    def _entry(self, depletes_at, resource_id, now):
+        state = self._resources[resource_id]
+        return {
+            "resource_id": resource_id,
+            "resource_name": state["name"],
+            "projected_level": round(max(state["offset"] - state["rate"] * now, 0.0), 2),
+            "consumption_rate_per_hour": round(state["rate"] * 3600, 2),
+            "depletes_at": datetime.datetime.fromtimestamp(depletes_at).isoformat(),
+            "hours_until_empty": round(max(depletes_at - now, 0.0) / 3600, 2)
+        }
+
+    def soonest(self, n=5, until=None, now=None):
+        """The `n` resources projected to run dry first (optionally only those before `until`)"""
+        now = now or time.time()
+        with self._lock:
+            self._ensure_built()
+            taken = []
+            while len(taken) < n:
+                entry = self._pop_valid()
+                if entry is None:
+                    break
+                taken.append(entry)
+                if until is not None and entry[0] > until:
+                    break
+            for entry in taken:
+                heapq.heappush(self._heap, entry)
+            return [self._entry(depletes_at, resource_id, now)
+                    for depletes_at, _, resource_id in taken if until is None or depletes_at <= until]
+
+    def get_depletion_forecast(self, n=5):
+        now = time.time()
+        with self._lock:
+            forecast = self.soonest(n, now=now)
+            return {
+                "generated_at": datetime.datetime.fromtimestamp(now).isoformat(),
+                "horizon_hours": round(self.horizon / 3600, 2),
+                "forecast": forecast
+            }
+
+    def check_alerts(self, now=None):
+        """Fire alert listeners for resources newly projected to run dry within the horizon"""
+        now = now or time.time()
+        with self._lock:
+            if self._dirty:
+                return []
+            due = self.soonest(len(self._resources), until=now + self.horizon, now=now)
+            due_ids = {entry["resource_id"] for entry in due}
+            # Re-arm resources that left the horizon
+            self._alerted &= due_ids
+            alerts = [entry for entry in due if entry["resource_id"] not in self._alerted]
+            self._alerted.update(entry["resource_id"] for entry in alerts)
+        for alert in alerts:
+            logger.warning(f"{alert['resource_name']} ({alert['resource_id']}) projected empty at {alert['depletes_at']}")
+            for listener in list(self._alert_listeners):
+                try:
+                    listener(alert)
+                except Exception as e:
+                    logger.error(f"Depletion alert listener failed: {str(e)}", exc_info=True)
+        return alerts
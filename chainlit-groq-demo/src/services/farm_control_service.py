@@ -1,12 +1,106 @@
-from models.models import Farm, Field, Sensor, Actuator, Resource, get_session_factory
-from utils.thingsboard import get_jwt_token, get_device_token, send_telemetry, create_or_update_device_on_thingsboard
+from models.models import (
+    Farm, Field, Sensor, Actuator, Resource, field_resource_association,
+    actuator_resource_association, pump_valve_association, get_session_factory
+)
+from utils.thingsboard import get_jwt_token, get_device_token, send_telemetry, send_telemetry_batch, create_or_update_device_on_thingsboard
+from utils.measurements import to_number, with_number
+from sqlalchemy import select, update, func, case, literal
 from sqlalchemy.orm import joinedload
+from services.topology_cache import TopologyCache
+from services.resource_tick_engine import ResourceTickEngine
+from services.depletion_forecast import DepletionForecast
+from services.irrigation_scheduler import IrrigationScheduler
+from services.irrigation_planner import IrrigationPlanner
+from services.pump_interlock import PumpInterlockIndex
+from services.actuator_event_log import ActuatorEventLog
+from services.actuator_command_queue import ActuatorCommandQueue
+from services.usage_rollups import UsageRollups
+from services.serialization import Projection, load_tree, iter_tree
+from services.state_versions import StateVersions
+from services.shared_session import SharedSessionFactory
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import numpy as np
 import datetime
+import threading
+import time
+import uuid
+
+VALVE_TYPES = ('water_valves', 'fertilizer_dispensers')
+VALID_STATUSES = ['open', 'close', 'changing state']
+# Upper bound on ids per IN (...) clause
+IN_CLAUSE_CHUNK = 5000
+
+def _chunks(items, size=IN_CLAUSE_CHUNK):
+    for offset in range(0, len(items), size):
+        yield items[offset:offset + size]
+
+def _device_state(status):
+    """Map actuator status to ThingsBoard deviceState telemetry"""
+    return 1 if status == 'open' else 0 if status == 'close' else -1
 
 class FarmControlService:
     def __init__(self, session_factory):
-        self.session_factory = session_factory
+        # A plain sessionmaker, except inside read_snapshot() on the reading thread
+        self.session_factory = session_factory = SharedSessionFactory(session_factory)
         self.logger = self._setup_logger()
+        self.topology = TopologyCache(session_factory)
+        self._change_listeners = []
+        self.versions = StateVersions()
+        self.add_change_listener(self.versions.on_change)
+        self.usage = UsageRollups(session_factory, self.topology)
+        self.tick_engine = ResourceTickEngine(session_factory, self.topology, on_tick=self._tick_committed,
+                                              on_settle=self.usage.record)
+        self.forecast = DepletionForecast(self.topology)
+        self.add_change_listener(self.forecast.on_change)
+        self.interlocks = PumpInterlockIndex(session_factory)
+        self.event_log = ActuatorEventLog(session_factory)
+        self.add_change_listener(self.interlocks.on_change)
+        self.scheduler = IrrigationScheduler(self)
+        self.planner = IrrigationPlanner(self)
+        self.commands = ActuatorCommandQueue(self)
+        # Deferred work (resource settlement, ThingsBoard sync) after fast-path writes
+        self._background = None
+        self._background_lock = threading.Lock()
+        self._pending = set()
+    
+    @contextmanager
+    def read_snapshot(self, snapshot=None):
+        """
+        Serve the reads made by this thread from one database session (one read
+        transaction) and one topology snapshot, so they see the same state.
+
+        Args:
+            snapshot: topology snapshot to use instead of the current one; threads
+                given the same snapshot agree on topology
+
+        Yields:
+            The topology snapshot
+        """
+        with self.session_factory.shared(), self.topology.pinned(snapshot) as pinned:
+            yield pinned
+
+    def add_change_listener(self, listener):
+        """
+        Register a callback invoked as listener(event_type, payload) after a write commits.
+        
+        Event types: "actuator_status" (payload["transitions"]), "resource_level"
+        (payload["resources"]), "actuator_timers" (open timers of payload["actuator_ids"]
+        reset to payload["ts"] after a tick) and "topology" (structural changes).
+        """
+        self._change_listeners.append(listener)
+    
+    def _publish(self, event_type, payload):
+        for listener in list(self._change_listeners):
+            try:
+                listener(event_type, payload)
+            except Exception as e:
+                self.logger.error(f"Change listener failed for {event_type}: {str(e)}", exc_info=True)
+    
+    def _topology_changed(self, entity, entity_id):
+        self.topology.invalidate()
+        self._publish("topology", {"entity": entity, "id": entity_id})
     
     def _setup_logger(self):
         import logging
@@ -17,82 +111,79 @@ class FarmControlService:
         logger.addHandler(handler)
         return logger
     
-    def get_all_farms(self, include_related=True):
-        """Get all farms with optional related entities (fields, sensors, actuators, resources)"""
+    def get_all_farms(self, include_related=True, fields=None):
+        """
+        Get all farms with optional related entities (fields, sensors, actuators, resources).
+        
+        Rows are built from column tuples (see services.serialization.load_tree);
+        `fields` projects the result, e.g. ["id", "name", "fields.id", "fields.crop"].
+        """
         with self.session_factory() as session:
-            # Build query with appropriate joins for eager loading
-            query = session.query(Farm)
-            
-            if include_related:
-                # Explicitly join all relationships for complete eager loading
-                query = query.options(
-                    joinedload(Farm.fields).joinedload(Field.sensors),
-                    joinedload(Farm.fields).joinedload(Field.actuators),
-                    joinedload(Farm.fields).joinedload(Field.resources)
-                )
-            
-            farms = query.all()
-            return [farm.to_dict(include_related=include_related) for farm in farms]
+            return load_tree(session, "farm", fields, include_related)
     
-    def get_farm_by_id(self, farm_id, include_related=True):
-        """Get a specific farm with optional related entities"""
+    def get_farm_by_id(self, farm_id, include_related=True, fields=None):
+        """Get a specific farm with optional related entities, projected to `fields`"""
         with self.session_factory() as session:
-            query = session.query(Farm).filter(Farm.id == farm_id)
-            
-            if include_related:
-                query = query.options(
-                    joinedload(Farm.fields).joinedload(Field.sensors),
-                    joinedload(Farm.fields).joinedload(Field.actuators),
-                    joinedload(Farm.fields).joinedload(Field.resources)
-                )
-            
-            farm = query.first()
-            return farm.to_dict(include_related=include_related) if farm else None
+            farms = load_tree(session, "farm", fields, include_related, where=[Farm.id == farm_id])
+            return farms[0] if farms else None
     
-    def get_all_fields(self, include_related=True):
-        """Get all fields with optional related entities (sensors, actuators)"""
+    def get_all_fields(self, include_related=True, fields=None):
+        """Get all fields with optional related entities (sensors, actuators, resources), projected to `fields`"""
         with self.session_factory() as session:
-            query = session.query(Field)
-            
-            if include_related:
-                query = query.options(
-                    joinedload(Field.sensors),
-                    joinedload(Field.actuators),
-                    joinedload(Field.resources)
-                )
-            
-            fields = query.all()
-            return [field.to_dict(include_related=include_related) for field in fields]
+            return load_tree(session, "field", fields, include_related)
+    
+    def iter_farms(self, fields=None, include_related=True, after=None, limit=None, name_prefix=None, name_contains=None):
+        """
+        Stream farms in id order from a server-side cursor (see services.serialization.iter_tree).
+        
+        Filters, the `fields` projection, keyset continuation (`after`) and `limit`
+        are all applied in SQL.
+        """
+        where = []
+        if name_prefix:
+            where.append(Farm.name.startswith(name_prefix, autoescape=True))
+        if name_contains:
+            where.append(func.lower(Farm.name).contains(name_contains.lower(), autoescape=True))
+        with self.session_factory() as session:
+            yield from iter_tree(session, "farm", fields, include_related, where=where,
+                                 after=after, limit=limit, batch_size=50)
+    
+    def iter_fields(self, farm_id=None, fields=None, include_related=True, after=None, limit=None, name_prefix=None):
+        """Stream the fields of a farm (or of all farms) in id order with their related entities"""
+        where = []
+        if farm_id:
+            where.append(Field.farm_id == farm_id)
+        if name_prefix:
+            where.append(Field.name.startswith(name_prefix, autoescape=True))
+        with self.session_factory() as session:
+            yield from iter_tree(session, "field", fields, include_related, where=where, after=after, limit=limit)
+    
+    def iter_actuators(self, fields=None, after=None, limit=None, status=None, actuator_type=None,
+                       field_id=None, name_prefix=None, ids=None):
+        """Stream actuators in id order, filtered by status, type, field, name prefix and ids in SQL"""
+        where = []
+        if ids is not None:
+            where.append(Actuator.id.in_(list(ids)))
+        if status:
+            where.append(Actuator.status == status)
+        if actuator_type:
+            where.append(Actuator.type == actuator_type)
+        if field_id:
+            where.append(Actuator.field_id == field_id)
+        if name_prefix:
+            where.append(Actuator.name.startswith(name_prefix, autoescape=True))
+        with self.session_factory() as session:
+            yield from iter_tree(session, "actuator", fields, where=where, after=after, limit=limit)
     
     def get_field_by_id(self, field_id, include_related=True):
         """Get a specific field with optional related entities"""
-        with self.session_factory() as session:
-            query = session.query(Field).filter(Field.id == field_id)
-            
-            if include_related:
-                query = query.options(
-                    joinedload(Field.sensors),
-                    joinedload(Field.actuators),
-                    joinedload(Field.resources)
-                )
-            
-            field = query.first()
-            return field.to_dict(include_related=include_related) if field else None
+        return self.topology.snapshot().field_dict(field_id, include_related=include_related)
     
     def get_field_by_name(self, field_name, include_related=True):
         """Get a specific field by name with optional related entities"""
-        with self.session_factory() as session:
-            query = session.query(Field).filter(Field.name == field_name)
-            
-            if include_related:
-                query = query.options(
-                    joinedload(Field.sensors),
-                    joinedload(Field.actuators),
-                    joinedload(Field.resources)
-                )
-            
-            field = query.first()
-            return field.to_dict(include_related=include_related) if field else None
+        snapshot = self.topology.snapshot()
+        field_ids = snapshot.field_ids_by_name(field_name)
+        return snapshot.field_dict(field_ids[0], include_related=include_related) if field_ids else None
     
     def get_all_sensors(self, include_related=True):
         """Get all sensors with optional related field"""
@@ -148,18 +239,7 @@ class FarmControlService:
     
     def get_actuator_by_id(self, actuator_id, include_related=True):
         """Get a specific actuator with optional related entities"""
-        with self.session_factory() as session:
-            query = session.query(Actuator).filter(Actuator.id == actuator_id)
-            
-            if include_related:
-                query = query.options(
-                    joinedload(Actuator.resources),
-                    joinedload(Actuator.linked_valves),
-                    joinedload(Actuator.linked_pumps)
-                )
-            
-            actuator = query.first()
-            return actuator.to_dict(include_related=include_related) if actuator else None
+        return self.topology.snapshot().actuator_dict(actuator_id, include_related=include_related)
     
     def get_all_resources(self, include_related=True):
         """Get all resources with optional related entities"""
@@ -202,6 +282,7 @@ class FarmControlService:
             # Update the field_id directly
             sensor.field_id = field_id
             session.commit()
+            self._topology_changed("sensor", sensor_id)
                 
             return {"status": "success", "message": f"Sensor {sensor_id} updated to field {field_id}"}
     
@@ -217,6 +298,7 @@ class FarmControlService:
             if field not in actuator.fields:
                 actuator.fields.append(field)
                 session.commit()
+                self._topology_changed("actuator", actuator_id)
                 
             return {"status": "success", "message": f"Actuator {actuator_id} associated with field {field_id}"}
     
@@ -232,6 +314,7 @@ class FarmControlService:
             if field not in resource.fields:
                 resource.fields.append(field)
                 session.commit()
+                self._topology_changed("resource", resource_id)
                 
             return {"status": "success", "message": f"Resource {resource_id} associated with field {field_id}"}
     
@@ -247,6 +330,7 @@ class FarmControlService:
             if resource not in actuator.resources:
                 actuator.resources.append(resource)
                 session.commit()
+                self._topology_changed("actuator", actuator_id)
                 
             return {"status": "success", "message": f"Actuator {actuator_id} associated with resource {resource_id}"}
     
@@ -268,44 +352,26 @@ class FarmControlService:
             if valve not in pump.linked_valves:
                 pump.linked_valves.append(valve)
                 session.commit()
+                self._topology_changed("actuator", pump_id)
                 
             return {"status": "success", "message": f"Pump {pump_id} associated with valve {valve_id}"}
     
     # Control functions
     def get_actuators_by_field(self, field_id, include_related=True):
         """Get all actuators for a specific field"""
-        with self.session_factory() as session:
-            field = session.query(Field).filter(Field.id == field_id).options(
-                joinedload(Field.actuators)
-            ).first()
-            
-            if not field:
-                return []
-            
-            return [actuator.to_dict(include_related=include_related) for actuator in field.actuators]
+        return self.topology.snapshot().actuators_for_field(field_id, include_related=include_related)
     
     def get_actuators_by_field_name(self, field_name, include_related=True):
         """Get all actuators for a field by name"""
-        with self.session_factory() as session:
-            field = session.query(Field).filter(Field.name == field_name).options(
-                joinedload(Field.actuators)
-            ).first()
-            
-            if not field:
-                return []
-            
-            return [actuator.to_dict(include_related=include_related) for actuator in field.actuators]
+        snapshot = self.topology.snapshot()
+        field_ids = snapshot.field_ids_by_name(field_name)
+        if not field_ids:
+            return []
+        return snapshot.actuators_for_field(field_ids[0], include_related=include_related)
     
-    # Updated method to use direct relationship
     def get_sensors_by_field(self, field_id, include_related=True):
         """Get all sensors for a specific field"""
-        with self.session_factory() as session:
-            sensors = session.query(Sensor).filter(Sensor.field_id == field_id).all()
-            
-            if not sensors:
-                return []
-            
-            return [sensor.to_dict(include_related=include_related) for sensor in sensors]
+        return self.topology.snapshot().sensors_for_field(field_id, include_related=include_related)
     
     def get_active_actuators(self, include_related=True):
         """Get all actuators with 'open' status"""
@@ -333,229 +399,427 @@ class FarmControlService:
             inactive_actuators = query.all()
             return [actuator.to_dict(include_related=include_related) for actuator in inactive_actuators]
     
-    def get_resource_levels(self):
-        """Get current levels of all resources"""
+    def get_resource_levels(self, ids=None):
+        """Get current levels of all resources (or of the given ids)"""
         with self.session_factory() as session:
-            resources = session.query(Resource).all()
+            query = session.query(Resource.id, Resource.name, Resource.capacity, Resource.current_level)
+            if ids is not None:
+                query = query.filter(Resource.id.in_(list(ids)))
             return {resource.id: {
                 "name": resource.name,
                 "capacity": resource.capacity,
                 "current_level": resource.current_level
-            } for resource in resources}
+            } for resource in query}
+    
+    def get_resource_levels_since(self, since_version=None):
+        """
+        Resource levels changed since the state version token `since_version`.
+        
+        Returns:
+            {"version", "not_modified": True} when nothing changed, otherwise
+            {"version", "full", "resources"}; full is True when `since_version` was
+            missing or outdated and every resource is included
+        """
+        token, changed = self.versions.changes("resource", since_version)
+        if changed is not None and not changed:
+            return {"version": token, "not_modified": True}
+        if changed is not None and len(changed) > IN_CLAUSE_CHUNK:
+            changed = None
+        return {"version": token, "full": changed is None, "resources": self.get_resource_levels(changed)}
     
     def update_actuator_status(self, actuator_id, new_status):
-        """Update an actuator's status, handle dependencies, and update resource levels"""
-        valid_statuses = ['open', 'close', 'changing state']
-        print("Valid statuses:", valid_statuses)
+        """
+        Update an actuator's status, handle dependencies, and update resource levels.
+        
+        Runs as a one-actuator `update_actuator_statuses` batch, so interlocks,
+        resource settlement, the event log and the telemetry flush follow the
+        same path; an actuator already in `new_status` is left untouched.
+        """
         self.logger.info(f"Updating actuator status: {actuator_id} to {new_status}")
+        batch = self.update_actuator_statuses([actuator_id], new_status)
+        if "error" in batch:
+            return {"error": batch["error"]}
+        
+        result = batch["results"][actuator_id]
+        if "error" in result:
+            return result
+        result["status_change"]["verified"] = result.get("status") == new_status
+        if batch["interlocked_pumps"]:
+            result["interlocked_pumps"] = batch["interlocked_pumps"]
+        return result
+    
+    def update_actuator_statuses(self, actuator_ids, new_status, cause="command"):
+        """
+        Set the status of many actuators in one transaction.
         
-        if new_status not in valid_statuses:
-            return {"error": f"Invalid status. Must be one of {valid_statuses}"}
+        Statuses are changed with one bulk UPDATE, resource consumption of actuators
+        that close is settled with vectorized math, pump interlocks are resolved for
+        the whole batch at once and ThingsBoard receives one batched telemetry flush.
+        Actuators already in the requested status are left untouched.
         
-        with self.session_factory() as session:
-            # Start an explicit transaction
-            session.begin()
+        Args:
+            actuator_ids: Ids of the actuators to change
+            new_status: 'open', 'close' or 'changing state'
+            cause: Reason recorded on the transitions (e.g. "command", "schedule")
             
-            try:
-                # Get the actuator with a row lock to prevent race conditions
-                actuator = session.query(Actuator).filter(Actuator.id == actuator_id).with_for_update().first()
-                if not actuator:
-                    session.rollback()
-                    return {"error": f"Actuator {actuator_id} not found"}
-                
-                # Store original status for verification
-                original_status = actuator.status
-                current_time = datetime.datetime.now()
-                
-                # Calculate resource consumption if actuator is changing from open to close
-                resource_updates = None
-                if original_status == 'open' and new_status == 'close' and actuator.last_state_change:
-                    time_open = (current_time - actuator.last_state_change).total_seconds()
-                    resource_updates = self._calculate_resource_consumption(session, actuator, time_open)
-                
-                # Update actuator status and timestamp
-                actuator.status = new_status
-                
-                # Update last_state_change only when opening (to start timing) or closing (to reset)
-                if new_status in ['open', 'close']:
-                    actuator.last_state_change = current_time
-                
-                # If this is a valve, update linked pumps accordingly
-                if actuator.type in ['water_valves', 'fertilizer_dispensers']:
-                    self._update_linked_pumps(session, actuator, new_status)
-                
-                # Commit the transaction
-                session.commit()
-                
-                # Map status to ThingsBoard telemetry state
-                device_state = 1 if new_status == 'open' else 0 if new_status == 'close' else -1
-                telemetry_data = {"deviceState": device_state}
-                
-                # Sync with ThingsBoard
-                self._sync_actuator_with_thingsboard(actuator.thingsboard_id, telemetry_data)
-                
-                # Verify the change by querying again
-                with self.session_factory() as verify_session:
-                    updated_actuator = verify_session.query(Actuator).filter(Actuator.id == actuator_id).first()
+        Returns:
+            Dictionary with per-actuator results, interlocked pump changes and
+            aggregated resource updates
+        """
+        if new_status not in VALID_STATUSES:
+            return {"error": f"Invalid status. Must be one of {VALID_STATUSES}"}
+        
+        actuator_ids = list(dict.fromkeys(actuator_ids))
+        batch_id = uuid.uuid4().hex[:12]
+        current_time = datetime.datetime.now()
+        self.logger.info(f"Batch {batch_id}: setting {len(actuator_ids)} actuators to {new_status}")
+        
+        try:
+            with self.interlocks.transaction(), self.session_factory() as session:
+                with session.begin():
+                    rows = {}
+                    for chunk in _chunks(actuator_ids):
+                        for row in session.execute(select(
+                            Actuator.id, Actuator.field_id, Actuator.type, Actuator.status,
+                            Actuator.last_state_change, Actuator.base_speed, Actuator.thingsboard_id
+                        ).where(Actuator.id.in_(chunk))):
+                            rows[row.id] = row
                     
-                    if updated_actuator and updated_actuator.status == new_status:
-                        # Change was successful
-                        result = {
-                            **updated_actuator.to_dict(),
-                            "status_change": {
-                                "from": original_status,
-                                "to": new_status,
-                                "verified": True,
-                                "thingsboard_synced": True
-                            }
-                        }
-                        
-                        # Include resource consumption details if applicable
-                        if resource_updates:
-                            result["resource_updates"] = resource_updates
-                            
-                        return result
-                    else:
-                        # Change verification failed
-                        return {
-                            "error": "Failed to verify status change",
-                            "actuator_id": actuator_id,
-                            "requested_status": new_status,
-                            "current_status": updated_actuator.status if updated_actuator else "unknown"
-                        }
+                    changed = [rows[aid] for aid in actuator_ids if aid in rows and rows[aid].status != new_status]
+                    changed_ids = [row.id for row in changed]
+                    closing = [row for row in changed if row.status == 'open' and new_status == 'close' and row.last_state_change]
                     
-            except Exception as e:
-                # Rollback on any error
-                session.rollback()
-                self.logger.error(f"Failed to update actuator status: {str(e)}", exc_info=True)
-                return {"error": f"Failed to update actuator status: {str(e)}"}
+                    values = {"status": new_status}
+                    if new_status in ['open', 'close']:
+                        values["last_state_change"] = current_time
+                    for chunk in _chunks(changed_ids):
+                        session.execute(update(Actuator).where(Actuator.id.in_(chunk)).values(**values))
+                    
+                    pump_changes = []
+                    valve_ids = [row.id for row in changed if row.type in VALVE_TYPES]
+                    if valve_ids:
+                        pump_changes = self._resolve_pump_interlocks(
+                            session, [(valve_id, new_status) for valve_id in valve_ids], current_time)
+                        closing.extend(pump for pump, to_status in pump_changes if to_status == 'close' and pump.last_state_change)
+                    
+                    resource_updates, consumption_by_actuator = self._settle_resource_consumption(session, closing, current_time)
+                    
+                    transitions = [{
+                        "actuator_id": row.id, "field_id": row.field_id, "from": row.status, "to": new_status,
+                        "ts": current_time, "cause": cause, "batch_id": batch_id
+                    } for row in changed] + [{
+                        "actuator_id": pump.id, "field_id": pump.field_id, "from": pump.status, "to": to_status,
+                        "ts": current_time, "cause": "interlock", "batch_id": batch_id
+                    } for pump, to_status in pump_changes]
+                    self.event_log.append(session, transitions)
+        except Exception as e:
+            self.logger.error(f"Batch {batch_id} failed: {str(e)}", exc_info=True)
+            return {"error": f"Failed to update actuator statuses: {str(e)}", "batch_id": batch_id}
+        
+        # One telemetry flush for every device touched by the batch
+        telemetry = {}
+        for row in changed:
+            telemetry[row.thingsboard_id] = {"deviceState": _device_state(new_status)}
+        for pump, to_status in pump_changes:
+            telemetry[pump.thingsboard_id] = {"deviceState": _device_state(to_status)}
+        for resource_update in resource_updates:
+            telemetry[resource_update.pop("thingsboard_id")] = {
+                "current_level": resource_update["new_level"],
+                "percentage_full": resource_update["percentage_full"]
+            }
+        
+        self._actuator_status_committed(transitions, resource_updates)
+        
+        synced = self._flush_telemetry(telemetry, f"Batch {batch_id}")
+        
+        snapshot = self.topology.snapshot()
+        results = {}
+        for actuator_id in actuator_ids:
+            row = rows.get(actuator_id)
+            if row is None:
+                results[actuator_id] = {"error": f"Actuator {actuator_id} not found"}
+                continue
+            result = snapshot.actuator_dict(actuator_id) or {"id": actuator_id, "status": new_status}
+            result["status_change"] = {
+                "from": row.status,
+                "to": new_status,
+                "changed": row.status != new_status,
+                "thingsboard_synced": bool(synced.get(row.thingsboard_id)) if row.status != new_status else None
+            }
+            if actuator_id in consumption_by_actuator:
+                result["resource_updates"] = consumption_by_actuator[actuator_id]
+            results[actuator_id] = result
+        
+        return {
+            "batch_id": batch_id,
+            "status": new_status,
+            "requested": len(actuator_ids),
+            "changed": len(changed),
+            "results": results,
+            "interlocked_pumps": [{"id": pump.id, "from": pump.status, "to": to_status} for pump, to_status in pump_changes],
+            "resource_updates": resource_updates
+        }
     
-    def _calculate_resource_consumption(self, session, actuator, time_open_seconds):
+    def _flush_telemetry(self, telemetry, context):
         """
-        Calculate and apply resource consumption based on actuator usage time
+        Send committed changes to ThingsBoard as one batch.
+        
+        The database is the source of truth, so a sync failure is logged and
+        reported as unsynced devices rather than raised after the commit.
+        """
+        try:
+            return send_telemetry_batch({device: data for device, data in telemetry.items() if device})
+        except Exception as e:
+            self.logger.error(f"{context}: ThingsBoard sync failed: {str(e)}", exc_info=True)
+            return {}
+    
+    def emergency_stop(self, cause="emergency_stop"):
+        """
+        Close every open actuator with one bulk UPDATE.
+        
+        Only the status change and its event log entries happen before returning.
+        Settling resource consumption, resetting the open timers, publishing the
+        transitions and notifying ThingsBoard follow on a background thread (see
+        `wait_for_background`), from the open times the UPDATE returned, so an
+        actuator reopened in the meantime is still settled for its run before the
+        stop. Pumps need no interlock resolution since every valve is closed as well.
         
-        Args:
-            session: SQLAlchemy session
-            actuator: Actuator object that was open
-            time_open_seconds: Time in seconds the actuator was open
-            
         Returns:
-            List of resource update details
+            Dictionary with the batch id, stop counts and elapsed time
         """
-        # Skip if no resources associated with this actuator
-        if not actuator.resources:
-            return []
+        started = time.perf_counter()
+        batch_id = uuid.uuid4().hex[:12]
+        current_time = datetime.datetime.now()
+        table = Actuator.__table__
         
-        # Convert base_speed to float if it's stored as a list of dictionaries
         try:
-            if isinstance(actuator.base_speed, list) and len(actuator.base_speed) > 0:
-                base_speed = float(actuator.base_speed[0].get("value", 0.0)) if isinstance(actuator.base_speed[0].get("value", 0.0), str) else actuator.base_speed[0].get("value", 0.0)
-            else:
-                base_speed = 0.0
-        except (ValueError, TypeError, AttributeError):
-            self.logger.warning(f"Invalid base_speed value for actuator {actuator.id}: {actuator.base_speed}")
-            base_speed = 0.0
+            # The index lock is held until commit, so a concurrent batch cannot interleave
+            # its valve transitions between the UPDATE and the counter reset
+            with self.interlocks.transaction(), self.session_factory() as session:
+                with session.begin():
+                    # last_state_change keeps the open time until the settlement has used it
+                    stopped = session.connection().execute(
+                        update(table).where(table.c.status == 'open').values(status='close')
+                        .returning(table.c.id, table.c.type, table.c.field_id, table.c.thingsboard_id,
+                                   table.c.base_speed, table.c.last_state_change)
+                    ).all()
+                    transitions = [{
+                        "actuator_id": row.id, "field_id": row.field_id, "from": 'open', "to": 'close',
+                        "ts": current_time, "cause": cause, "batch_id": batch_id
+                    } for row in stopped]
+                    # Logged with the status change so a later reopen is ordered after it
+                    self.event_log.append(session, transitions)
+                    self.interlocks.close_all()
+        except Exception as e:
+            self.logger.error(f"Emergency stop {batch_id} failed: {str(e)}", exc_info=True)
+            return {"error": f"Emergency stop failed: {str(e)}", "batch_id": batch_id}
+        
+        self.event_log.committed(len(transitions))
+        # Runs in progress are over; a later dispatch must not reopen their actuators
+        self.scheduler.end_running()
+        self.topology.patch_actuators(dict.fromkeys([row.id for row in stopped], {"status": 'close'}))
+        # Transitions are published after settlement; readers see the new state now
+        self.versions.touch("actuator", [row.id for row in stopped])
+        by_type = dict(Counter(row.type for row in stopped))
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.logger.warning(f"Emergency stop {batch_id}: closed {len(stopped)} actuators in {elapsed_ms}ms")
         
-        # Ensure base_speed is not None before calculating flow rate
-        base_speed = base_speed if base_speed is not None else 0.0
+        if stopped:
+            self._run_in_background(self._settle_emergency_stop, batch_id, stopped, transitions, current_time)
+        return {
+            "status": "stopped",
+            "batch_id": batch_id,
+            "stopped": len(stopped),
+            "stopped_by_type": by_type,
+            "elapsed_ms": elapsed_ms,
+            "settlement": "pending" if stopped else "none"
+        }
+    
+    def _settle_emergency_stop(self, batch_id, stopped, transitions, current_time):
+        """Finish an emergency stop: settle consumption, reset open timers, publish and sync"""
+        table = Actuator.__table__
+        with self.session_factory() as session:
+            with session.begin():
+                closing = [row for row in stopped if row.last_state_change]
+                resource_updates, _ = self._settle_resource_consumption(session, closing, current_time)
+                # Actuators reopened (or closed again) since the stop carry a newer timestamp
+                # and keep it
+                still_stopped = []
+                for chunk in _chunks([row.id for row in stopped]):
+                    still_stopped.extend(session.connection().execute(
+                        update(table).where(
+                            table.c.id.in_(chunk), table.c.status == 'close',
+                            (table.c.last_state_change == None) | (table.c.last_state_change < current_time)
+                        ).values(last_state_change=current_time).returning(table.c.id)
+                    ).scalars())
         
-        # Calculate flow rate per second (base_speed is assumed to be units per hour)
-        flow_rate_per_second = base_speed / 3600.0
+        still_stopped = set(still_stopped)
+        telemetry = {row.thingsboard_id: {"deviceState": _device_state('close')}
+                     for row in stopped if row.id in still_stopped}
+        for resource_update in resource_updates:
+            telemetry[resource_update.pop("thingsboard_id")] = {
+                "current_level": resource_update["new_level"],
+                "percentage_full": resource_update["percentage_full"]
+            }
+        self.topology.patch_actuators(dict.fromkeys(still_stopped, {"last_state_change": current_time, "modified_at": current_time}))
+        if resource_updates:
+            self._resource_levels_committed(resource_updates)
+        self._publish("actuator_status", {"transitions": transitions})
         
-        resource_updates = []
+        synced = self._flush_telemetry(telemetry, f"Emergency stop {batch_id}")
+        self.logger.info(f"Emergency stop {batch_id} settled: {len(resource_updates)} resources updated, "
+                         f"{sum(1 for ok in synced.values() if ok)}/{len(synced)} devices synced")
+    
+    def _run_in_background(self, fn, *args):
+        with self._background_lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="farm-settlement")
+            future = self._background.submit(fn, *args)
+            self._pending.add(future)
+        future.add_done_callback(self._background_done)
+        return future
+    
+    def _background_done(self, future):
+        with self._background_lock:
+            self._pending.discard(future)
+        if future.exception():
+            self.logger.error(f"Background task failed: {future.exception()}", exc_info=future.exception())
+    
+    def wait_for_background(self, timeout=None):
+        """Block until deferred settlement/sync work has finished; returns True if nothing is left pending"""
+        with self._background_lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+    
+    def _resolve_pump_interlocks(self, session, valve_statuses, current_time):
+        """
+        Bring the pumps of the given valves in line with the interlock index: a pump
+        runs while at least one linked valve is open. Must run inside
+        `self.interlocks.transaction()` and the caller's database transaction, after
+        the valve statuses were updated.
         
-        for resource in actuator.resources:
-            # Convert resource values to float if they're stored as strings
-            try:
-                print("resource.current_level", resource.current_level)
-                # check if resource.current_level is a dict or integer
-                if isinstance(resource.current_level, dict):
-                    # Extract the value from the dictionary
-                    current_level = float(resource.current_level.get('value',0.0)) if isinstance(resource.current_level.get("value",0.0), str) else resource.current_level.get('value',0.0) or 0.0
-                else:
-                    current_level = float(resource.current_level) if isinstance(resource.current_level, str) else resource.current_level or 0.0
-                    
-                print("resource.capacity", resource.capacity)
+        Args:
+            valve_statuses: (valve_id, new_status) per valve that changed
             
-                capacity = float(resource.capacity.get('value',0.0)) if isinstance(resource.capacity.get('value',0.0), str) else resource.capacity.get('value',0.0) or 0.0
-            except (ValueError, TypeError):
-                self.logger.warning(f"Invalid resource values for {resource.id}: level={resource.current_level}, capacity={resource.capacity}")
+        Returns:
+            List of (pump row, new status) for pumps whose status changed
+        """
+        targets = self.interlocks.apply(valve_statuses)
+        changes = []
+        for chunk in _chunks(sorted(targets)):
+            for row in session.execute(select(
+                Actuator.id, Actuator.field_id, Actuator.status, Actuator.last_state_change,
+                Actuator.base_speed, Actuator.thingsboard_id
+            ).where(Actuator.id.in_(chunk))):
+                if row.status != targets[row.id]:
+                    changes.append((row, targets[row.id]))
+        
+        for target in ('open', 'close'):
+            ids = [row.id for row, to_status in changes if to_status == target]
+            for chunk in _chunks(ids):
+                session.execute(update(Actuator).where(Actuator.id.in_(chunk)).values(
+                    status=target, last_state_change=current_time))
+        return changes
+    
+    def _settle_resource_consumption(self, session, closing, current_time):
+        """
+        Deduct what the given actuators consumed while open from their resources.
+        
+        Consumption per actuator (flow rate x open time) is spread onto resources
+        through the actuator->resource incidence in one vectorized step, and the new
+        levels are written back with one bulk UPDATE.
+        
+        Returns:
+            (aggregated resource updates, {actuator_id: [per-resource consumption]})
+        """
+        if not closing:
+            return [], {}
+        self.usage.record(session, [(row.id, row.last_state_change, current_time, row.base_speed) for row in closing])
+        
+        actuator_index = {row.id: i for i, row in enumerate(closing)}
+        elapsed = np.array([(current_time - row.last_state_change).total_seconds() for row in closing])
+        flow_per_second = np.array([to_number(row.base_speed) for row in closing]) / 3600.0
+        consumed = np.clip(elapsed, 0, None) * flow_per_second
+        
+        links = []
+        for chunk in _chunks(list(actuator_index)):
+            links.extend(session.execute(select(
+                actuator_resource_association.c.actuator_id, actuator_resource_association.c.resource_id
+            ).where(actuator_resource_association.c.actuator_id.in_(chunk))).all())
+        if not links:
+            return [], {}
+        
+        resource_ids = list(dict.fromkeys(resource_id for _, resource_id in links))
+        resource_index = {rid: i for i, rid in enumerate(resource_ids)}
+        link_actuators = np.array([actuator_index[aid] for aid, _ in links])
+        link_resources = np.array([resource_index[rid] for _, rid in links])
+        link_consumption = consumed[link_actuators]
+        consumption = np.bincount(link_resources, weights=link_consumption, minlength=len(resource_ids))
+        
+        resources = {}
+        for chunk in _chunks(resource_ids):
+            for row in session.execute(select(
+                Resource.id, Resource.name, Resource.current_level, Resource.capacity, Resource.thingsboard_id
+            ).where(Resource.id.in_(chunk))):
+                resources[row.id] = row
+        levels = np.array([to_number(resources[rid].current_level) if rid in resources else 0.0 for rid in resource_ids])
+        capacities = np.array([to_number(resources[rid].capacity) if rid in resources else 0.0 for rid in resource_ids])
+        new_levels = np.round(np.maximum(levels - consumption, 0.0), 2)
+        percentages = np.round(np.divide(new_levels * 100, capacities, out=np.zeros_like(new_levels), where=capacities > 0), 1)
+        
+        resource_updates = []
+        level_params = []
+        for i, rid in enumerate(resource_ids):
+            if rid not in resources or consumption[i] <= 0:
                 continue
-            
-            # Calculate consumption
-            consumption = flow_rate_per_second * time_open_seconds
-            
-            # Ensure we don't go below zero
-            new_level = max(0.0, current_level - consumption)
-            
-            # Store original level for reporting
-            original_level = current_level
-            
-            # Update resource level
-            resource.current_level = round(new_level, 2)
-            
-            # Prepare update info for return
-            resource_update = {
-                "resource_id": resource.id,
+            resource = resources[rid]
+            stored_level = with_number(resource.current_level, float(new_levels[i]))
+            level_params.append({"id": rid, "current_level": stored_level})
+            resource_updates.append({
+                "resource_id": rid,
                 "resource_name": resource.name,
-                "original_level": original_level,
-                "consumption": round(consumption, 2),
-                "new_level": resource.current_level,
-                "percentage_full": round((resource.current_level / capacity * 100) if capacity > 0 else 0, 1)
-            }
-            
-            resource_updates.append(resource_update)
-            
-            # Sync with ThingsBoard
-            self._sync_resource_with_thingsboard(resource.thingsboard_id, {
-                "current_level": resource.current_level,
-                "percentage_full": resource_update["percentage_full"]
+                "original_level": float(levels[i]),
+                "consumption": round(float(consumption[i]), 2),
+                "new_level": float(new_levels[i]),
+                "percentage_full": float(percentages[i]),
+                "stored_level": stored_level,
+                "thingsboard_id": resource.thingsboard_id
             })
-            
-            self.logger.info(f"Resource {resource.id} updated: consumed {consumption:.2f} units, new level: {resource.current_level:.2f}")
+        if level_params:
+            session.execute(update(Resource), level_params)
         
-        return resource_updates
+        consumption_by_actuator = {}
+        for (aid, rid), amount in zip(links, link_consumption):
+            consumption_by_actuator.setdefault(aid, []).append({"resource_id": rid, "consumption": round(float(amount), 2)})
+        return resource_updates, consumption_by_actuator
     
     def update_all_open_actuator_resources(self):
         """
         Update resources for all currently open actuators
         This should be called periodically to keep resource levels accurate
+        (`tick_engine.start()` does so on a background thread)
         """
-        current_time = datetime.datetime.now()
-        resources_updated = []
-        
-        with self.session_factory() as session:
-            # Get all open actuators
-            open_actuators = session.query(Actuator).filter(
-                Actuator.status == 'open',
-                Actuator.last_state_change != None
-            ).options(
-                joinedload(Actuator.resources)
-            ).all()
-            
-            for actuator in open_actuators:
-                # Calculate time since last update
-                if not actuator.last_state_change:
-                    continue
-                    
-                time_open = (current_time - actuator.last_state_change).total_seconds()
-                
-                # Calculate and apply resource consumption
-                resource_updates = self._calculate_resource_consumption(session, actuator, time_open)
-                
-                if resource_updates:
-                    # Update the last_state_change to reset the timer
-                    actuator.last_state_change = current_time
-                    resources_updated.extend(resource_updates)
-            
-            # Commit all changes at once
-            session.commit()
-            
-        return {
-            "timestamp": current_time,
-            "actuators_updated": len(open_actuators),
-            "resource_updates": resources_updated
-        }
+        return self.tick_engine.tick()
+    
+    def _tick_committed(self, result):
+        """Patch caches, notify listeners and batch telemetry after a resource tick commits"""
+        timestamp = result["timestamp"]
+        self.topology.patch_actuators({
+            actuator_id: {"last_state_change": timestamp} for actuator_id in result["reset_actuator_ids"]
+        })
+        if result["resource_updates"]:
+            self._resource_levels_committed(result["resource_updates"])
+        self._publish("actuator_timers", {"actuator_ids": result["reset_actuator_ids"], "ts": timestamp})
+        self.forecast.check_alerts()
+        if result["resource_updates"]:
+            thingsboard_ids = result["thingsboard_ids"]
+            send_telemetry_batch({
+                thingsboard_ids[update["resource_id"]]: {
+                    "current_level": update["new_level"],
+                    "percentage_full": update["percentage_full"]
+                } for update in result["resource_updates"] if thingsboard_ids.get(update["resource_id"])
+            })
     
     def get_resource_consumption_rate(self, resource_id):
         """
@@ -614,76 +878,24 @@ class FarmControlService:
                 "open_actuators": actuator_details
             }
             
-    def _update_linked_pumps(self, session, valve, new_status):
-        changed_pumps = []
-        
-        for pump in valve.linked_pumps:
-            original_status = pump.status
-            should_update = False
-            
-            if new_status == 'open':
-                # If valve is opening, open the pump
-                pump.status = 'open'
-                should_update = True
-            elif new_status == 'close':
-                # If valve is closing, check if any other linked valves are still open
-                all_valves_closed = True
-                for linked_valve in pump.linked_valves:
-                    if linked_valve.id != valve.id and linked_valve.status == 'open':
-                        all_valves_closed = False
-                        break
-                
-                if all_valves_closed:
-                    pump.status = 'close'
-                    should_update = True
-            
-            # Keep track of changed pumps for ThingsBoard sync
-            if should_update and original_status != pump.status:
-                changed_pumps.append(pump)
-        
-        # Update the pump status in the database
-        session.commit()
-        
-        # Sync changed pumps with ThingsBoard
-        for changed_pump in changed_pumps:
-            with self.session_factory() as sync_session:
-                pump = sync_session.query(Actuator).filter(Actuator.id == changed_pump.id).first()
-                if pump:
-                    # Switch case to map status to ThingsBoard telemetry
-                    if pump.status == 'open':
-                        telemetry_data = {"deviceState": 1}
-                    elif pump.status == 'close':
-                        telemetry_data = {"deviceState": 0}
-                    else:
-                        telemetry_data = {"deviceState": -1}
-                    self._sync_actuator_with_thingsboard(changed_pump.thingsboard_id, telemetry_data)
-    
-    def _sync_actuator_with_thingsboard(self, actuator_id, telemetry_data):
-        """Synchronize actuator state with ThingsBoard."""
-        try:
-            # Get JWT token for authentication
-            jwt_token = get_jwt_token()
-            if not jwt_token:
-                return False
-            
-            # Get device token for the actuator
-            device_token = get_device_token(jwt_token, actuator_id)
-            if not device_token:
-               print("[INFO]Device token not found on ThingsBoard.")
-               return False
-            
-            print("[INFO]Device token found on ThingsBoard:", device_token)
-            print("[INFO]Telemetry data to be sent:", telemetry_data)
-            # Send telemetry data to ThingsBoard
-            result = send_telemetry(device_token, telemetry_data)
-            
-            print("[INFO]Response from Thingsboard:", result)
-            
-            return result
-        except Exception as e:
-            import logging
-            logging.error(f"Failed to sync actuator with ThingsBoard: {str(e)}")
-            return False
+    def _actuator_status_committed(self, transitions, resource_updates=None):
+        """Patch the topology snapshot and notify listeners after actuator transitions commit"""
+        self.event_log.committed(len(transitions))
+        self.topology.patch_actuators({
+            t["actuator_id"]: {"status": t["to"], "last_state_change": t["ts"], "modified_at": t["ts"]}
+            for t in transitions
+        })
+        if resource_updates:
+            self._resource_levels_committed(resource_updates)
+        self._publish("actuator_status", {"transitions": transitions})
+    
+    def _resource_levels_committed(self, resource_updates):
+        """Patch the topology snapshot and notify listeners after resource levels commit"""
+        self.topology.patch_resources({
+            update["resource_id"]: {"current_level": update.get("stored_level", update["new_level"])}
+            for update in resource_updates
+        })
+        self._publish("resource_level", {"resources": resource_updates})
     
     def get_resource_dependent_actuators(self, resource_id, include_related=True):
         """Get all actuators that depend on a specific resource"""
@@ -697,17 +909,74 @@ class FarmControlService:
             
             return [actuator.to_dict(include_related=include_related) for actuator in resource.actuators]
             
-    def create_irrigation_schedule(self, field_id, schedule_data):
+    def get_usage_report(self, scope, ids=None, field_name=None, actuator_type=None, days=7):
         """
-        Placeholder for creating irrigation schedules.
-        In a real system, this would interact with a scheduling system.
+        Runtime and estimated volume from the daily rollups.
+        
+        Args:
+            scope: 'actuator', 'field' or 'resource'
+            ids: ids to report on (for actuators, or instead resolved from field_name)
+            field_name: report on this field, or with scope 'actuator' on its actuators
+            actuator_type: with scope 'actuator', only actuators of this type
+            days: number of days up to and including today
+            
+        Returns:
+            Dictionary with the period and per-id runtime (seconds, hours) and volume
         """
+        snapshot = self.topology.snapshot()
+        ids = list(ids or [])
+        if field_name:
+            field_ids = snapshot.field_ids_by_name(field_name)
+            if not field_ids:
+                return {"error": f"Field {field_name} not found"}
+            if scope == "field":
+                ids.extend(field_ids)
+            elif scope == "actuator":
+                ids.extend(aid for fid in field_ids for aid in snapshot.edges["actuators_by_field"].get(fid, ()))
+            else:
+                ids.extend(rid for fid in field_ids for rid in snapshot.edges["resources_by_field"].get(fid, ()))
+        if scope == "actuator" and actuator_type:
+            ids = [aid for aid in ids if aid in snapshot.actuators and snapshot.actuators[aid]["type"] == actuator_type]
+        if not ids:
+            return {"error": "Nothing to report on; pass ids or field_name"}
+        
+        today = datetime.date.today()
+        start_day = today - datetime.timedelta(days=max(days, 1) - 1)
+        try:
+            usage = self.usage.usage(scope, dict.fromkeys(ids), start_day, today)
+        except ValueError as e:
+            return {"error": str(e)}
+        names = snapshot.actuators if scope == "actuator" else snapshot.fields if scope == "field" else snapshot.resources
         return {
-            "field_id": field_id,
-            "schedule": schedule_data,
-            "status": "created"
+            "scope": scope,
+            "from": start_day.isoformat(),
+            "to": today.isoformat(),
+            "usage": [{
+                "id": key,
+                "name": names[key]["name"] if key in names else None,
+                "runtime_seconds": totals["runtime_seconds"],
+                "runtime_hours": round(totals["runtime_seconds"] / 3600, 2),
+                "volume": totals["volume"]
+            } for key, totals in usage.items()]
         }
     
+    def create_irrigation_schedule(self, field_id, schedule_data):
+        """
+        Create a persistent recurring irrigation schedule for a field.
+        See IrrigationScheduler.create_schedule for the accepted schedule_data.
+        """
+        return self.scheduler.create_schedule(field_id, schedule_data)
+
+    def plan_irrigation(self, demands, execute=False, **options):
+        """
+        Plan (and optionally execute) irrigation for many fields within pump and tank limits.
+        See IrrigationPlanner.plan for the accepted demands and options.
+        """
+        plan = self.planner.plan(demands, **options)
+        if execute and "error" not in plan:
+            plan["execution"] = self.planner.execute(plan)
+        return plan
+    
     def update_resource_level(self, resource_id, new_level):
         """Update a resource's current level"""
         with self.session_factory() as session:
@@ -721,6 +990,10 @@ class FarmControlService:
             # Update resource level in local database
             resource.current_level = new_level
             session.commit()
+            self._resource_levels_committed([{
+                "resource_id": resource_id, "resource_name": resource.name,
+                "original_level": original_level, "new_level": new_level
+            }])
             
             # Sync with ThingsBoard
             self._sync_resource_with_thingsboard(resource.thingsboard_id, {
@@ -748,7 +1021,7 @@ class FarmControlService:
             # Get device token for the resource
             device_token = get_device_token(jwt_token, resource_id)
             if not device_token:
-                print("[INFO]Device token not found on ThingsBoard.")
+                self.logger.warning(f"Device token for resource {resource_id} not found on ThingsBoard")
                 return False
             
             # Send telemetry data to ThingsBoard
@@ -788,6 +1061,7 @@ class FarmControlService:
                     if tb_device_id:
                         sensor.thingsboard_id = tb_device_id
                         session.commit()
+                        self._topology_changed("sensor", sensor_id)
                 
                 # Send telemetry to ThingsBoard
                 device_token = get_device_token(jwt_token, sensor.thingsboard_id)
@@ -923,27 +1197,145 @@ class FarmControlService:
                         "status": "synced"
                     })
         
+        self._topology_changed("devices", None)
         return results
     
-    def get_farm_summary(self):
-        """Get a summary of the farm's current state"""
-        with self.session_factory() as session:
-            fields = session.query(Field).all()
-            summary = {
-                "total_fields": len(fields),
-                "total_actuators": 0,
-                "total_sensors": 0,
-                "total_resources": 0
-            }
-            
-            for field in fields:
-                summary["total_actuators"] += len(field.actuators)
-                summary["total_sensors"] += len(field.sensors)
-                summary["total_resources"] += len(field.resources)
-                summary["active_devices"] = self.get_active_actuators(include_related=False)
-                summary["inactive_devices"] = self.get_inactive_actuators(include_related=False)
+    def get_farm_summary(self, farm_id=None, include_fields=False):
+        """
+        Get a summary of the farm's current state using grouped aggregate queries.
+        
+        Counts are computed per field in SQL and rolled up per farm, and the open and
+        closed actuators are read as column tuples, so the summary takes two
+        statements regardless of farm size. Resource levels come from the topology
+        snapshot, which every level write patches. Totals count every field
+        (total_resources counts field-resource links, as the per-field walk did);
+        fields and resources without a farm are left out of the per-farm entries.
+        
+        Args:
+            farm_id: Restrict the summary to one farm (default: all farms)
+            include_fields: Add a per-field breakdown
             
-            return summary
+        Returns:
+            Dictionary with totals, per-farm counts, resource fill percentages and
+            the open/closed actuators (active_devices/inactive_devices)
+        """
+        with self.session_factory() as session:
+            sensor_counts = select(
+                Sensor.field_id, func.count(Sensor.id).label("sensors")
+            ).group_by(Sensor.field_id).subquery()
+            actuator_counts = select(
+                Actuator.field_id,
+                func.count(Actuator.id).label("actuators"),
+                func.sum(case((Actuator.status == 'open', 1), else_=0)).label("open"),
+                func.sum(case((Actuator.status == 'close', 1), else_=0)).label("closed")
+            ).group_by(Actuator.field_id).subquery()
+            resource_counts = select(
+                field_resource_association.c.field_id,
+                func.count(func.distinct(field_resource_association.c.resource_id)).label("resources")
+            ).group_by(field_resource_association.c.field_id).subquery()
+            
+            counts = [
+                func.coalesce(sensor_counts.c.sensors, 0),
+                func.coalesce(actuator_counts.c.actuators, 0),
+                func.coalesce(actuator_counts.c.open, 0),
+                func.coalesce(actuator_counts.c.closed, 0),
+                func.coalesce(resource_counts.c.resources, 0)
+            ]
+            if include_fields:
+                columns = [Field.farm_id, Field.id, Field.name, literal(1)] + [count.label(f"c{i}") for i, count in enumerate(counts)]
+            else:
+                columns = [Field.farm_id, literal(None), literal(None), func.count(Field.id)] + [func.sum(count) for count in counts]
+            
+            stmt = select(*columns).select_from(Field) \
+                .outerjoin(sensor_counts, sensor_counts.c.field_id == Field.id) \
+                .outerjoin(actuator_counts, actuator_counts.c.field_id == Field.id) \
+                .outerjoin(resource_counts, resource_counts.c.field_id == Field.id)
+            if farm_id:
+                stmt = stmt.where(Field.farm_id == farm_id)
+            if not include_fields:
+                stmt = stmt.group_by(Field.farm_id)
+            field_rows = session.execute(stmt).all()
+            
+            # The to_dict(include_related=False) shape without hydrating ORM objects
+            projection = Projection("actuator")
+            device_stmt = select(*projection.columns).where(Actuator.status.in_(['open', 'close']))
+            if farm_id:
+                device_stmt = device_stmt.join(Field, Actuator.field_id == Field.id).where(Field.farm_id == farm_id)
+            devices = {'open': [], 'close': []}
+            for row in session.execute(device_stmt.order_by(Actuator.id)):
+                device = projection.record(row)
+                devices[device["status"]].append(device)
+        
+        farms = {}
+        fields = []
+        totals = dict.fromkeys(("fields", "sensors", "actuators", "active_actuators", "inactive_actuators", "linked_resources"), 0)
+        for row_farm_id, field_id, field_name, field_count, sensors, actuators, open_count, closed_count, resources in field_rows:
+            targets = [totals]
+            if row_farm_id is not None:
+                targets.append(farms.setdefault(row_farm_id, self._empty_farm_summary(row_farm_id)))
+            for farm in targets:
+                farm["fields"] += field_count
+                farm["sensors"] += sensors
+                farm["actuators"] += actuators
+                farm["active_actuators"] += open_count
+                farm["inactive_actuators"] += closed_count
+            totals["linked_resources"] += resources
+            if include_fields:
+                fields.append({
+                    "field_id": field_id, "name": field_name, "farm_id": row_farm_id, "sensors": sensors,
+                    "actuators": actuators, "active_actuators": open_count, "inactive_actuators": closed_count,
+                    "resources": resources
+                })
+        
+        resource_levels = []
+        for resource in sorted(self.topology.snapshot().resources.values(), key=lambda r: r["id"]):
+            resource_farm_id = resource["farm_id"]
+            if farm_id and resource_farm_id != farm_id:
+                continue
+            current_level = to_number(resource["current_level"], default=None)
+            resource_capacity = to_number(resource["capacity"], default=None)
+            percentage = None
+            if resource_capacity and resource_capacity > 0:
+                percentage = round((current_level or 0) * 100.0 / resource_capacity, 1)
+            resource_levels.append({
+                "id": resource["id"], "name": resource["name"], "farm_id": resource_farm_id,
+                "content": resource["content"], "current_level": current_level,
+                "capacity": resource_capacity, "percentage_full": percentage
+            })
+            if resource_farm_id is not None:
+                farms.setdefault(resource_farm_id, self._empty_farm_summary(resource_farm_id))["resources"].append(resource_levels[-1])
+        
+        for farm in farms.values():
+            # Fill percentage of the farm's combined storage capacity
+            total_capacity = sum(r["capacity"] or 0 for r in farm["resources"])
+            if total_capacity > 0:
+                total_level = sum(r["current_level"] or 0 for r in farm["resources"] if r["capacity"])
+                farm["resource_fill_percentage"] = round(total_level * 100.0 / total_capacity, 1)
+            farm["resources"] = len(farm["resources"])
+        
+        summary = {
+            "total_farms": len(farms),
+            "total_fields": totals["fields"],
+            "total_actuators": totals["actuators"],
+            "total_sensors": totals["sensors"],
+            "total_resources": totals["linked_resources"],
+            "active_actuators": totals["active_actuators"],
+            "inactive_actuators": totals["inactive_actuators"],
+            "active_devices": devices['open'],
+            "inactive_devices": devices['close'],
+            "farms": list(farms.values()),
+            "resources": resource_levels
+        }
+        if include_fields:
+            summary["fields"] = fields
+        return summary
+    
+    @staticmethod
+    def _empty_farm_summary(farm_id):
+        return {
+            "farm_id": farm_id, "fields": 0, "sensors": 0, "actuators": 0,
+            "active_actuators": 0, "inactive_actuators": 0, "resources": [], "resource_fill_percentage": None
+        }
     
     def create_custom_rulechain(self,telemtery_key:str,threshold_value:str)->str:
         """
@@ -0,0 +1,450 @@
+from models.models import Field, IrrigationSchedule
+from sqlalchemy import select
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import threading
+import uuid
+import zlib
+
+logger = logging.getLogger("IrrigationScheduler")
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+CATCH_UP_POLICIES = ("remaining", "full", "skip")
+IRRIGATION_TYPES = ("pumps", "water_valves")
+
+# Upper bound on ids per IN (...) clause
+IN_CLAUSE_CHUNK = 5000
+
+# Events due within this window of each other are dispatched as one batch
+COALESCE_SECONDS = 1.0
+
+
+def _parse_start_time(value):
+    hours, minutes = (int(part) for part in str(value).split(":"))
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid start_time {value}")
+    return datetime.time(hours, minutes)
+
+
+def next_occurrence(start_time, days, after):
+    """First start of a (start_time, days) recurrence strictly after `after`"""
+    start = _parse_start_time(start_time)
+    weekdays = {WEEKDAYS.index(day.lower()) for day in days} if days else set(range(7))
+    for offset in range(8):
+        date = after.date() + datetime.timedelta(days=offset)
+        candidate = datetime.datetime.combine(date, start)
+        if candidate > after and candidate.weekday() in weekdays:
+            return candidate
+    return None
+
+
+def _advance(schedule, after):
+    """Next start of a schedule after `after`; one-off runs have none"""
+    if schedule.once:
+        return None
+    return next_occurrence(schedule.start_time, schedule.days, after)
+
+
+def jitter_offset(schedule_id, jitter_seconds):
+    """Stable per-schedule start offset in [0, jitter_seconds]"""
+    if not jitter_seconds:
+        return 0
+    return zlib.crc32(schedule_id.encode()) % (int(jitter_seconds) + 1)
+
+
+class IrrigationScheduler:
+    """
+    Persistent irrigation scheduler.
+
+    Schedules live in the `irrigation_schedules` table with their next start time
+    (`next_run_at`) and, while irrigating, the planned stop time (`active_until`).
+    The dispatcher keeps a min-heap of start/stop events and its thread sleeps until
+    the earliest one is due. Events that fall due together are executed as a single
+    `update_actuator_statuses` batch, and each schedule's start is offset by a stable
+    jitter of up to `jitter_seconds`, so many fields sharing a start time are spread
+    out instead of hitting the database and ThingsBoard at once.
+
+    After a restart `start()` catches up from the table: runs whose stop time has
+    passed are closed, running ones get their stop event back, and missed starts are
+    handled per schedule with `catch_up` = 'remaining' (irrigate for what is left of
+    the missed window), 'full' (irrigate once for the full duration) or 'skip'.
+    """
+
+    def __init__(self, farm_service, clock=datetime.datetime.now):
+        self.farm_service = farm_service
+        self.session_factory = farm_service.session_factory
+        self.clock = clock
+        self.logger = logger
+
+        self._heap = []
+        self._sequence = itertools.count()
+        # Events carry the generation they were scheduled with; bumping it cancels them
+        self._generation = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.dispatched = {"start": 0, "stop": 0, "batches": 0}
+
+    # Lifecycle
+    def start(self):
+        """Load schedules, catch up on missed runs and start the dispatcher thread (idempotent)"""
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+        report = self.load()
+        self._thread = threading.Thread(target=self._run, name="irrigation-scheduler", daemon=True)
+        self._thread.start()
+        return report
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    wait = self._seconds_until_next()
+                    if wait is not None and wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stopping:
+                    return
+            try:
+                self.run_pending()
+            except Exception as e:
+                self.logger.error(f"Irrigation dispatch failed: {str(e)}", exc_info=True)
+
+    def _seconds_until_next(self):
+        while self._heap and not self._current(self._heap[0]):
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return (self._heap[0][0] - self.clock()).total_seconds()
+
+    # Event queue
+    def _push(self, due, kind, schedule_id):
+        key = (schedule_id, kind)
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._sequence), kind, schedule_id, self._generation.get(key, 0)))
+            self._cond.notify_all()
+
+    def _cancel(self, schedule_id, kind):
+        key = (schedule_id, kind)
+        with self._cond:
+            self._generation[key] = self._generation.get(key, 0) + 1
+            self._cond.notify_all()
+
+    def _current(self, event):
+        _, _, kind, schedule_id, generation = event
+        return self._generation.get((schedule_id, kind), 0) == generation
+
+    def _schedule_start(self, schedule):
+        if schedule.status == 'active' and schedule.next_run_at:
+            offset = jitter_offset(schedule.id, schedule.jitter_seconds)
+            self._push(schedule.next_run_at + datetime.timedelta(seconds=offset), "start", schedule.id)
+
+    def load(self):
+        """Rebuild the event queue from the table, applying catch-up to anything missed while down"""
+        now = self.clock()
+        report = {"scheduled": 0, "resumed": 0, "closed_overdue": 0, "caught_up": 0, "skipped": 0}
+        with self._cond:
+            self._heap = []
+            self._generation = {}
+        catch_up_runs = []
+        with self.session_factory() as session:
+            schedules = session.execute(select(IrrigationSchedule)).scalars().all()
+            for schedule in schedules:
+                if schedule.active_until:
+                    # Irrigation was running when the process stopped
+                    self._push(max(schedule.active_until, now), "stop", schedule.id)
+                    report["resumed" if schedule.active_until > now else "closed_overdue"] += 1
+                if schedule.status != 'active':
+                    continue
+                if schedule.next_run_at is None:
+                    schedule.next_run_at = _advance(schedule, now)
+                elif schedule.next_run_at <= now and not schedule.active_until:
+                    missed_end = schedule.next_run_at + datetime.timedelta(minutes=schedule.duration_minutes)
+                    if schedule.catch_up == 'full' or (schedule.catch_up == 'remaining' and missed_end > now):
+                        until = missed_end if schedule.catch_up == 'remaining' else \
+                            now + datetime.timedelta(minutes=schedule.duration_minutes)
+                        catch_up_runs.append((schedule.id, until))
+                        report["caught_up"] += 1
+                    else:
+                        report["skipped"] += 1
+                        if schedule.once:
+                            schedule.status = 'completed'
+                    schedule.next_run_at = _advance(schedule, now)
+                elif schedule.next_run_at <= now:
+                    schedule.next_run_at = _advance(schedule, now)
+                self._schedule_start(schedule)
+                report["scheduled"] += 1
+            session.commit()
+
+        if catch_up_runs:
+            self._execute(starts=catch_up_runs, stops=[], now=now)
+        self.logger.info(f"Irrigation schedules loaded: {report}")
+        return report
+
+    def run_pending(self, now=None):
+        """Dispatch every event due by `now` (plus the coalescing window) as one batch"""
+        now = now or self.clock()
+        horizon = now + datetime.timedelta(seconds=COALESCE_SECONDS)
+        starts, stops = [], []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= horizon:
+                event = heapq.heappop(self._heap)
+                if not self._current(event):
+                    continue
+                _, _, kind, schedule_id, _ = event
+                (starts if kind == "start" else stops).append(schedule_id)
+        if not starts and not stops:
+            return None
+        return self._execute(starts=[(schedule_id, None) for schedule_id in starts], stops=stops, now=now)
+
+    def _execute(self, starts, stops, now):
+        """Open/close the actuators of the given schedules and persist their new state"""
+        snapshot = self.farm_service.topology.snapshot()
+        open_ids, close_ids = [], []
+        started, stopped = [], []
+        with self.session_factory() as session:
+            with session.begin():
+                schedules = {}
+                ids = list(dict.fromkeys(stops + [schedule_id for schedule_id, _ in starts]))
+                for offset in range(0, len(ids), IN_CLAUSE_CHUNK):
+                    chunk = ids[offset:offset + IN_CLAUSE_CHUNK]
+                    for schedule in session.execute(select(IrrigationSchedule).where(IrrigationSchedule.id.in_(chunk))).scalars():
+                        schedules[schedule.id] = schedule
+                for schedule_id in stops:
+                    schedule = schedules.get(schedule_id)
+                    if schedule is None:
+                        continue
+                    close_ids.extend(self._actuators_for(schedule, snapshot))
+                    schedule.active_until = None
+                    if schedule.once:
+                        schedule.status = 'completed'
+                    stopped.append(schedule_id)
+                for schedule_id, until in starts:
+                    schedule = schedules.get(schedule_id)
+                    if schedule is None or schedule.status != 'active':
+                        continue
+                    if until is None:
+                        until = now + datetime.timedelta(minutes=schedule.duration_minutes)
+                        schedule.next_run_at = _advance(schedule, now)
+                        self._schedule_start(schedule)
+                    open_ids.extend(self._actuators_for(schedule, snapshot))
+                    schedule.last_run_at = now
+                    schedule.active_until = until
+                    # A run that overlaps the previous one extends it
+                    self._cancel(schedule.id, "stop")
+                    self._push(until, "stop", schedule.id)
+                    started.append(schedule_id)
+
+                # Actuators that another schedule keeps running are not closed: the ones
+                # opened by this batch and those of every run that has not ended yet
+                keep_open = set(open_ids)
+                if close_ids:
+                    running = session.execute(select(IrrigationSchedule).where(
+                        IrrigationSchedule.active_until > now, IrrigationSchedule.id.not_in(stopped)
+                    )).scalars()
+                    for schedule in running:
+                        keep_open.update(self._actuators_for(schedule, snapshot))
+
+        open_ids = list(dict.fromkeys(open_ids))
+        close_ids = [actuator_id for actuator_id in dict.fromkeys(close_ids) if actuator_id not in keep_open]
+        results = {}
+        if close_ids:
+            results["close"] = self.farm_service.update_actuator_statuses(close_ids, 'close', cause="schedule")
+        if open_ids:
+            results["open"] = self.farm_service.update_actuator_statuses(open_ids, 'open', cause="schedule")
+        self.dispatched["start"] += len(started)
+        self.dispatched["stop"] += len(stopped)
+        self.dispatched["batches"] += 1
+        self.logger.info(f"Irrigation dispatch: started {len(started)}, stopped {len(stopped)} schedules "
+                         f"({len(open_ids)} actuators opened, {len(close_ids)} closed)")
+        return {"started": started, "stopped": stopped, "results": results}
+
+    def end_running(self):
+        """
+        End every run in progress without touching the actuators, after an emergency
+        stop closed them: the stop events are cancelled and one-off runs completed,
+        so no later dispatch treats the runs as still irrigating. Future starts stay
+        scheduled.
+
+        Returns:
+            Ids of the schedules whose run was ended
+        """
+        with self.session_factory() as session:
+            with session.begin():
+                running = session.execute(select(IrrigationSchedule).where(
+                    IrrigationSchedule.active_until != None)).scalars().all()
+                ended = []
+                for schedule in running:
+                    schedule.active_until = None
+                    if schedule.once:
+                        schedule.status = 'completed'
+                    ended.append(schedule.id)
+        for schedule_id in ended:
+            self._cancel(schedule_id, "stop")
+        if ended:
+            self.logger.warning(f"Ended {len(ended)} running irrigation schedules")
+        return ended
+
+    @staticmethod
+    def _actuators_for(schedule, snapshot):
+        if schedule.actuator_ids:
+            return list(schedule.actuator_ids)
+        return [actuator["id"] for actuator in snapshot.actuators_for_field(schedule.field_id, include_related=False)
+                if actuator["type"] in IRRIGATION_TYPES]
+
+    # Schedule management
+    def create_schedule(self, field_id, schedule_data):
+        """
+        Create a recurring irrigation schedule for a field.
+
+        Args:
+            field_id: ID of the field
+            schedule_data: dict or JSON string with start_time ("HH:MM"), duration
+                (minutes) and optionally days (weekday names, default every day),
+                actuator_ids, jitter_seconds and catch_up ('remaining', 'full', 'skip').
+                With start_at (ISO datetime) instead of start_time it is a one-off run.
+
+        Returns:
+            The stored schedule or {"error": ...}
+        """
+        if isinstance(schedule_data, str):
+            try:
+                schedule_data = json.loads(schedule_data)
+            except ValueError:
+                return {"error": "schedule_data must be a JSON object"}
+        if not isinstance(schedule_data, dict):
+            return {"error": "schedule_data must be a JSON object"}
+
+        try:
+            start_at = schedule_data.get("start_at")
+            if start_at:
+                start_at = datetime.datetime.fromisoformat(start_at) if isinstance(start_at, str) else start_at
+                schedule_data = {**schedule_data, "start_time": start_at.strftime("%H:%M")}
+            start_time = schedule_data.get("start_time")
+            _parse_start_time(start_time)
+            duration = int(schedule_data.get("duration", schedule_data.get("duration_minutes", 0)))
+            days = schedule_data.get("days") or None
+            if days and any(str(day).lower() not in WEEKDAYS for day in days):
+                raise ValueError(f"Invalid days {days}")
+            jitter = int(schedule_data.get("jitter_seconds", 0))
+        except (TypeError, ValueError) as e:
+            return {"error": f"Invalid schedule: {str(e)}"}
+        if duration <= 0:
+            return {"error": "Invalid schedule: duration must be a positive number of minutes"}
+        catch_up = schedule_data.get("catch_up", "remaining")
+        if catch_up not in CATCH_UP_POLICIES:
+            return {"error": f"Invalid catch_up. Must be one of {list(CATCH_UP_POLICIES)}"}
+
+        with self.session_factory() as session:
+            if session.get(Field, field_id) is None:
+                return {"error": f"Field {field_id} not found"}
+            schedule = IrrigationSchedule(
+                id=f"SCH-{uuid.uuid4().hex[:8]}",
+                field_id=field_id,
+                actuator_ids=schedule_data.get("actuator_ids"),
+                start_time=start_time,
+                duration_minutes=duration,
+                days=[day.lower() for day in days] if days else None,
+                once=bool(start_at),
+                jitter_seconds=jitter,
+                catch_up=catch_up,
+                status='active',
+                next_run_at=start_at or next_occurrence(start_time, days, self.clock())
+            )
+            session.add(schedule)
+            session.commit()
+            self._schedule_start(schedule)
+            return {**schedule.to_dict(), "status": "created"}
+
+    def create_runs(self, runs, catch_up='remaining'):
+        """
+        Bulk-create one-off runs in one transaction (used to execute irrigation plans).
+
+        Args:
+            runs: iterable of {"field_id", "start_at" (datetime), "duration_minutes",
+                "actuator_ids" (optional)}
+
+        Returns:
+            List of the created schedule ids, in input order
+        """
+        schedules = [IrrigationSchedule(
+            id=f"SCH-{uuid.uuid4().hex[:8]}",
+            field_id=run["field_id"],
+            actuator_ids=run.get("actuator_ids"),
+            start_time=run["start_at"].strftime("%H:%M"),
+            duration_minutes=run["duration_minutes"],
+            days=None,
+            once=True,
+            jitter_seconds=0,
+            catch_up=catch_up,
+            status='active',
+            next_run_at=run["start_at"]
+        ) for run in runs]
+        with self.session_factory() as session:
+            session.add_all(schedules)
+            session.commit()
+            for schedule in schedules:
+                self._schedule_start(schedule)
+            return [schedule.id for schedule in schedules]
+
+    def list_schedules(self, field_id=None):
+        with self.session_factory() as session:
+            query = select(IrrigationSchedule).order_by(IrrigationSchedule.next_run_at)
+            if field_id:
+                query = query.where(IrrigationSchedule.field_id == field_id)
+            return [schedule.to_dict() for schedule in session.execute(query).scalars()]
+
+    def set_paused(self, schedule_id, paused=True):
+        """Pause (no further starts; a running irrigation finishes) or resume a schedule"""
+        with self.session_factory() as session:
+            schedule = session.get(IrrigationSchedule, schedule_id)
+            if schedule is None:
+                return {"error": f"Schedule {schedule_id} not found"}
+            self._cancel(schedule_id, "start")
+            if paused:
+                schedule.status = 'paused'
+            elif schedule.status == 'completed':
+                return {"error": f"Schedule {schedule_id} already ran"}
+            else:
+                schedule.status = 'active'
+                if not schedule.once or schedule.next_run_at is None:
+                    schedule.next_run_at = _advance(schedule, self.clock())
+                self._schedule_start(schedule)
+            session.commit()
+            return schedule.to_dict()
+
+    def delete_schedule(self, schedule_id):
+        """Delete a schedule, stopping its irrigation if it is running"""
+        with self.session_factory() as session:
+            schedule = session.get(IrrigationSchedule, schedule_id)
+            if schedule is None:
+                return {"error": f"Schedule {schedule_id} not found"}
+            running = schedule.active_until is not None
+        self._cancel(schedule_id, "start")
+        self._cancel(schedule_id, "stop")
+        if running:
+            self._execute(starts=[], stops=[schedule_id], now=self.clock())
+        with self.session_factory() as session:
+            session.query(IrrigationSchedule).filter(IrrigationSchedule.id == schedule_id).delete()
+            session.commit()
+        return {"id": schedule_id, "status": "deleted", "stopped_running_irrigation": running}
+
+    def get_stats(self):
+        with self._cond:
+            pending = sum(1 for event in self._heap if self._current(event))
+            next_due = min((event[0] for event in self._heap if self._current(event)), default=None)
+        return {"pending_events": pending, "next_event_at": next_due, "dispatched": dict(self.dispatched),
+                "running": bool(self._thread and self._thread.is_alive())}
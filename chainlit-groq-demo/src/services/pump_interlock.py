@@ -0,0 +1,238 @@
+from models.models import Actuator, pump_valve_association
+from sqlalchemy import select
+import contextlib
+import logging
+import threading
+
+logger = logging.getLogger("PumpInterlock")
+
+PUMP_TYPES = ('pumps',)
+VALVE_TYPES = ('water_valves', 'fertilizer_dispensers')
+
+
+class PumpInterlockIndex:
+    """
+    Incremental pump/valve interlock state.
+
+    A pump runs while at least one of its linked valves is open. Opening a valve
+    starts its pumps and closing one stops those with no other open valve; a valve
+    in any other status ('changing state') does not count as open but leaves its
+    pumps as they are, as the per-valve relationship walk did. Instead of walking
+    the pump->valve relationships on every transition, the index keeps the valve
+    graph from `pump_valve_association` and an open-valve counter per pump. Each
+    valve transition adjusts the counters of its pumps in O(pumps of the valve), and
+    a pump's target status only changes when its counter crosses zero or one of
+    its valves closes.
+
+    Writers apply valve transitions inside `transaction()`, which holds the index
+    lock for the duration of their database transaction and restores the counters
+    if it fails, so the counters always match committed valve state. The graph is
+    validated and rebuilt from the database by `rebuild()` (at startup and after
+    structural changes).
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._lock = threading.RLock()
+        self._dirty = True
+        self._pumps_by_valve = {}
+        self._valves_by_pump = {}
+        self._open_valves = set()
+        # Valves in another status than open/close ('changing state')
+        self._held_valves = set()
+        self._open_counts = {}
+        self._undo = None
+        self.report = None
+
+    # Index maintenance
+    def rebuild(self):
+        """
+        Rebuild the graph and counters from the database.
+
+        Association rows that reference a missing actuator, or do not link a pump to
+        a valve, are left out of the graph; pumps whose stored status disagrees with
+        their open valves are reported.
+
+        Returns:
+            Validation report
+        """
+        with self.session_factory() as session:
+            actuators = {row.id: row for row in session.execute(select(Actuator.id, Actuator.type, Actuator.status))}
+            edges = session.execute(select(pump_valve_association.c.pump_id, pump_valve_association.c.valve_id)).all()
+
+        pumps_by_valve, valves_by_pump, invalid = {}, {}, []
+        for pump_id, valve_id in edges:
+            pump, valve = actuators.get(pump_id), actuators.get(valve_id)
+            if pump is None or valve is None:
+                reason = "missing actuator"
+            elif pump.type not in PUMP_TYPES:
+                reason = f"{pump_id} is not a pump ({pump.type})"
+            elif valve.type not in VALVE_TYPES:
+                reason = f"{valve_id} is not a valve ({valve.type})"
+            else:
+                pumps_by_valve.setdefault(valve_id, []).append(pump_id)
+                valves_by_pump.setdefault(pump_id, []).append(valve_id)
+                continue
+            invalid.append({"pump_id": pump_id, "valve_id": valve_id, "reason": reason})
+
+        open_valves = {valve_id for valve_id in pumps_by_valve if actuators[valve_id].status == 'open'}
+        held_valves = {valve_id for valve_id in pumps_by_valve if actuators[valve_id].status not in ('open', 'close')}
+        open_counts = {pump_id: sum(1 for valve_id in valve_ids if valve_id in open_valves)
+                       for pump_id, valve_ids in valves_by_pump.items()}
+        inconsistent = [{"pump_id": pump_id, "status": actuators[pump_id].status, "open_valves": count}
+                        for pump_id, count in open_counts.items()
+                        if (actuators[pump_id].status == 'open') != (count > 0)]
+
+        with self._lock:
+            self._pumps_by_valve = pumps_by_valve
+            self._valves_by_pump = valves_by_pump
+            self._open_valves = open_valves
+            self._held_valves = held_valves
+            self._open_counts = open_counts
+            self._dirty = False
+            self.report = {
+                "pumps": len(valves_by_pump),
+                "valves": len(pumps_by_valve),
+                "links": len(edges) - len(invalid),
+                "invalid_links": invalid,
+                "inconsistent_pumps": inconsistent
+            }
+
+        for link in invalid:
+            logger.warning(f"Ignoring pump/valve link {link['pump_id']} -> {link['valve_id']}: {link['reason']}")
+        for pump in inconsistent:
+            logger.warning(f"Pump {pump['pump_id']} is {pump['status']} with {pump['open_valves']} open valves")
+        logger.info(f"Pump interlock index built: {len(valves_by_pump)} pumps, {len(pumps_by_valve)} valves, "
+                    f"{len(open_valves)} open valves")
+        return self.report
+
+    def _ensure_built(self):
+        if self._dirty:
+            self.rebuild()
+
+    def invalidate(self):
+        """Rebuild from the database on next use"""
+        with self._lock:
+            self._dirty = True
+
+    def on_change(self, event_type, payload):
+        """Change listener for FarmControlService events (structure only; valve transitions go through `apply`)"""
+        if event_type == "topology":
+            self.invalidate()
+
+    # Transitions
+    @contextlib.contextmanager
+    def transaction(self):
+        """Hold the index for a database transaction; counter changes are undone if it raises"""
+        with self._lock:
+            self._ensure_built()
+            outer = self._undo
+            undo = {} if outer is None else outer
+            self._undo = undo
+            try:
+                yield self
+            except BaseException:
+                if outer is None:
+                    for key, previous in undo.items():
+                        kind, item = key
+                        if kind == "count":
+                            self._open_counts[item] = previous
+                            continue
+                        valves = self._open_valves if kind == "valve" else self._held_valves
+                        if previous:
+                            valves.add(item)
+                        else:
+                            valves.discard(item)
+                raise
+            finally:
+                self._undo = outer
+
+    def apply(self, valve_statuses):
+        """
+        Record valve transitions and return the pumps they switch.
+
+        A pump is switched on when its open-valve counter rises from zero, and off
+        when one of its valves closes and leaves the counter at zero, either by
+        crossing it or by closing from 'changing state'. Must be called inside
+        `transaction()`.
+
+        Args:
+            valve_statuses: iterable of (valve_id, new_status)
+
+        Returns:
+            {pump_id: 'open' | 'close'} target status per pump that changed state
+        """
+        if self._undo is None:
+            raise RuntimeError("PumpInterlockIndex.apply() called outside transaction()")
+        before = {}
+        closing = set()
+        released = set()
+        for valve_id, new_status in valve_statuses:
+            pumps = self._pumps_by_valve.get(valve_id)
+            if not pumps:
+                continue
+            was_held = valve_id in self._held_valves
+            if was_held != (new_status not in ('open', 'close')):
+                self._undo.setdefault(("held", valve_id), was_held)
+                if was_held:
+                    self._held_valves.discard(valve_id)
+                else:
+                    self._held_valves.add(valve_id)
+            if new_status == 'close':
+                closing.update(pumps)
+                if was_held:
+                    released.update(pumps)
+            was_open = valve_id in self._open_valves
+            is_open = new_status == 'open'
+            if was_open == is_open:
+                continue
+            self._undo.setdefault(("valve", valve_id), was_open)
+            if is_open:
+                self._open_valves.add(valve_id)
+            else:
+                self._open_valves.discard(valve_id)
+            delta = 1 if is_open else -1
+            for pump_id in pumps:
+                count = self._open_counts[pump_id]
+                before.setdefault(pump_id, count)
+                self._undo.setdefault(("count", pump_id), count)
+                self._open_counts[pump_id] = count + delta
+        # A valve leaving 'open' for 'changing state' lowers the counter without
+        # stopping its pumps; they stop once a valve actually closes
+        targets = {pump_id: 'close' for pump_id in closing if self._open_counts[pump_id] == 0
+                   and (before.get(pump_id, 0) > 0 or pump_id in released)}
+        targets.update({pump_id: 'open' for pump_id, count in before.items()
+                        if count == 0 and self._open_counts[pump_id] > 0})
+        return targets
+
+    def close_all(self):
+        """
+        Every open valve was closed (emergency stop): reset all counters.
+
+        Must be called inside `transaction()`, like `apply()`.
+        """
+        if self._undo is None:
+            raise RuntimeError("PumpInterlockIndex.close_all() called outside transaction()")
+        for valve_id in self._open_valves:
+            self._undo.setdefault(("valve", valve_id), True)
+        for pump_id, count in self._open_counts.items():
+            self._undo.setdefault(("count", pump_id), count)
+        self._open_valves.clear()
+        self._open_counts = dict.fromkeys(self._open_counts, 0)
+
+    # Queries
+    def open_valve_count(self, pump_id):
+        with self._lock:
+            self._ensure_built()
+            return self._open_counts.get(pump_id, 0)
+
+    def get_stats(self):
+        with self._lock:
+            self._ensure_built()
+            return {
+                "pumps": len(self._valves_by_pump),
+                "valves": len(self._pumps_by_valve),
+                "open_valves": len(self._open_valves),
+                "running_pumps": sum(1 for count in self._open_counts.values() if count > 0),
+                "invalid_links": len(self.report["invalid_links"]) if self.report else 0
+            }
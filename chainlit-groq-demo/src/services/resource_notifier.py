@@ -0,0 +1,124 @@
+from services.tool_cache import change_tags
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger("ResourceNotifier")
+
+RESOURCE_LEVELS_URI = "resources://levels"
+
+
+def changed_uris(topology, event_type, payload):
+    """
+    Subscribable resource URIs affected by a FarmControlService change event.
+    Returns None when every resource may have changed (topology changes).
+    """
+    if event_type == "actuator_timers":
+        # Open timers are reset on every tick; the actuators' state did not change
+        return set()
+    tags = change_tags(topology, event_type, payload)
+    if tags is None:
+        return None
+    uris = set()
+    for kind, entity_id in tags:
+        if kind == "actuator":
+            uris.add(f"actuators://{entity_id}")
+        elif kind == "field":
+            uris.add(f"fields://{entity_id}/state")
+        elif kind == "resource":
+            uris.add(RESOURCE_LEVELS_URI)
+    return uris
+
+
+class ResourceNotifier:
+    """
+    Sends MCP `notifications/resources/updated` to the sessions subscribed to a
+    resource when a committed change affects it.
+
+    Changes arrive from any thread through the service change listener. Affected
+    URIs are collected for `window` seconds and then each subscribed session gets
+    one notification per URI, so a batch operation or a tick touching many
+    actuators produces a single update per resource. Sessions only need an async
+    `send_resource_updated(uri)`; one that fails to receive a notification (the
+    client went away) is unsubscribed.
+    """
+
+    def __init__(self, topology, window=0.25):
+        self.topology = topology
+        self.window = window
+        self._subscribers = {}  # uri -> sessions
+        self._pending = set()
+        self._scheduled = False
+        self._loop = None
+        self._flush_task = None
+        self._lock = threading.Lock()
+        self._stats = {"changes": 0, "coalesced": 0, "notifications": 0, "failed": 0}
+
+    def subscribe(self, uri, session):
+        """Subscribe `session` to `uri`; called on the event loop that sends notifications"""
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(uri, set()).add(session)
+
+    def unsubscribe(self, uri, session):
+        with self._lock:
+            sessions = self._subscribers.get(uri)
+            if sessions is not None:
+                sessions.discard(session)
+                if not sessions:
+                    del self._subscribers[uri]
+
+    def on_change(self, event_type, payload):
+        """FarmControlService change listener"""
+        if not self._subscribers:
+            return
+        self.mark(changed_uris(self.topology, event_type, payload))
+
+    def mark(self, uris=None):
+        """Queue update notifications for the subscribed `uris` (all when None); safe from any thread"""
+        with self._lock:
+            uris = set(self._subscribers) if uris is None else set(uris) & self._subscribers.keys()
+            if not uris or self._loop is None:
+                return
+            self._stats["changes"] += 1
+            self._stats["coalesced"] += len(uris & self._pending)
+            self._pending |= uris
+            if self._scheduled:
+                return
+            self._scheduled = True
+            loop = self._loop
+        try:
+            loop.call_soon_threadsafe(loop.call_later, self.window, self._start_flush)
+        except RuntimeError:
+            # The event loop is closed (shutting down)
+            with self._lock:
+                self._scheduled = False
+
+    def _start_flush(self):
+        # Keep a reference so the task is not collected while it runs
+        self._flush_task = self._loop.create_task(self._flush())
+
+    async def _flush(self):
+        with self._lock:
+            pending, self._pending, self._scheduled = self._pending, set(), False
+            targets = [(uri, list(self._subscribers.get(uri, ()))) for uri in sorted(pending)]
+        for uri, sessions in targets:
+            for session in sessions:
+                try:
+                    await session.send_resource_updated(uri)
+                    sent = "notifications"
+                except Exception as e:
+                    logger.info(f"Dropping subscription to {uri}: {str(e)}")
+                    self.unsubscribe(uri, session)
+                    sent = "failed"
+                with self._lock:
+                    self._stats[sent] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "subscriptions": sum(len(sessions) for sessions in self._subscribers.values()),
+                "resources": len(self._subscribers),
+                "pending": len(self._pending)
+            }
@@ -0,0 +1,234 @@
+from models.models import Actuator, Resource
+from utils.measurements import to_number, with_number
+from sqlalchemy import select, update
+import numpy as np
+import datetime
+import logging
+import threading
+import time
+
+logger = logging.getLogger("ResourceTickEngine")
+
+# Upper bound on ids per IN (...) clause
+IN_CLAUSE_CHUNK = 5000
+
+
+class ResourceTickEngine:
+    """
+    Periodic, vectorized resource consumption for all open actuators.
+
+    Flow rates (per second) and resource levels are held in NumPy arrays indexed by
+    position, and the actuator->resource links as a sparse incidence matrix in
+    coordinate form (`link_actuators[k]` feeds `link_resources[k]`). A tick turns the
+    open time of every open actuator into consumed volume and spreads it onto the
+    resources with one sparse matrix-vector product (`np.bincount` over the links),
+    clamps the new levels at zero, writes the changed levels and the reset open
+    timers back in bulk and hands the result to `on_tick` (telemetry, cache patches).
+    `on_settle(session, intervals)` sees the charged open intervals inside the tick's
+    transaction (usage rollups).
+
+    The static arrays are built from the topology snapshot and rebuilt when its
+    structure changes; open actuators and current levels are read from the database
+    inside the tick's transaction, so concurrent writers are never overwritten with
+    stale values.
+    """
+
+    def __init__(self, session_factory, topology, interval=60.0, on_tick=None, on_settle=None):
+        self.session_factory = session_factory
+        self.topology = topology
+        self.interval = interval
+        self.on_tick = on_tick
+        self.on_settle = on_settle
+
+        self._edges = None
+        self.actuator_ids = []
+        self.actuator_index = {}
+        self.flow_per_second = np.zeros(0)
+        self.resource_ids = []
+        self.resource_index = {}
+        self.levels = np.zeros(0)
+        self.capacities = np.zeros(0)
+        self.link_actuators = np.zeros(0, dtype=np.intp)
+        self.link_resources = np.zeros(0, dtype=np.intp)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.ticks = 0
+        self.last_tick_ms = None
+
+    # Lifecycle
+    def start(self):
+        """Run `tick()` every `interval` seconds on a background thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-tick", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Resource tick failed: {str(e)}", exc_info=True)
+
+    # Arrays
+    def refresh(self, force=False):
+        """(Re)build the flow, capacity and incidence arrays from the topology snapshot"""
+        snapshot = self.topology.snapshot()
+        if not force and snapshot.edges is self._edges:
+            return snapshot
+
+        actuator_ids = list(snapshot.actuators)
+        actuator_index = {actuator_id: i for i, actuator_id in enumerate(actuator_ids)}
+        resource_ids = list(snapshot.resources)
+        resource_index = {resource_id: i for i, resource_id in enumerate(resource_ids)}
+        links = [
+            (actuator_index[actuator_id], resource_index[resource_id])
+            for actuator_id, resource_ids_for_actuator in snapshot.edges["resources_by_actuator"].items()
+            if actuator_id in actuator_index
+            for resource_id in resource_ids_for_actuator if resource_id in resource_index
+        ]
+
+        self.actuator_ids = actuator_ids
+        self.actuator_index = actuator_index
+        # base_speed is a flow rate in units per hour
+        self.flow_per_second = np.array(
+            [to_number(snapshot.actuators[actuator_id]["base_speed"]) for actuator_id in actuator_ids]) / 3600.0
+        self.resource_ids = resource_ids
+        self.resource_index = resource_index
+        self.levels = np.array([to_number(snapshot.resources[rid]["current_level"]) for rid in resource_ids])
+        self.capacities = np.array([to_number(snapshot.resources[rid]["capacity"]) for rid in resource_ids])
+        self.link_actuators = np.array([a for a, _ in links], dtype=np.intp)
+        self.link_resources = np.array([r for _, r in links], dtype=np.intp)
+        self._edges = snapshot.edges
+        logger.info(f"Tick arrays built: {len(actuator_ids)} actuators, {len(resource_ids)} resources, {len(links)} links")
+        return snapshot
+
+    def consumption(self, consumed_by_actuator):
+        """Incidence matrix product: volume per resource for a volume-per-actuator vector"""
+        return np.bincount(self.link_resources, weights=consumed_by_actuator[self.link_actuators],
+                           minlength=len(self.resource_ids))
+
+    # Tick
+    def tick(self, now=None):
+        """
+        Settle consumption of every open actuator up to `now`.
+
+        Returns:
+            Dictionary with the tick timestamp, number of open actuators, per-resource
+            updates (same shape as FarmControlService._settle_resource_consumption) and the ids of
+            the actuators whose open timers were reset
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self.refresh()
+            now = now or datetime.datetime.now()
+            result = self._tick(now)
+        self.ticks += 1
+        self.last_tick_ms = round((time.perf_counter() - started) * 1000, 3)
+        if self.on_tick and (result["resource_updates"] or result["reset_actuator_ids"]):
+            self.on_tick(result)
+        return {key: value for key, value in result.items() if key != "thingsboard_ids"}
+
+    def _tick(self, now):
+        with self.session_factory() as session:
+            with session.begin():
+                open_rows = session.execute(select(Actuator.id, Actuator.last_state_change).where(
+                    Actuator.status == 'open', Actuator.last_state_change != None)).all()
+                known = [(self.actuator_index[row.id], row) for row in open_rows if row.id in self.actuator_index]
+                if len(known) < len(open_rows):
+                    logger.warning(f"{len(open_rows) - len(known)} open actuators missing from the topology snapshot")
+                    self.topology.invalidate()
+
+                elapsed = np.zeros(len(self.actuator_ids))
+                if known:
+                    indices = np.array([i for i, _ in known], dtype=np.intp)
+                    elapsed[indices] = [(now - row.last_state_change).total_seconds() for _, row in known]
+                consumed = np.clip(elapsed, 0, None) * self.flow_per_second
+                consumption = self.consumption(consumed)
+
+                changed = np.flatnonzero(consumption > 0)
+                resource_updates, thingsboard_ids = self._write_levels(session, changed, consumption)
+
+                reset_ids = [row.id for _, row in known]
+                if self.on_settle and known:
+                    self.on_settle(session, [(row.id, row.last_state_change, now, float(self.flow_per_second[i] * 3600))
+                                             for i, row in known])
+                for offset in range(0, len(reset_ids), IN_CLAUSE_CHUNK):
+                    session.execute(update(Actuator).where(
+                        Actuator.id.in_(reset_ids[offset:offset + IN_CLAUSE_CHUNK]),
+                        Actuator.status == 'open'
+                    ).values(last_state_change=now))
+
+        return {
+            "timestamp": now,
+            "actuators_updated": len(open_rows),
+            "resource_updates": resource_updates,
+            "reset_actuator_ids": reset_ids,
+            "thingsboard_ids": thingsboard_ids
+        }
+
+    def _write_levels(self, session, changed, consumption):
+        if not len(changed):
+            return [], {}
+        changed_ids = [self.resource_ids[i] for i in changed]
+        rows = {}
+        for offset in range(0, len(changed_ids), IN_CLAUSE_CHUNK):
+            for row in session.execute(select(
+                Resource.id, Resource.name, Resource.current_level, Resource.capacity, Resource.thingsboard_id
+            ).where(Resource.id.in_(changed_ids[offset:offset + IN_CLAUSE_CHUNK]))):
+                rows[row.id] = row
+
+        # Start from the committed levels, not the cached ones
+        for i, resource_id in zip(changed, changed_ids):
+            if resource_id in rows:
+                self.levels[i] = to_number(rows[resource_id].current_level)
+                self.capacities[i] = to_number(rows[resource_id].capacity)
+        original = self.levels[changed]
+        self.levels[changed] = np.round(np.maximum(original - consumption[changed], 0.0), 2)
+        capacities = self.capacities[changed]
+        percentages = np.round(np.divide(self.levels[changed] * 100, capacities,
+                                         out=np.zeros(len(changed)), where=capacities > 0), 1)
+
+        resource_updates = []
+        thingsboard_ids = {}
+        params = []
+        for k, (i, resource_id) in enumerate(zip(changed, changed_ids)):
+            row = rows.get(resource_id)
+            if row is None:
+                continue
+            new_level = float(self.levels[i])
+            stored_level = with_number(row.current_level, new_level)
+            params.append({"id": resource_id, "current_level": stored_level})
+            resource_updates.append({
+                "resource_id": resource_id,
+                "resource_name": row.name,
+                "original_level": float(original[k]),
+                "consumption": round(float(consumption[i]), 2),
+                "new_level": new_level,
+                "percentage_full": float(percentages[k]),
+                "stored_level": stored_level
+            })
+            thingsboard_ids[resource_id] = row.thingsboard_id
+        if params:
+            session.execute(update(Resource), params)
+        return resource_updates, thingsboard_ids
+
+    def get_stats(self):
+        return {
+            "ticks": self.ticks,
+            "last_tick_ms": self.last_tick_ms,
+            "interval_seconds": self.interval,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "actuators": len(self.actuator_ids),
+            "resources": len(self.resource_ids),
+            "links": int(len(self.link_actuators))
+        }
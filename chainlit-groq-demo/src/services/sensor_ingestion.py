@@ -0,0 +1,348 @@
+from models.models import Sensor, SensorReading
+from utils.thingsboard import send_telemetry_batch
+from sqlalchemy import insert, select
+import datetime
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger("SensorIngestionPipeline")
+
+_STOP = object()
+
+
+class _StageCounter:
+    """Thread-safe item/batch counters with busy time for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items, elapsed, failed=0):
+        with self._lock:
+            self.items += items
+            self.failed += failed
+            self.batches += 1
+            self.busy_seconds += elapsed
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "items": self.items,
+                "batches": self.batches,
+                "failed": self.failed,
+                "busy_seconds": round(self.busy_seconds, 4),
+                "items_per_second": round(self.items / self.busy_seconds, 1) if self.busy_seconds > 0 else None
+            }
+
+
+class SensorIngestionPipeline:
+    """
+    Bulk sensor reading ingestion: validate -> batch insert -> forward to ThingsBoard.
+
+    Validation runs in the caller's thread against an in-memory sensor index. Valid
+    readings are queued in batches for a writer thread (Core bulk insert into
+    `sensor_readings`), which hands committed batches to a forwarder thread that sends
+    them to ThingsBoard grouped per device. Both queues are bounded: when they fill up,
+    `ingest` blocks (or returns the unaccepted remainder when a timeout is given),
+    so readings are never dropped for lack of space. A batch the database still
+    refuses after `write_attempts` tries is split to isolate the offending rows,
+    which are dropped and counted as failed by the write stage.
+    """
+
+    def __init__(self, session_factory, batch_size=5000, max_pending_batches=20,
+                 forward_to_thingsboard=True, index_refresh_interval=30.0,
+                 write_attempts=3, retry_delay=1.0):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.write_attempts = write_attempts
+        self.retry_delay = retry_delay
+        self.forward_to_thingsboard = forward_to_thingsboard
+        self.index_refresh_interval = index_refresh_interval
+
+        self._write_queue = queue.Queue(maxsize=max_pending_batches)
+        self._forward_queue = queue.Queue(maxsize=max_pending_batches)
+        self._sensor_index = {}
+        self._index_loaded_at = 0.0
+        self._index_lock = threading.Lock()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._backpressure_events = 0
+
+        self.counters = {
+            "validate": _StageCounter("validate"),
+            "write": _StageCounter("write"),
+            "forward": _StageCounter("forward")
+        }
+
+    # Lifecycle
+    def start(self):
+        """Start the writer and forwarder threads (idempotent)"""
+        with self._start_lock:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._writer_loop, name="sensor-ingest-writer", daemon=True),
+                threading.Thread(target=self._forwarder_loop, name="sensor-ingest-forwarder", daemon=True)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        """Drain queued batches and stop the pipeline threads"""
+        with self._start_lock:
+            if not self._threads:
+                return
+            self._write_queue.put(_STOP)
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def flush(self):
+        """Block until every accepted reading has been written and forwarded"""
+        self._write_queue.join()
+        self._forward_queue.join()
+
+    # Sensor index
+    def refresh_sensor_index(self):
+        """Reload the sensor id -> ThingsBoard id index from the Sensor table"""
+        with self.session_factory() as session:
+            rows = session.execute(select(Sensor.id, Sensor.thingsboard_id)).all()
+        with self._index_lock:
+            self._sensor_index = {sensor_id: tb_id for sensor_id, tb_id in rows}
+            self._index_loaded_at = time.monotonic()
+        return len(self._sensor_index)
+
+    def _get_sensor_index(self, force_refresh=False):
+        stale = time.monotonic() - self._index_loaded_at > self.index_refresh_interval
+        if force_refresh or stale or not self._index_loaded_at:
+            self.refresh_sensor_index()
+        return self._sensor_index
+
+    # Ingestion
+    def ingest(self, readings, timeout=None):
+        """
+        Validate and enqueue a bulk of sensor readings.
+
+        Args:
+            readings: iterable of {"sensor_id", "key", "value", "ts"} dicts, or
+                {"sensor_id", "values": {key: value}, "ts"} for several keys at once.
+                `ts` may be epoch milliseconds, an ISO string or a datetime (default: now).
+            timeout: seconds to wait for queue space; None waits indefinitely
+
+        Returns:
+            Dictionary with the number of accepted, rejected and deferred readings,
+            the number of values (`rows`) queued, and the positions
+            (`deferred_indices`) of the readings that were not queued because of
+            backpressure and should be resubmitted. A reading is accepted, rejected
+            or deferred as a whole, so the three counts add up to len(readings).
+        """
+        self.start()
+        started = time.perf_counter()
+        rows, positions, errors = self._validate(readings)
+        self.counters["validate"].record(len(rows) + len(errors), time.perf_counter() - started, failed=len(errors))
+
+        queued = 0
+        backpressure = self._write_queue.full()
+        for start, end in self._batch_bounds(positions):
+            try:
+                self._write_queue.put(rows[start:end], timeout=timeout)
+            except queue.Full:
+                self._backpressure_events += 1
+                deferred = sorted(set(positions[start:]))
+                return {
+                    "accepted": len(set(positions[:start])),
+                    "rejected": len(errors),
+                    "deferred": len(deferred),
+                    "rows": queued,
+                    "deferred_indices": deferred,
+                    "backpressure": True,
+                    "errors": errors[:20]
+                }
+            queued += end - start
+
+        if backpressure:
+            self._backpressure_events += 1
+        return {
+            "accepted": len(set(positions)),
+            "rejected": len(errors),
+            "deferred": 0,
+            "rows": queued,
+            "deferred_indices": [],
+            "backpressure": backpressure,
+            "errors": errors[:20]
+        }
+
+    def _batch_bounds(self, positions):
+        """(start, end) row slices of about batch_size rows that never split a reading"""
+        start = 0
+        for end in range(1, len(positions) + 1):
+            if end == len(positions) or (end - start >= self.batch_size and positions[end] != positions[end - 1]):
+                yield start, end
+                start = end
+
+    def _validate(self, readings):
+        """Rows to insert, the position of the reading each row came from, and one error per rejected reading"""
+        index = self._get_sensor_index()
+        refreshed = False
+        now = datetime.datetime.now()
+        rows = []
+        positions = []
+        errors = []
+
+        for position, reading in enumerate(readings):
+            if not isinstance(reading, dict):
+                errors.append({"index": position, "error": f"Reading must be an object, got {type(reading).__name__}"})
+                continue
+            sensor_id = reading.get("sensor_id")
+            if not isinstance(sensor_id, str) or sensor_id not in index:
+                if not refreshed and isinstance(sensor_id, str):
+                    # The sensor may have been created since the index was loaded
+                    index = self._get_sensor_index(force_refresh=True)
+                    refreshed = True
+                if not isinstance(sensor_id, str) or sensor_id not in index:
+                    errors.append({"index": position, "error": f"Unknown sensor {sensor_id!r}"})
+                    continue
+
+            ts = self._parse_ts(reading.get("ts"), now)
+            if ts is None:
+                errors.append({"index": position, "error": f"Invalid timestamp {reading.get('ts')!r}"})
+                continue
+
+            values = reading.get("values")
+            if values is None:
+                values = {reading.get("key"): reading.get("value")}
+            elif not isinstance(values, dict):
+                errors.append({"index": position, "error": "values must be an object of {key: value}"})
+                continue
+
+            # A reading with one bad value is rejected whole
+            reading_rows = []
+            for key, value in values.items():
+                if not key or not isinstance(key, str):
+                    errors.append({"index": position, "error": "Missing telemetry key"})
+                    break
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    errors.append({"index": position, "error": f"Non-numeric value for {key}: {value!r}"})
+                    break
+                reading_rows.append({"sensor_id": sensor_id, "key": key, "value": value, "ts": ts})
+            else:
+                rows.extend(reading_rows)
+                positions.extend([position] * len(reading_rows))
+
+        return rows, positions, errors
+
+    @staticmethod
+    def _parse_ts(ts, default):
+        if ts is None:
+            return default
+        if isinstance(ts, datetime.datetime):
+            return ts
+        if isinstance(ts, (int, float)):
+            return datetime.datetime.fromtimestamp(ts / 1000.0)
+        try:
+            return datetime.datetime.fromisoformat(ts)
+        except (TypeError, ValueError):
+            return None
+
+    # Stages
+    def _writer_loop(self):
+        while True:
+            batch = self._write_queue.get()
+            try:
+                if batch is _STOP:
+                    self._forward_queue.put(_STOP)
+                    return
+                written = self._write_batch(batch)
+                if self.forward_to_thingsboard and written:
+                    # Blocks when the forwarder lags, which in turn fills the write queue
+                    self._forward_queue.put(written)
+            finally:
+                self._write_queue.task_done()
+
+    def _write_batch(self, batch):
+        """Insert a batch, retrying failures a few times; returns the rows that were written"""
+        for attempt in range(1, self.write_attempts + 1):
+            started = time.perf_counter()
+            try:
+                self._insert(batch)
+                self.counters["write"].record(len(batch), time.perf_counter() - started)
+                return batch
+            except Exception as e:
+                self.counters["write"].record(0, time.perf_counter() - started)
+                if attempt == self.write_attempts:
+                    logger.error(f"Failed to write {len(batch)} sensor readings after {attempt} attempts, "
+                                 f"isolating the rejected rows: {e}")
+                    break
+                logger.warning(f"Failed to write {len(batch)} sensor readings, retrying: {e}")
+                # The stalled writer applies backpressure meanwhile
+                time.sleep(self.retry_delay * attempt)
+        return self._write_isolating(batch)
+
+    def _write_isolating(self, batch):
+        """Write a batch the database keeps refusing by halves, dropping the rows that fail alone"""
+        started = time.perf_counter()
+        try:
+            self._insert(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                row = batch[0]
+                logger.error(f"Dropping sensor reading {row['sensor_id']}/{row['key']} at {row['ts']}: {e}")
+                self.counters["write"].record(0, time.perf_counter() - started, failed=1)
+                return []
+            middle = len(batch) // 2
+            return self._write_isolating(batch[:middle]) + self._write_isolating(batch[middle:])
+        self.counters["write"].record(len(batch), time.perf_counter() - started)
+        return batch
+
+    def _insert(self, batch):
+        with self.session_factory() as session:
+            session.connection().execute(insert(SensorReading.__table__), batch)
+            session.commit()
+
+    def _forwarder_loop(self):
+        while True:
+            batch = self._forward_queue.get()
+            try:
+                if batch is _STOP:
+                    return
+                started = time.perf_counter()
+                index = self._sensor_index
+                telemetry = {}
+                skipped = 0
+                for row in batch:
+                    tb_id = index.get(row["sensor_id"])
+                    if not tb_id:
+                        skipped += 1
+                        continue
+                    telemetry.setdefault(tb_id, []).append({
+                        "ts": int(row["ts"].timestamp() * 1000),
+                        "values": {row["key"]: row["value"]}
+                    })
+                results = send_telemetry_batch(telemetry)
+                failed = sum(len(telemetry[tb_id]) for tb_id, ok in results.items() if not ok)
+                self.counters["forward"].record(len(batch) - skipped - failed, time.perf_counter() - started, failed=failed)
+            except Exception as e:
+                logger.error(f"Failed to forward sensor readings to ThingsBoard: {e}")
+            finally:
+                self._forward_queue.task_done()
+
+    def get_stats(self):
+        """Per-stage throughput counters, queue depths and backpressure state"""
+        return {
+            "stages": {name: counter.to_dict() for name, counter in self.counters.items()},
+            "queues": {
+                "write": {"depth": self._write_queue.qsize(), "capacity": self._write_queue.maxsize},
+                "forward": {"depth": self._forward_queue.qsize(), "capacity": self._forward_queue.maxsize}
+            },
+            "backpressure": self._write_queue.full() or self._forward_queue.full(),
+            "backpressure_events": self._backpressure_events,
+            "indexed_sensors": len(self._sensor_index)
+        }
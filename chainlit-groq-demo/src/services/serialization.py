@@ -0,0 +1,374 @@
+from models.models import Farm, Field, Sensor, Actuator, Resource, field_resource_association
+from sqlalchemy import select
+import base64
+import binascii
+import datetime
+import decimal
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    # Optional speedup; the standard library encoder produces the same JSON
+    orjson = None
+
+
+def _gps(lat, long):
+    return {"lat": lat, "long": long}
+
+
+# Output name -> column, or (combine, column, ...) for values built from several columns.
+# Names and shapes match the models' to_dict(include_related=False).
+ENTITIES = {
+    "farm": {
+        "id": Farm.id, "name": Farm.name, "address": Farm.address,
+        "gps": (_gps, Farm.gps_lat, Farm.gps_long), "total_area": Farm.total_area,
+        "created_at": Farm.created_at, "modified_at": Farm.modified_at
+    },
+    "field": {
+        "id": Field.id, "name": Field.name, "crop": Field.crop, "area": Field.area,
+        "boundary_gps": Field.boundary_gps, "farm_id": Field.farm_id,
+        "created_at": Field.created_at, "modified_at": Field.modified_at
+    },
+    "sensor": {
+        "id": Sensor.id, "thingsboard_id": Sensor.thingsboard_id, "field_id": Sensor.field_id,
+        "type": Sensor.type, "status": Sensor.status, "unit": Sensor.unit,
+        "gps": (_gps, Sensor.gps_lat, Sensor.gps_long),
+        "created_at": Sensor.created_at, "modified_at": Sensor.modified_at
+    },
+    "actuator": {
+        "id": Actuator.id, "thingsboard_id": Actuator.thingsboard_id, "field_id": Actuator.field_id,
+        "name": Actuator.name, "type": Actuator.type, "subtype": Actuator.subtype,
+        "operation_type": Actuator.operation_type, "status": Actuator.status,
+        "base_speed": Actuator.base_speed, "last_state_change": Actuator.last_state_change,
+        "created_at": Actuator.created_at, "modified_at": Actuator.modified_at
+    },
+    "resource": {
+        "id": Resource.id, "thingsboard_id": Resource.thingsboard_id, "field_id": Resource.field_id,
+        "farm_id": Resource.farm_id, "name": Resource.name, "capacity": Resource.capacity,
+        "current_level": Resource.current_level, "content": Resource.content,
+        "created_at": Resource.created_at, "modified_at": Resource.modified_at
+    }
+}
+
+MODELS = {"farm": Farm, "field": Field, "sensor": Sensor, "actuator": Actuator, "resource": Resource}
+
+# Nested collection name -> (child entity, column holding the parent id, join needed to reach it)
+CHILDREN = {
+    "farm": {"fields": ("field", Field.farm_id, None)},
+    "field": {
+        "sensors": ("sensor", Sensor.field_id, None),
+        "actuators": ("actuator", Actuator.field_id, None),
+        "resources": ("resource", field_resource_association.c.field_id,
+                      (field_resource_association, field_resource_association.c.resource_id == Resource.id))
+    }
+}
+
+
+class Projection:
+    """
+    The columns to select for a subset of an entity's fields, and how to turn the
+    resulting tuples into dictionaries.
+
+    `keys` are extra columns (ids used for grouping) selected after the projected
+    ones; they are read with `key()` and never appear in the output.
+    """
+
+    def __init__(self, entity, fields=None, keys=()):
+        spec = ENTITIES[entity]
+        self.entity = entity
+        self.names = list(spec) if fields is None else list(dict.fromkeys(fields))
+        unknown = [name for name in self.names if name not in spec]
+        if unknown:
+            raise ValueError(f"Unknown {entity} fields {unknown}; choose from {list(spec)}")
+
+        self.columns = []
+        self._simple = []
+        self._combined = []
+        for name in self.names:
+            column = spec[name]
+            if isinstance(column, tuple):
+                combine, *parts = column
+                self._combined.append((name, combine, len(self.columns), len(self.columns) + len(parts)))
+                self.columns.extend(parts)
+            else:
+                self._simple.append((name, len(self.columns)))
+                self.columns.append(column)
+        self._key_offset = len(self.columns)
+        # Labelled so a key that is also projected is not merged into one column
+        self.columns.extend(column.label(f"_key{i}") for i, column in enumerate(keys))
+
+    def record(self, row):
+        result = {name: row[i] for name, i in self._simple}
+        for name, combine, start, stop in self._combined:
+            result[name] = combine(*row[start:stop])
+        if self._combined:
+            # Keep the declared field order
+            result = {name: result[name] for name in self.names}
+        return result
+
+    def key(self, row, index=0):
+        return row[self._key_offset + index]
+
+
+def parse_fields(entity, fields=None, include_related=True):
+    """
+    Turn a field projection into a tree of {"columns", "children"}.
+
+    `fields` lists column names of `entity` and dotted paths into its nested
+    collections, e.g. ["id", "name", "fields.crop", "fields.actuators.status"];
+    a bare collection name ("fields") selects all of it. A comma separated string
+    is accepted as well. None selects every column, plus every nested collection
+    when `include_related` is set.
+    """
+    children = CHILDREN.get(entity, {})
+    if fields is None:
+        return {
+            "columns": None,
+            "children": {name: parse_fields(child[0], None, include_related)
+                         for name, child in children.items()} if include_related else {}
+        }
+    if isinstance(fields, str):
+        fields = [path.strip() for path in fields.split(",") if path.strip()]
+
+    columns = []
+    nested = {}
+    for path in fields:
+        name, _, rest = path.partition(".")
+        if name in children:
+            nested.setdefault(name, []).append(rest)
+        elif not rest:
+            columns.append(name)
+        else:
+            raise ValueError(f"Unknown {entity} collection '{name}'; choose from {list(children)}")
+    # Checked here so a bad nested path fails before any query runs
+    unknown = [name for name in columns if name not in ENTITIES[entity]]
+    if unknown:
+        raise ValueError(f"Unknown {entity} fields {unknown}; choose from {list(ENTITIES[entity])}")
+    return {
+        "columns": columns,
+        "children": {name: parse_fields(children[name][0], None if "" in paths else paths)
+                     for name, paths in nested.items()}
+    }
+
+
+def load_tree(session, entity, fields=None, include_related=True, where=()):
+    """
+    Load `entity` rows (and their nested collections) as dictionaries straight from
+    column tuples, without hydrating ORM objects.
+
+    One SELECT is issued per entity level; children are restricted to the selected
+    parents with a subquery rather than an id list. With `fields=None` the result
+    has the shape of the models' to_dict(include_related=include_related).
+
+    Args:
+        session: SQLAlchemy session
+        entity: "farm", "field", "sensor", "actuator" or "resource"
+        fields: projection, see `parse_fields`
+        include_related: with fields=None, include nested collections
+        where: filter clauses on the top level entity
+
+    Returns:
+        List of dictionaries ordered by id
+    """
+    return _load(session, entity, parse_fields(entity, fields, include_related), where=where)
+
+
+def _load(session, entity, tree, parent_column=None, parent_ids=None, join=None, where=()):
+    model = MODELS[entity]
+    keys = [model.id] if parent_column is None else [model.id, parent_column]
+    projection = Projection(entity, tree["columns"], keys=keys)
+
+    stmt = select(*projection.columns)
+    ids = select(model.id)
+    if join is not None:
+        stmt = stmt.join(*join)
+        ids = ids.join(*join)
+    if parent_ids is not None:
+        stmt = stmt.where(parent_column.in_(parent_ids))
+        ids = ids.where(parent_column.in_(parent_ids))
+    stmt = stmt.where(*where)
+    ids = ids.where(*where)
+
+    nested = _nested(session, entity, tree, ids)
+
+    records = []
+    by_parent = {}
+    for row in session.execute(stmt.order_by(model.id)):
+        record = projection.record(row)
+        if nested:
+            own_id = projection.key(row)
+            for name, grouped in nested.items():
+                record[name] = grouped.get(own_id, [])
+        if parent_column is None:
+            records.append(record)
+        else:
+            by_parent.setdefault(projection.key(row, 1), []).append(record)
+    return records if parent_column is None else by_parent
+
+
+def _nested(session, entity, tree, ids):
+    """Load the nested collections of the `entity` rows whose id is in `ids` (a list or a subquery)"""
+    return {
+        name: _load(session, child_entity, subtree, child_column, ids, child_join)
+        for name, subtree in tree["children"].items()
+        for child_entity, child_column, child_join in [CHILDREN[entity][name]]
+    }
+
+
+def iter_tree(session, entity, fields=None, include_related=True, where=(), after=None, limit=None, batch_size=500):
+    """
+    Stream what `load_tree` returns, one record at a time in id order.
+
+    Top level rows come from a `yield_per` cursor; the nested collections of each
+    batch of `batch_size` rows are loaded together, so memory stays bounded by a
+    batch regardless of the result size. `after` skips rows up to and including
+    that id (keyset continuation) and `limit` caps the number of rows. Top level
+    records always carry their id, which continuation tokens refer to.
+    """
+    model = MODELS[entity]
+    tree = parse_fields(entity, fields, include_related)
+    if tree["columns"] is not None and "id" not in tree["columns"]:
+        tree["columns"].insert(0, "id")
+    projection = Projection(entity, tree["columns"], keys=[model.id])
+    stmt = select(*projection.columns).where(*where)
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    stmt = stmt.order_by(model.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+        batch_size = max(min(batch_size, limit), 1)
+    result = session.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        nested = _nested(session, entity, tree, [projection.key(row) for row in rows])
+        for row in rows:
+            record = projection.record(row)
+            for name, grouped in nested.items():
+                record[name] = grouped.get(projection.key(row), [])
+            yield record
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "tolist"):
+        # numpy scalars and arrays
+        return value.tolist()
+    return str(value)
+
+
+def _finite(value):
+    """Replace NaN/inf (not valid JSON) with None"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+_encoder = json.JSONEncoder(default=_default, separators=(",", ":"), ensure_ascii=False, allow_nan=False)
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumpb(value):
+    """Encode `value` like `dumps`, as UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+    return dumps(value).encode()
+
+
+def dumps(value):
+    """
+    Encode `value` as compact JSON.
+
+    Datetimes and dates become ISO 8601 strings, NaN and infinity become null and
+    numpy values are converted to plain numbers. Uses orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS).decode()
+    try:
+        return _encoder.encode(value)
+    except ValueError:
+        # Raised for NaN/inf; the fast path above covers everything else
+        return _encoder.encode(_finite(value))
+
+
+def encode_cursor(after):
+    """Opaque continuation token resuming after the record with id `after`"""
+    return base64.urlsafe_b64encode(dumpb({"after": after})).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Id to resume after from a continuation token (None for an empty token)"""
+    if not token:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))["after"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError(f"Invalid cursor {token!r}")
+
+
+def stream_json(records, max_bytes=None, collection="items", head=None, limit=None):
+    """
+    Encode records into a JSON object chunk by chunk:
+    {**head, collection: [record, ...], "next_cursor": token or null}.
+
+    Each record is encoded on its own, so only one record is held in encoded form
+    at a time. With `max_bytes`, the whole output stays within that many bytes:
+    the list ends before the first record that does not fit and `next_cursor`
+    resumes after the last record emitted. A record too large to fit on its own is
+    left out and its id listed under "skipped". With `limit`, at most that many
+    records are emitted; pass one record more to tell whether the list continues.
+    `records` is closed when the stream stops, which releases a database cursor
+    behind it.
+
+    Yields:
+        UTF-8 encoded chunks
+    """
+    opening = dumpb(head or {})[:-1]
+    opening += (b"," if len(opening) > 1 else b"") + dumpb(collection) + b":["
+    used = len(opening)
+    yield opening
+
+    last = None
+    emitted = 0
+    skipped = []
+    truncated = False
+    try:
+        for record in records:
+            if limit is not None and emitted == limit:
+                truncated = True
+                break
+            key = record.get("id")
+            encoded = dumpb(record)
+            chunk = b"," + encoded if emitted else encoded
+            if max_bytes is not None and used + len(chunk) + len(_closing(encode_cursor(key), skipped)) > max_bytes:
+                fits_alone = len(opening) + len(encoded) + len(_closing(encode_cursor(key), [])) <= max_bytes
+                if fits_alone or used + len(_closing(encode_cursor(key), skipped + [key])) > max_bytes:
+                    truncated = True
+                    break
+                skipped.append(key)
+                last = key
+                continue
+            used += len(chunk)
+            emitted += 1
+            last = key
+            yield chunk
+    finally:
+        close = getattr(records, "close", None)
+        if close is not None:
+            close()
+    yield _closing(encode_cursor(last) if truncated else None, skipped)
+
+
+def _closing(cursor, skipped):
+    return b"]," + (b'"skipped":' + dumpb(skipped) + b"," if skipped else b"") + b'"next_cursor":' + dumpb(cursor) + b"}"
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+import threading
+
+
+class _Borrowed:
+    """`with` target handing out the shared session without closing it"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def __enter__(self):
+        return self.session
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class SharedSessionFactory:
+    """
+    Session factory that can share one session per thread.
+
+    Outside `shared()` it is the sessionmaker it wraps. Inside, every
+    `with factory() as session` block on the calling thread gets the same session,
+    held on one read transaction, so consecutive reads see the same database state
+    over one connection. Other threads are unaffected.
+
+    pysqlite only issues BEGIN before the first write, so on SQLite the read
+    transaction is started explicitly. It holds a shared lock that makes writers
+    wait at commit, so keep shared scopes short.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._local = threading.local()
+
+    def __call__(self, **kwargs):
+        session = getattr(self._local, "session", None)
+        if session is None or kwargs:
+            return self.session_factory(**kwargs)
+        return _Borrowed(session)
+
+    @contextmanager
+    def shared(self):
+        """Share one session and read transaction among this thread's `with factory()` blocks"""
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            yield session
+            return
+        with self.session_factory() as session:
+            connection = session.connection()
+            if connection.dialect.name == "sqlite" and not connection.connection.driver_connection.in_transaction:
+                connection.exec_driver_sql("BEGIN")
+            self._local.session = session
+            try:
+                yield session
+            finally:
+                self._local.session = None
+                session.rollback()
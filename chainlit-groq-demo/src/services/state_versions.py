@@ -0,0 +1,92 @@
+import threading
+import uuid
+
+
+class StateVersions:
+    """
+    Monotonic version of the farm state, and the version at which each entity last
+    changed, so repeated reads can return only what changed since a previous read.
+
+    Every committed write increments the version. Clients hold an opaque token
+    ("<epoch>.<version>"); the epoch changes when the process restarts, and
+    structural (topology) changes raise a floor below which deltas are no longer
+    known. Tokens from another epoch or below the floor get a full response.
+    Entities are grouped by kind ("actuator", "resource", ...).
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._version = 0
+        self._floor = 0
+        self._kind_versions = {}
+        self._changed = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def token(self):
+        return f"{self.epoch}.{self._version}"
+
+    def on_change(self, event_type, payload):
+        """FarmControlService change listener"""
+        if event_type == "actuator_status":
+            self.touch("actuator", [t["actuator_id"] for t in payload["transitions"]])
+        elif event_type == "resource_level":
+            self.touch("resource", [update["resource_id"] for update in payload["resources"]])
+        elif event_type == "topology":
+            self.reset()
+
+    def touch(self, kind, ids):
+        """Record that the given entities changed; returns the new version"""
+        ids = list(ids)
+        if not ids:
+            return self._version
+        with self._lock:
+            self._version += 1
+            changed = self._changed.setdefault(kind, {})
+            for entity_id in ids:
+                changed[entity_id] = self._version
+            self._kind_versions[kind] = self._version
+            return self._version
+
+    def reset(self):
+        """Forget per-entity versions; older tokens get full responses from now on"""
+        with self._lock:
+            self._version += 1
+            self._floor = self._version
+            self._changed.clear()
+            self._kind_versions.clear()
+
+    def changes(self, kind, since=None):
+        """
+        What changed for `kind` after the state identified by `since`.
+
+        Take the token before reading the state it describes, so a write racing
+        with the read is reported again next time rather than lost.
+
+        Returns:
+            (current token, changed ids): ids is None when the token is missing,
+            unknown or outdated (the caller answers in full) and an empty set when
+            nothing changed (not modified)
+        """
+        with self._lock:
+            token = f"{self.epoch}.{self._version}"
+            version = self._parse(since)
+            if version is None:
+                return token, None
+            if version >= self._kind_versions.get(kind, 0):
+                return token, set()
+            return token, {entity_id for entity_id, changed_at in self._changed.get(kind, {}).items()
+                           if changed_at > version}
+
+    def _parse(self, token):
+        epoch, _, version = (token or "").partition(".")
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        version = int(version)
+        if version < self._floor or version > self._version:
+            return None
+        return version
@@ -0,0 +1,143 @@
+from services.serialization import dumps
+from collections import OrderedDict
+import threading
+import time
+
+
+def change_tags(topology, event_type, payload):
+    """
+    Cache tags affected by a FarmControlService change event, resolved through the
+    topology snapshot: the changed actuators/resources and the fields and farms
+    they belong to. Returns None when everything is affected (topology changes).
+    """
+    if event_type not in ("actuator_status", "actuator_timers", "resource_level"):
+        return None
+    snapshot = topology.snapshot()
+    if event_type in ("actuator_status", "actuator_timers"):
+        if event_type == "actuator_status":
+            actuator_ids = {t["actuator_id"] for t in payload["transitions"]}
+        else:
+            actuator_ids = set(payload["actuator_ids"])
+        field_ids = {snapshot.actuators[aid]["field_id"] for aid in actuator_ids if aid in snapshot.actuators}
+        tags = {("actuator", aid) for aid in actuator_ids}
+    elif event_type == "resource_level":
+        resource_ids = {update["resource_id"] for update in payload["resources"]}
+        field_ids = {fid for rid in resource_ids for fid in snapshot.edges["fields_by_resource"].get(rid, ())}
+        tags = {("resource", rid) for rid in resource_ids}
+        tags.update(("farm", snapshot.resources[rid]["farm_id"]) for rid in resource_ids if rid in snapshot.resources)
+    tags.update(("field", fid) for fid in field_ids)
+    tags.update(("farm", snapshot.fields[fid]["farm_id"]) for fid in field_ids if fid in snapshot.fields)
+    return tags
+
+
+class ToolResultCache:
+    """
+    LRU cache of read-only tool results, keyed by tool name and normalized arguments.
+
+    Results are stored encoded (the JSON text the tool returns) and the cache is
+    bounded by their total size. Each entry expires after its tool's TTL and is
+    tagged with the entities it was built from, e.g. ("farm", "FM0001"), so writes
+    drop exactly the entries they affect. A result computed while an invalidation
+    ran is returned but not stored, since it may predate the write.
+    """
+
+    def __init__(self, topology, max_bytes=32 * 1024 * 1024, default_ttl=30.0, ttls=None):
+        self.topology = topology
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidated": 0}
+        self._tool_stats = {}
+
+    def get_or_compute(self, tool, args, compute, tags=()):
+        """
+        Return the cached result of `tool` for `args`, or compute and cache it.
+
+        Args:
+            tool: tool name
+            args: the tool's arguments, including defaults
+            compute: callable returning the result as JSON text
+            tags: (kind, id) tags of the entities the result depends on
+
+        Returns:
+            JSON text
+        """
+        key = (tool, dumps(sorted(args.items())))
+        now = time.monotonic()
+        with self._lock:
+            tool_stats = self._tool_stats.setdefault(tool, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    tool_stats["hits"] += 1
+                    return entry["value"]
+                self._remove(key)
+                self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            tool_stats["misses"] += 1
+            generation = self._generation
+
+        value = compute()
+        entry_tags = set(tags)
+
+        with self._lock:
+            if generation == self._generation and len(value) <= self.max_bytes:
+                self._remove(key)
+                self._entries[key] = {
+                    "value": value, "tags": entry_tags,
+                    "expires_at": time.monotonic() + self.ttls.get(tool, self.default_ttl)
+                }
+                self._bytes += len(value)
+                for tag in entry_tags:
+                    self._by_tag.setdefault(tag, set()).add(key)
+                while self._bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self._stats["evictions"] += 1
+        return value
+
+    def invalidate(self, tags=None):
+        """Drop the entries tagged with any of `tags` (every entry when tags is None)"""
+        with self._lock:
+            self._generation += 1
+            if tags is None:
+                keys = list(self._entries)
+            else:
+                keys = {key for tag in tags for key in self._by_tag.get(tag, ())}
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidated"] += len(keys)
+
+    def on_change(self, event_type, payload):
+        """FarmControlService change listener: invalidate the entries the change affects"""
+        self.invalidate(change_tags(self.topology, event_type, payload))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry["value"])
+        for tag in entry["tags"]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "tools": {tool: dict(stats) for tool, stats in self._tool_stats.items()}
+            }
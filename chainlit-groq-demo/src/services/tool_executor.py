@@ -0,0 +1,152 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger("ToolExecutor")
+
+
+def _summary(samples):
+    times = sorted(samples)
+    return {
+        "p50": round(times[len(times) // 2] * 1000, 2),
+        "p95": round(times[min(int(len(times) * 0.95), len(times) - 1)] * 1000, 2),
+        "max": round(times[-1] * 1000, 2)
+    } if times else None
+
+
+class ToolExecutor:
+    """
+    Runs blocking MCP tool handlers on thread pools instead of the event loop.
+
+    FastMCP calls synchronous tools directly on its event loop, so one slow handler
+    (a ThingsBoard sync, a long report) stalls the requests of every other session.
+    `wrap()` turns a handler into a coroutine that runs it on the pool of its lane.
+    Lanes have separate, bounded pools, so long-running admin tools cannot take the
+    workers interactive tools need. A tool can also be limited to a number of
+    concurrent calls; calls over the limit wait on the event loop without holding
+    a worker.
+
+    Per tool, queue time (from the call until a worker starts the handler, including
+    the wait for the tool's limit) and run time are recorded.
+    """
+
+    def __init__(self, lanes=None, samples=1000):
+        """
+        Args:
+            lanes: lane name -> worker threads, e.g. {"default": 8, "admin": 2}
+            samples: queue/run time samples kept per tool
+        """
+        self.lanes = dict(lanes or {"default": 8})
+        self._pools = {lane: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"tool-{lane}")
+                       for lane, workers in self.lanes.items()}
+        self._samples = samples
+        self._tools = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, fn, lane="default", max_concurrent=None):
+        """
+        Coroutine function running `fn` on `lane`, with the name, docstring and
+        signature of `fn` (which FastMCP reads to build the tool schema).
+
+        Args:
+            fn: blocking handler
+            lane: lane whose pool runs the handler
+            max_concurrent: calls of this tool allowed to run or queue for a worker at once
+
+        Returns:
+            async function
+        """
+        if lane not in self._pools:
+            raise ValueError(f"Unknown lane: {lane}")
+        pool = self._pools[lane]
+        semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent else None
+        stats = self._tools.setdefault(fn.__name__, {
+            "lane": lane, "max_concurrent": max_concurrent, "calls": 0, "errors": 0, "cancelled": 0,
+            "queued": 0, "running": 0,
+            "queue_times": deque(maxlen=self._samples), "run_times": deque(maxlen=self._samples)
+        })
+
+        @functools.wraps(fn)
+        async def run(*args, **kwargs):
+            queued_at = time.monotonic()
+            with self._lock:
+                stats["queued"] += 1
+            acquired = False
+            try:
+                if semaphore is not None:
+                    await semaphore.acquire()
+                    acquired = True
+                loop = asyncio.get_running_loop()
+                future = pool.submit(self._call, stats, queued_at, fn, args, kwargs)
+            except BaseException:
+                self._cancelled(stats)
+                if acquired:
+                    semaphore.release()
+                raise
+
+            def done(future):
+                # A call cancelled before a worker picked it up never ran
+                if future.cancelled():
+                    self._cancelled(stats)
+                if semaphore is not None:
+                    loop.call_soon_threadsafe(semaphore.release)
+
+            future.add_done_callback(done)
+            return await asyncio.wrap_future(future)
+
+        return run
+
+    def _call(self, stats, queued_at, fn, args, kwargs):
+        started = time.monotonic()
+        with self._lock:
+            stats["queued"] -= 1
+            stats["running"] += 1
+            stats["queue_times"].append(started - queued_at)
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                stats["running"] -= 1
+                stats["calls"] += 1
+                stats["errors"] += failed
+                stats["run_times"].append(elapsed)
+            if elapsed > 5:
+                logger.warning(f"Tool {fn.__name__} ran for {elapsed:.1f}s on the {stats['lane']} lane")
+
+    def _cancelled(self, stats):
+        with self._lock:
+            stats["queued"] -= 1
+            stats["cancelled"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            tools = {
+                tool: {
+                    **{key: value for key, value in stats.items() if not key.endswith("_times")},
+                    "queue_time_ms": _summary(stats["queue_times"]),
+                    "run_time_ms": _summary(stats["run_times"])
+                }
+                for tool, stats in self._tools.items() if stats["calls"] or stats["queued"] or stats["running"]
+            }
+            lanes = {
+                lane: {
+                    "workers": workers,
+                    "running": sum(s["running"] for s in self._tools.values() if s["lane"] == lane),
+                    "queued": sum(s["queued"] for s in self._tools.values() if s["lane"] == lane)
+                }
+                for lane, workers in self.lanes.items()
+            }
+        return {"lanes": lanes, "tools": tools}
+
+    def shutdown(self, wait=True):
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,297 @@
+from models.models import (
+    Farm, Field, Sensor, Actuator, Resource,
+    field_resource_association, actuator_resource_association, pump_valve_association
+)
+from sqlalchemy import select
+from collections.abc import Mapping
+from types import MappingProxyType
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+logger = logging.getLogger("TopologyCache")
+
+
+def _freeze_index(index):
+    return MappingProxyType({key: tuple(values) for key, values in index.items()})
+
+
+class OverlayMap(Mapping):
+    """
+    Read-only id -> record mapping: a base dict with replaced records in layers.
+
+    `replaced()` returns a new map that shares the base and older layers and adds
+    the changed records as a new layer, so a write costs the size of the change,
+    not of the map. Layers are merged while the newest is at least half the size
+    of the one below it, which keeps their number logarithmic, and folded into a
+    new base once they hold half as many records as the base.
+    """
+
+    __slots__ = ("_base", "_layers")
+
+    def __init__(self, base, layers=()):
+        self._base = base
+        self._layers = layers  # newest first
+
+    def __getitem__(self, key):
+        for layer in self._layers:
+            if key in layer:
+                return layer[key]
+        return self._base[key]
+
+    def __contains__(self, key):
+        # Layers only replace records, so the base holds every key
+        return key in self._base
+
+    def __iter__(self):
+        return iter(self._base)
+
+    def __len__(self):
+        return len(self._base)
+
+    @property
+    def depth(self):
+        return len(self._layers)
+
+    def replaced(self, changes):
+        """New map with {key: {column: value}} merged into the existing records"""
+        layer = {key: {**self[key], **columns} for key, columns in changes.items() if key in self._base}
+        if not layer:
+            return self
+        layers = [layer, *self._layers]
+        while len(layers) > 1 and len(layers[0]) * 2 >= len(layers[1]):
+            newest = layers.pop(0)
+            layers[0] = {**layers[0], **newest}
+        if sum(len(layer) for layer in layers) * 2 >= len(self._base):
+            base = dict(self._base)
+            for layer in reversed(layers):
+                base.update(layer)
+            return OverlayMap(base)
+        return OverlayMap(self._base, tuple(layers))
+
+
+class TopologySnapshot:
+    """
+    Immutable, versioned view of the farm topology indexed by id, name and type.
+
+    Records are stored in the same shape as the models' `to_dict(include_related=False)`
+    and are copied on access, so callers can never modify a published snapshot.
+    Actuators and resources, which change on every status or level write, are
+    OverlayMaps shared with the snapshot they were patched from.
+    """
+
+    def __init__(self, version, farms, fields, sensors, actuators, resources, edges, built_at=None):
+        self.version = version
+        self.built_at = built_at or time.monotonic()
+        self.farms = MappingProxyType(farms)
+        self.fields = MappingProxyType(fields)
+        self.sensors = MappingProxyType(sensors)
+        self.actuators = actuators if isinstance(actuators, OverlayMap) else OverlayMap(actuators)
+        self.resources = resources if isinstance(resources, OverlayMap) else OverlayMap(resources)
+        # Edges are static between structural writes and shared across patched snapshots
+        self.edges = edges
+
+    @classmethod
+    def build(cls, version, farms, fields, sensors, actuators, resources, associations):
+        field_resources, actuator_resources, pump_valves = associations
+        index = {
+            "fields_by_farm": {}, "fields_by_name": {}, "sensors_by_field": {}, "actuators_by_field": {},
+            "actuators_by_type": {}, "resources_by_field": {}, "fields_by_resource": {}, "resources_by_actuator": {},
+            "actuators_by_resource": {}, "valves_by_pump": {}, "pumps_by_valve": {}
+        }
+        for field in fields.values():
+            index["fields_by_farm"].setdefault(field["farm_id"], []).append(field["id"])
+            index["fields_by_name"].setdefault(field["name"], []).append(field["id"])
+        for sensor in sensors.values():
+            index["sensors_by_field"].setdefault(sensor["field_id"], []).append(sensor["id"])
+        for actuator in actuators.values():
+            index["actuators_by_field"].setdefault(actuator["field_id"], []).append(actuator["id"])
+            index["actuators_by_type"].setdefault(actuator["type"], []).append(actuator["id"])
+        for field_id, resource_id in field_resources:
+            index["resources_by_field"].setdefault(field_id, []).append(resource_id)
+            index["fields_by_resource"].setdefault(resource_id, []).append(field_id)
+        for actuator_id, resource_id in actuator_resources:
+            index["resources_by_actuator"].setdefault(actuator_id, []).append(resource_id)
+            index["actuators_by_resource"].setdefault(resource_id, []).append(actuator_id)
+        for pump_id, valve_id in pump_valves:
+            index["valves_by_pump"].setdefault(pump_id, []).append(valve_id)
+            index["pumps_by_valve"].setdefault(valve_id, []).append(pump_id)
+
+        edges = MappingProxyType({name: _freeze_index(values) for name, values in index.items()})
+        return cls(version, farms, fields, sensors, actuators, resources, edges)
+
+    def patched(self, version, actuators=None, resources=None):
+        """Return a new snapshot with some actuator/resource records replaced; costs the size of the change"""
+        new_actuators = self.actuators.replaced(actuators) if actuators else self.actuators
+        new_resources = self.resources.replaced(resources) if resources else self.resources
+        return TopologySnapshot(version, self.farms, self.fields, self.sensors,
+                                new_actuators, new_resources, self.edges, self.built_at)
+
+    # Lookups
+    def _related(self, index, key):
+        return self.edges[index].get(key, ())
+
+    def field_ids_by_name(self, field_name):
+        return self._related("fields_by_name", field_name)
+
+    def actuator_dict(self, actuator_id, include_related=True):
+        actuator = self.actuators.get(actuator_id)
+        if actuator is None:
+            return None
+        result = dict(actuator)
+        if include_related:
+            result.update({
+                "resources": [{"id": rid, "name": self.resources[rid]["name"]}
+                              for rid in self._related("resources_by_actuator", actuator_id) if rid in self.resources],
+                "linked_valves": [{"id": vid, "name": self.actuators[vid]["name"]}
+                                  for vid in self._related("valves_by_pump", actuator_id) if vid in self.actuators],
+                "linked_pumps": [{"id": pid, "name": self.actuators[pid]["name"]}
+                                 for pid in self._related("pumps_by_valve", actuator_id) if pid in self.actuators]
+            })
+        return result
+
+    def sensor_dict(self, sensor_id, include_related=True):
+        sensor = self.sensors.get(sensor_id)
+        if sensor is None:
+            return None
+        result = dict(sensor)
+        field = self.fields.get(sensor["field_id"])
+        if include_related and field:
+            result["field"] = {"id": field["id"], "name": field["name"]}
+        return result
+
+    def resource_dict(self, resource_id):
+        resource = self.resources.get(resource_id)
+        return dict(resource) if resource is not None else None
+
+    def field_dict(self, field_id, include_related=True):
+        field = self.fields.get(field_id)
+        if field is None:
+            return None
+        result = dict(field)
+        if include_related:
+            result.update({
+                "sensors": [self.sensor_dict(sid, include_related=False) for sid in self._related("sensors_by_field", field_id)],
+                "actuators": [self.actuator_dict(aid, include_related=False) for aid in self._related("actuators_by_field", field_id)],
+                "resources": [self.resource_dict(rid) for rid in self._related("resources_by_field", field_id) if rid in self.resources]
+            })
+        return result
+
+    def actuators_for_field(self, field_id, include_related=True):
+        return [self.actuator_dict(aid, include_related) for aid in self._related("actuators_by_field", field_id)]
+
+    def sensors_for_field(self, field_id, include_related=True):
+        return [self.sensor_dict(sid, include_related) for sid in self._related("sensors_by_field", field_id)]
+
+
+class TopologyCache:
+    """
+    In-process read-through cache of the farm topology.
+
+    `snapshot()` returns the current immutable TopologySnapshot, rebuilding it from
+    the database when it has been invalidated or is older than `max_age` seconds
+    (other processes may write to the same database). Structural writes call
+    `invalidate()`; status and level writes call `patch_actuators()` /
+    `patch_resources()`, which publish a new snapshot version without a reload.
+    """
+
+    def __init__(self, session_factory, max_age=60.0):
+        self.session_factory = session_factory
+        self.max_age = max_age
+        self._snapshot = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._pinned = threading.local()
+
+    @property
+    def version(self):
+        return self._version
+
+    def snapshot(self):
+        pinned = getattr(self._pinned, "snapshot", None)
+        if pinned is not None:
+            return pinned
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.built_at < self.max_age:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.built_at >= self.max_age:
+                snapshot = self._build()
+                self._snapshot = snapshot
+            return snapshot
+
+    @contextmanager
+    def pinned(self, snapshot=None):
+        """Return `snapshot` (default: the current one) from every snapshot() call of this thread"""
+        previous = getattr(self._pinned, "snapshot", None)
+        self._pinned.snapshot = snapshot or previous or self.snapshot()
+        try:
+            yield self._pinned.snapshot
+        finally:
+            self._pinned.snapshot = previous
+
+    def invalidate(self):
+        """Drop the current snapshot; the next reader rebuilds it"""
+        with self._lock:
+            self._snapshot = None
+
+    def patch_actuators(self, changes):
+        """Publish a new snapshot with {actuator_id: {column: value}} applied"""
+        self._patch(actuators=changes)
+
+    def patch_resources(self, changes):
+        """Publish a new snapshot with {resource_id: {column: value}} applied"""
+        self._patch(resources=changes)
+
+    def _patch(self, actuators=None, resources=None):
+        with self._lock:
+            if self._snapshot is None:
+                # Nothing cached; the next reader loads the committed state
+                return
+            self._version += 1
+            self._snapshot = self._snapshot.patched(self._version, actuators=actuators, resources=resources)
+
+    def _build(self):
+        started = time.perf_counter()
+        with self.session_factory() as session:
+            farms = {row.id: {
+                "id": row.id, "name": row.name, "address": row.address,
+                "gps": {"lat": row.gps_lat, "long": row.gps_long}, "total_area": row.total_area,
+                "created_at": row.created_at, "modified_at": row.modified_at
+            } for row in session.execute(select(*Farm.__table__.columns))}
+            fields = {row.id: {
+                "id": row.id, "name": row.name, "crop": row.crop, "area": row.area,
+                "boundary_gps": row.boundary_gps, "farm_id": row.farm_id,
+                "created_at": row.created_at, "modified_at": row.modified_at
+            } for row in session.execute(select(*Field.__table__.columns))}
+            sensors = {row.id: {
+                "id": row.id, "thingsboard_id": row.thingsboard_id, "field_id": row.field_id,
+                "type": row.type, "status": row.status, "unit": row.unit,
+                "gps": {"lat": row.gps_lat, "long": row.gps_long},
+                "created_at": row.created_at, "modified_at": row.modified_at
+            } for row in session.execute(select(*Sensor.__table__.columns))}
+            actuators = {row.id: {
+                "id": row.id, "thingsboard_id": row.thingsboard_id, "field_id": row.field_id,
+                "name": row.name, "type": row.type, "subtype": row.subtype,
+                "operation_type": row.operation_type, "status": row.status, "base_speed": row.base_speed,
+                "last_state_change": row.last_state_change,
+                "created_at": row.created_at, "modified_at": row.modified_at
+            } for row in session.execute(select(*Actuator.__table__.columns))}
+            resources = {row.id: {
+                "id": row.id, "thingsboard_id": row.thingsboard_id, "field_id": row.field_id,
+                "farm_id": row.farm_id, "name": row.name, "capacity": row.capacity,
+                "current_level": row.current_level, "content": row.content,
+                "created_at": row.created_at, "modified_at": row.modified_at
+            } for row in session.execute(select(*Resource.__table__.columns))}
+            associations = tuple(
+                [tuple(row) for row in session.execute(select(*table.columns))]
+                for table in (field_resource_association, actuator_resource_association, pump_valve_association)
+            )
+
+        self._version += 1
+        snapshot = TopologySnapshot.build(self._version, farms, fields, sensors, actuators, resources, associations)
+        logger.info(f"Built topology snapshot v{self._version} in {(time.perf_counter() - started) * 1000:.1f}ms "
+                    f"({len(fields)} fields, {len(actuators)} actuators, {len(sensors)} sensors)")
+        return snapshot
@@ -0,0 +1,345 @@
+from models.models import (
+    Farm, Field, Sensor, Actuator, Resource, SensorReading, IrrigationSchedule,
+    ActuatorEvent, EventCursor, UsageRollup,
+    field_resource_association, actuator_resource_association, pump_valve_association
+)
+from sqlalchemy import insert, select, delete, DateTime
+import argparse
+import csv
+import datetime
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger("TopologyImporter")
+
+# Entity tables in foreign-key order
+ENTITY_TABLES = [
+    ("farms", Farm.__table__),
+    ("fields", Field.__table__),
+    ("sensors", Sensor.__table__),
+    ("actuators", Actuator.__table__),
+    ("resources", Resource.__table__),
+]
+
+ASSOCIATION_TABLES = [
+    ("field_resource_association", field_resource_association, ("field_id", "resource_id")),
+    ("actuator_resource_association", actuator_resource_association, ("actuator_id", "resource_id")),
+    ("pump_valve_association", pump_valve_association, ("pump_id", "valve_id")),
+]
+
+# Operational data recorded against the topology, cleared when it is replaced
+DEPENDENT_TABLES = [
+    ("sensor_readings", SensorReading.__table__),
+    ("irrigation_schedules", IrrigationSchedule.__table__),
+    ("actuator_events", ActuatorEvent.__table__),
+    ("event_cursors", EventCursor.__table__),
+    ("usage_rollups", UsageRollup.__table__),
+]
+
+# Columns stored as JSON that arrive as text in CSV files
+JSON_COLUMNS = {"boundary_gps", "base_speed", "capacity", "current_level"}
+FLOAT_COLUMNS = {"gps_lat", "gps_long"}
+
+VALVE_TYPES = ("water_valves", "fertilizer_dispensers")
+
+INSERT_CHUNK_SIZE = 20000
+
+
+class TopologyImporter:
+    """
+    Bulk loader for farm topologies (farms, fields, sensors, actuators, resources and
+    their association rows) from JSON, CSV or Parquet.
+
+    Nested documents are flattened and association rows are resolved and validated in
+    memory, then everything is written with Core executemany inserts inside a single
+    transaction, so a failed import leaves the database untouched.
+
+    Accepted layout (JSON document, or one CSV/Parquet file per key in a directory):
+        farms, fields, sensors, actuators, resources: lists of column dicts
+        field_resource_association, actuator_resource_association,
+        pump_valve_association: lists of id pairs
+    Farms may nest `fields`, fields may nest `sensors`/`actuators`/`resources`,
+    actuators may list `resources` and `linked_valves` ids and resources may list
+    `fields` ids; these are turned into the matching association rows.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    # Loaders
+    def load_json(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def load_csv(self, directory):
+        topology = {}
+        for name in self._table_names():
+            path = os.path.join(directory, f"{name}.csv")
+            if not os.path.exists(path):
+                continue
+            with open(path, newline="") as f:
+                topology[name] = [self._parse_text_row(row) for row in csv.DictReader(f)]
+        return topology
+
+    def load_parquet(self, directory):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet import requires pyarrow (pip install pyarrow)")
+
+        topology = {}
+        for name in self._table_names():
+            path = os.path.join(directory, f"{name}.parquet")
+            if not os.path.exists(path):
+                continue
+            rows = pq.read_table(path).to_pylist()
+            topology[name] = [self._parse_text_row(row) for row in rows]
+        return topology
+
+    def load(self, path):
+        """Load a topology from a .json file or a directory of .csv/.parquet files"""
+        if os.path.isdir(path):
+            files = os.listdir(path)
+            if any(name.endswith(".parquet") for name in files):
+                return self.load_parquet(path)
+            return self.load_csv(path)
+        return self.load_json(path)
+
+    @staticmethod
+    def _table_names():
+        return [name for name, _ in ENTITY_TABLES] + [name for name, _, _ in ASSOCIATION_TABLES]
+
+    @staticmethod
+    def _parse_text_row(row):
+        parsed = {}
+        for key, value in row.items():
+            if value == "" or value is None:
+                parsed[key] = None
+            elif key in JSON_COLUMNS and isinstance(value, str):
+                try:
+                    parsed[key] = json.loads(value)
+                except ValueError:
+                    parsed[key] = value
+            elif key in FLOAT_COLUMNS:
+                parsed[key] = float(value)
+            elif key in ("resources", "linked_valves", "fields") and isinstance(value, str):
+                # Id lists in flat files are separated by ";"
+                parsed[key] = [item for item in value.split(";") if item]
+            else:
+                parsed[key] = value
+        return parsed
+
+    # Import
+    def import_file(self, path, replace=False):
+        """Load and import a topology file or directory"""
+        return self.import_topology(self.load(path), replace=replace)
+
+    def import_topology(self, topology, replace=False):
+        """
+        Import a topology document in one transaction.
+
+        Args:
+            topology: dictionary in the layout described on the class
+            replace: delete all existing topology rows first, together with the
+                readings, schedules, event log and usage rollups recorded against it
+
+        Returns:
+            Dictionary with per-table row counts, elapsed time and rows per second
+            (and the rows deleted per table under `cleared` when replacing),
+            or {"error": ...} when validation fails
+        """
+        started = time.perf_counter()
+        entities, associations = self._flatten(topology)
+
+        with self.session_factory() as session:
+            with session.begin():
+                connection = session.connection()
+                existing = {} if replace else self._existing_ids(connection)
+                errors, warnings = self._validate(entities, associations, existing)
+                if errors:
+                    return {"error": "Topology validation failed", "details": errors[:50], "error_count": len(errors)}
+
+                cleared = {}
+                if replace:
+                    for name, table in DEPENDENT_TABLES:
+                        cleared[name] = connection.execute(delete(table)).rowcount
+                    for _, table, _ in ASSOCIATION_TABLES:
+                        connection.execute(delete(table))
+                    for _, table in reversed(ENTITY_TABLES):
+                        connection.execute(delete(table))
+
+                counts = {}
+                for name, table in ENTITY_TABLES:
+                    rows = self._normalize(table, entities[name])
+                    self._bulk_insert(connection, table, rows)
+                    counts[name] = len(rows)
+                for name, table, columns in ASSOCIATION_TABLES:
+                    rows = [dict(zip(columns, pair)) for pair in associations[name]]
+                    self._bulk_insert(connection, table, rows)
+                    counts[name] = len(rows)
+
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        report = {
+            "status": "imported",
+            "tables": counts,
+            "total_rows": total,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(total / elapsed, 1) if elapsed > 0 else None,
+            "warnings": warnings[:50]
+        }
+        if replace:
+            report["cleared"] = cleared
+        logger.info(f"Imported {total} rows in {elapsed:.2f}s ({report['rows_per_second']} rows/s)")
+        return report
+
+    @staticmethod
+    def _bulk_insert(connection, table, rows):
+        for offset in range(0, len(rows), INSERT_CHUNK_SIZE):
+            connection.execute(insert(table), rows[offset:offset + INSERT_CHUNK_SIZE])
+
+    @staticmethod
+    def _normalize(table, rows):
+        # executemany needs the same keys on every row. Columns no row provides are
+        # left out so their SQL defaults (e.g. created_at = now()) render once in
+        # the statement instead of being bound per row.
+        present = set()
+        for row in rows:
+            present.update(row)
+        columns = [column.name for column in table.columns if column.name in present]
+        datetime_columns = [column.name for column in table.columns
+                            if column.name in present and isinstance(column.type, DateTime)]
+        normalized = []
+        for row in rows:
+            values = {column: row.get(column) for column in columns}
+            for column in datetime_columns:
+                if isinstance(values[column], str):
+                    values[column] = datetime.datetime.fromisoformat(values[column])
+            normalized.append(values)
+        return normalized
+
+    def _flatten(self, topology):
+        entities = {name: [] for name, _ in ENTITY_TABLES}
+        associations = {name: [] for name, _, _ in ASSOCIATION_TABLES}
+
+        for farm in topology.get("farms", []):
+            farm = dict(farm)
+            for field in farm.pop("fields", None) or []:
+                entities["fields"].append({**field, "farm_id": field.get("farm_id") or farm.get("id")})
+            entities["farms"].append(farm)
+        entities["fields"].extend(topology.get("fields", []))
+
+        # Rows without an id are kept so that _validate reports them
+        flat_fields = []
+        for field in entities["fields"]:
+            field = dict(field)
+            for key in ("sensors", "actuators"):
+                for child in field.pop(key, None) or []:
+                    entities[key].append({**child, "field_id": child.get("field_id") or field.get("id")})
+            for resource in field.pop("resources", None) or []:
+                if isinstance(resource, str):
+                    associations["field_resource_association"].append((field.get("id"), resource))
+                    continue
+                entities["resources"].append({
+                    **resource,
+                    "field_id": resource.get("field_id") or field.get("id"),
+                    "farm_id": resource.get("farm_id") or field.get("farm_id")
+                })
+                associations["field_resource_association"].append((field.get("id"), resource.get("id")))
+            flat_fields.append(field)
+        entities["fields"] = flat_fields
+
+        for key in ("sensors", "actuators", "resources"):
+            entities[key].extend(topology.get(key, []))
+
+        for actuator in entities["actuators"]:
+            for resource_id in actuator.get("resources") or []:
+                associations["actuator_resource_association"].append((actuator.get("id"), resource_id))
+            for valve_id in actuator.get("linked_valves") or []:
+                associations["pump_valve_association"].append((actuator.get("id"), valve_id))
+        for resource in entities["resources"]:
+            for field_id in resource.get("fields") or []:
+                associations["field_resource_association"].append((field_id, resource.get("id")))
+
+        for name, _, columns in ASSOCIATION_TABLES:
+            for row in topology.get(name, []):
+                associations[name].append(tuple(row.get(column) for column in columns))
+            # Deduplicate while keeping file order
+            associations[name] = list(dict.fromkeys(associations[name]))
+
+        return entities, associations
+
+    def _existing_ids(self, connection):
+        existing = {}
+        for name, table in ENTITY_TABLES:
+            existing[name] = set(connection.execute(select(table.c.id)).scalars())
+        existing["actuator_types"] = dict(connection.execute(select(Actuator.id, Actuator.type)).all())
+        return existing
+
+    def _validate(self, entities, associations, existing):
+        errors = []
+        warnings = []
+        ids = {}
+        for name, _ in ENTITY_TABLES:
+            seen = set()
+            for row in entities[name]:
+                row_id = row.get("id")
+                if not row_id:
+                    errors.append(f"{name}: row without id: {row}")
+                elif row_id in seen or row_id in existing.get(name, ()):
+                    errors.append(f"{name}: duplicate id {row_id}")
+                seen.add(row_id)
+            ids[name] = seen | existing.get(name, set())
+
+        def check(name, row_id, target, column):
+            if row_id is not None and row_id not in ids[target]:
+                errors.append(f"{name}: {column} {row_id} does not exist")
+
+        for name, _, columns in ASSOCIATION_TABLES:
+            for pair in associations[name]:
+                if None in pair:
+                    errors.append(f"{name}: row without {columns[pair.index(None)]}: {pair}")
+
+        for row in entities["fields"]:
+            check("fields", row.get("farm_id"), "farms", "farm_id")
+        for key in ("sensors", "actuators"):
+            for row in entities[key]:
+                check(key, row.get("field_id"), "fields", "field_id")
+        for row in entities["resources"]:
+            check("resources", row.get("farm_id"), "farms", "farm_id")
+            check("resources", row.get("field_id"), "fields", "field_id")
+
+        for field_id, resource_id in associations["field_resource_association"]:
+            check("field_resource_association", field_id, "fields", "field_id")
+            check("field_resource_association", resource_id, "resources", "resource_id")
+        for actuator_id, resource_id in associations["actuator_resource_association"]:
+            check("actuator_resource_association", actuator_id, "actuators", "actuator_id")
+            check("actuator_resource_association", resource_id, "resources", "resource_id")
+
+        actuator_types = dict(existing.get("actuator_types", {}))
+        actuator_types.update({row["id"]: row.get("type") for row in entities["actuators"] if row.get("id")})
+        for pump_id, valve_id in associations["pump_valve_association"]:
+            check("pump_valve_association", pump_id, "actuators", "pump_id")
+            check("pump_valve_association", valve_id, "actuators", "valve_id")
+            if actuator_types.get(pump_id, "pumps") != "pumps":
+                warnings.append(f"pump_valve_association: {pump_id} is a {actuator_types[pump_id]}, not a pump")
+            if actuator_types.get(valve_id, VALVE_TYPES[0]) not in VALVE_TYPES:
+                warnings.append(f"pump_valve_association: {valve_id} is a {actuator_types[valve_id]}, not a valve")
+
+        return errors, warnings
+
+
+if __name__ == "__main__":
+    from models.models import init_db, get_session_factory
+
+    parser = argparse.ArgumentParser(description="Bulk import a farm topology")
+    parser.add_argument("path", help="JSON file or directory of CSV/Parquet files")
+    parser.add_argument("--db", default="farm_control.db", help="SQLite database path")
+    parser.add_argument("--replace", action="store_true",
+                        help="Delete the existing topology and the data recorded against it first")
+    args = parser.parse_args()
+
+    importer = TopologyImporter(get_session_factory(init_db(args.db)))
+    print(json.dumps(importer.import_file(args.path, replace=args.replace), indent=2, default=str))
@@ -0,0 +1,141 @@
+from models.models import UsageRollup
+from utils.measurements import to_number
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+import datetime
+import logging
+
+logger = logging.getLogger("UsageRollups")
+
+SCOPES = ("actuator", "field", "resource")
+# Actuators whose flow reaches the field; pumps feed these valves and are not counted twice
+DELIVERY_TYPES = ("water_valves", "fertilizer_dispensers")
+
+
+def split_by_day(start, end):
+    """Yield (day, seconds) for each calendar day an interval touches"""
+    while start < end:
+        midnight = datetime.datetime.combine(start.date() + datetime.timedelta(days=1), datetime.time())
+        until = min(end, midnight)
+        yield start.date().isoformat(), (until - start).total_seconds()
+        start = until
+
+
+class UsageRollups:
+    """
+    Incremental daily runtime and volume rollups.
+
+    Whenever open time is settled (an actuator closes, an emergency stop settles or
+    the tick engine charges open actuators) the settled intervals are recorded
+    inside the same transaction. Each interval is split at midnight and added to
+    three rollups in the `usage_rollups` table with one upsert:
+
+      - actuator: seconds open and volume (base_speed x time)
+      - field:    actuator-seconds of its actuators, and the volume delivered
+                  through its valves and dispensers
+      - resource: volume drawn through its linked actuators
+
+    Answering "how long did X run this week" is then a read of at most seven rows
+    per key, plus the still-open tail of actuators that are currently open.
+    """
+
+    def __init__(self, session_factory, topology):
+        self.session_factory = session_factory
+        self.topology = topology
+        self.recorded = 0
+
+    def record(self, session, intervals):
+        """
+        Add settled open intervals to the rollups inside the caller's transaction.
+
+        Args:
+            intervals: iterable of (actuator_id, opened_at, settled_at, base_speed)
+                with base_speed as stored (flow per hour)
+        """
+        snapshot = self.topology.snapshot()
+        resources_by_actuator = snapshot.edges["resources_by_actuator"]
+        deltas = {}
+
+        def add(scope, key, day, seconds, volume):
+            entry = deltas.setdefault((scope, key, day), [0.0, 0.0])
+            entry[0] += seconds
+            entry[1] += volume
+
+        for actuator_id, opened_at, settled_at, base_speed in intervals:
+            if opened_at is None or settled_at <= opened_at:
+                continue
+            flow_per_second = to_number(base_speed) / 3600.0
+            actuator = snapshot.actuators.get(actuator_id)
+            for day, seconds in split_by_day(opened_at, settled_at):
+                volume = flow_per_second * seconds
+                add("actuator", actuator_id, day, seconds, volume)
+                if actuator is not None and actuator["field_id"]:
+                    add("field", actuator["field_id"], day, seconds,
+                        volume if actuator["type"] in DELIVERY_TYPES else 0.0)
+                for resource_id in resources_by_actuator.get(actuator_id, ()):
+                    add("resource", resource_id, day, seconds, volume)
+
+        if not deltas:
+            return 0
+        table = UsageRollup.__table__
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.key, table.c.day],
+            set_={
+                "runtime_seconds": table.c.runtime_seconds + stmt.excluded.runtime_seconds,
+                "volume": table.c.volume + stmt.excluded.volume,
+                "modified_at": datetime.datetime.now()
+            }
+        )
+        session.connection().execute(stmt, [
+            {"scope": scope, "key": key, "day": day, "runtime_seconds": seconds, "volume": volume}
+            for (scope, key, day), (seconds, volume) in deltas.items()
+        ])
+        self.recorded += len(deltas)
+        return len(deltas)
+
+    def usage(self, scope, keys, start_day, end_day, now=None):
+        """
+        Runtime and volume per key between two days (inclusive).
+
+        Includes the unsettled time of actuators that are open right now.
+
+        Returns:
+            {key: {"runtime_seconds": ..., "volume": ...}}
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Invalid scope {scope!r}, must be one of {SCOPES}")
+        keys = list(keys)
+        totals = {key: {"runtime_seconds": 0.0, "volume": 0.0} for key in keys}
+        with self.session_factory() as session:
+            for row in session.execute(select(UsageRollup.key, UsageRollup.runtime_seconds, UsageRollup.volume).where(
+                    UsageRollup.scope == scope, UsageRollup.key.in_(keys),
+                    UsageRollup.day >= start_day.isoformat(), UsageRollup.day <= end_day.isoformat())):
+                totals[row.key]["runtime_seconds"] += row.runtime_seconds
+                totals[row.key]["volume"] += row.volume
+
+        # Open tail since the last settlement
+        now = now or datetime.datetime.now()
+        snapshot = self.topology.snapshot()
+        window_start = datetime.datetime.combine(start_day, datetime.time())
+        window_end = min(now, datetime.datetime.combine(end_day + datetime.timedelta(days=1), datetime.time()))
+        index = {"actuator": None, "field": "actuators_by_field", "resource": "actuators_by_resource"}[scope]
+        for key in keys:
+            actuator_ids = [key] if index is None else snapshot.edges[index].get(key, ())
+            for actuator_id in actuator_ids:
+                actuator = snapshot.actuators.get(actuator_id)
+                if actuator is None or actuator["status"] != 'open' or not actuator["last_state_change"]:
+                    continue
+                since = actuator["last_state_change"]
+                if isinstance(since, str):
+                    since = datetime.datetime.fromisoformat(since)
+                seconds = (window_end - max(since, window_start)).total_seconds()
+                if seconds <= 0:
+                    continue
+                volume = to_number(actuator["base_speed"]) / 3600.0 * seconds
+                totals[key]["runtime_seconds"] += seconds
+                if scope != "field" or actuator["type"] in DELIVERY_TYPES:
+                    totals[key]["volume"] += volume
+
+        return {key: {"runtime_seconds": round(total["runtime_seconds"], 1), "volume": round(total["volume"], 2)}
+                for key, total in totals.items()}
@@ -0,0 +1,150 @@
+import datetime
+import random
+
+CROPS = ["maize", "beans", "wheat", "rice", "potatoes", "tomatoes", "coffee", "tea"]
+SENSOR_TYPES = [
+    ("soil_moisture", "%"),
+    ("temperature_sensor", "°C"),
+    ("humidity_sensor", "%"),
+    ("ph_sensor", "pH"),
+    ("light_sensor", "lux"),
+]
+
+
+def generate_farm_topology(farms=1, fields_per_farm=10, sensors_per_field=4, pumps_per_field=1,
+                           valves_per_field=4, dispensers_per_field=1, water_tanks_per_farm=2,
+                           fertilizer_tanks_per_farm=1, open_fraction=0.0, seed=42, now=None):
+    """
+    Generate a deterministic synthetic farm topology.
+
+    The result uses the TopologyImporter layout (flat entity lists plus association
+    rows), so it can be written to JSON or imported directly. Each field draws from one
+    water tank and one fertilizer tank of its farm; every valve is linked to the
+    field's pumps and to the tank matching its content.
+
+    Args:
+        farms, fields_per_farm, ...: entity counts
+        open_fraction: share of valves/dispensers generated in the "open" state
+            (their linked pumps are opened too), opened up to one hour before `now`
+        seed: random seed; the same arguments always produce the same topology
+        now: reference time for state changes (default: current time)
+
+    Returns:
+        Topology dictionary
+    """
+    rng = random.Random(seed)
+    now = now or datetime.datetime.now()
+    topology = {
+        "farms": [], "fields": [], "sensors": [], "actuators": [], "resources": [],
+        "field_resource_association": [], "actuator_resource_association": [], "pump_valve_association": []
+    }
+
+    for farm_index in range(farms):
+        farm_id = f"FM{farm_index:04d}"
+        topology["farms"].append({
+            "id": farm_id,
+            "name": f"Farm {farm_index}",
+            "address": f"{farm_index} Valley Road",
+            "gps_lat": round(rng.uniform(-3.0, -1.0), 6),
+            "gps_long": round(rng.uniform(29.0, 31.0), 6),
+            "total_area": f"{fields_per_farm * 5} ha"
+        })
+
+        water_tanks = []
+        fertilizer_tanks = []
+        for kind, count, tanks in (("water", water_tanks_per_farm, water_tanks), ("fertilizer", fertilizer_tanks_per_farm, fertilizer_tanks)):
+            for tank_index in range(count):
+                resource_id = f"R{farm_index:04d}-{kind[0].upper()}{tank_index:03d}"
+                capacity = rng.choice([5000, 10000, 20000, 50000]) if kind == "water" else rng.choice([500, 1000, 2000])
+                topology["resources"].append({
+                    "id": resource_id,
+                    "farm_id": farm_id,
+                    "field_id": None,
+                    "name": f"{kind.title()} Tank {tank_index}",
+                    "capacity": {"value": capacity, "unit": "L"},
+                    "current_level": {"value": round(capacity * rng.uniform(0.3, 1.0), 1), "unit": "L"},
+                    "content": kind,
+                    "thingsboard_id": f"tb-{resource_id}"
+                })
+                tanks.append(resource_id)
+
+        for field_index in range(fields_per_farm):
+            field_id = f"F{farm_index:04d}-{field_index:05d}"
+            topology["fields"].append({
+                "id": field_id,
+                "farm_id": farm_id,
+                "name": f"Field {farm_index}-{field_index}",
+                "crop": rng.choice(CROPS),
+                "area": f"{rng.randint(1, 20)} ha",
+                "boundary_gps": None
+            })
+            water_tank = water_tanks[field_index % len(water_tanks)] if water_tanks else None
+            fertilizer_tank = fertilizer_tanks[field_index % len(fertilizer_tanks)] if fertilizer_tanks else None
+            for resource_id in (water_tank, fertilizer_tank):
+                if resource_id:
+                    topology["field_resource_association"].append({"field_id": field_id, "resource_id": resource_id})
+
+            for sensor_index in range(sensors_per_field):
+                sensor_type, unit = SENSOR_TYPES[sensor_index % len(SENSOR_TYPES)]
+                topology["sensors"].append({
+                    "id": f"S{field_id[1:]}-{sensor_index:03d}",
+                    "field_id": field_id,
+                    "type": sensor_type,
+                    "status": "active",
+                    "unit": unit,
+                    "gps_lat": None,
+                    "gps_long": None,
+                    "thingsboard_id": f"tb-S{field_id[1:]}-{sensor_index:03d}"
+                })
+
+            pumps = []
+            for pump_index in range(pumps_per_field):
+                pump_id = f"P{field_id[1:]}-{pump_index:02d}"
+                pump = _actuator(
+                    pump_id, field_id, f"Pump {field_index}-{pump_index}", "pumps", "electric",
+                    rng.choice([2000, 4000, 8000]), "close", None)
+                pumps.append(pump)
+                topology["actuators"].append(pump)
+                if water_tank:
+                    topology["actuator_resource_association"].append({"actuator_id": pump_id, "resource_id": water_tank})
+
+            for valve_type, count, tank, prefix in (("water_valves", valves_per_field, water_tank, "V"),
+                                                    ("fertilizer_dispensers", dispensers_per_field, fertilizer_tank, "D")):
+                for valve_index in range(count):
+                    valve_id = f"{prefix}{field_id[1:]}-{valve_index:02d}"
+                    is_open = rng.random() < open_fraction
+                    opened_at = now - datetime.timedelta(seconds=rng.randint(60, 3600)) if is_open else None
+                    flow = rng.choice([200, 400, 600]) if valve_type == "water_valves" else rng.choice([10, 20, 40])
+                    topology["actuators"].append(_actuator(
+                        valve_id, field_id, f"{valve_type.replace('_', ' ').title()[:-1]} {field_index}-{valve_index}",
+                        valve_type, "solenoid", flow, "open" if is_open else "close", opened_at))
+                    if tank:
+                        topology["actuator_resource_association"].append({"actuator_id": valve_id, "resource_id": tank})
+                    for pump in pumps:
+                        topology["pump_valve_association"].append({"pump_id": pump["id"], "valve_id": valve_id})
+                        # An open valve keeps its pumps running since the earliest opening
+                        if is_open and (pump["status"] != "open" or opened_at.isoformat() < pump["last_state_change"]):
+                            pump["status"] = "open"
+                            pump["last_state_change"] = opened_at.isoformat()
+
+    return topology
+
+
+def _actuator(actuator_id, field_id, name, actuator_type, subtype, flow_rate, status, last_state_change):
+    return {
+        "id": actuator_id,
+        "field_id": field_id,
+        "name": name,
+        "type": actuator_type,
+        "subtype": subtype,
+        "operation_type": "on_off",
+        "status": status,
+        "base_speed": {"value": flow_rate, "unit": "L/h"},
+        "last_state_change": last_state_change.isoformat() if last_state_change else None,
+        "thingsboard_id": f"tb-{actuator_id}"
+    }
+
+
+def topology_size(topology):
+    """Row counts per table of a generated topology"""
+    return {name: len(rows) for name, rows in topology.items()}
@@ -0,0 +1,118 @@
+"""
+Long-lived client connection to the farm control MCP server.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+
+import anyio
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+logger = logging.getLogger("mcp-connection")
+
+# URL of the networked farm control server, e.g. http://localhost:8765/mcp
+SERVER_URL_ENV = "FARM_MCP_URL"
+
+
+class MCPConnection:
+    """
+    One MCP client session, opened once and reused by every tool call.
+
+    With a URL the client connects to the long-lived networked server: over SSE
+    when the URL ends in /sse, otherwise over streamable HTTP. Without one it
+    starts `server_script` over stdio once and keeps it running. ClientSession
+    multiplexes requests, so concurrent chat sessions share the connection.
+
+    The transport context managers must be entered and left by the same task, so
+    the connection is held open by its own task until `close()`. When that task
+    has ended (the server went away), the next call reconnects.
+    """
+
+    def __init__(self, url=None, server_script="farm_control_server.py", cwd=None):
+        self.url = os.environ.get(SERVER_URL_ENV, "") if url is None else url
+        self.server_script = server_script
+        self.cwd = cwd
+        self.session = None
+        self._task = None
+        self._ready = None
+        self._closing = None
+        self._error = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def transport(self):
+        if not self.url:
+            return "stdio"
+        return "sse" if self.url.rstrip("/").endswith("/sse") else "streamable-http"
+
+    def _open(self):
+        if self.transport == "stdio":
+            return stdio_client(StdioServerParameters(command=sys.executable, args=[self.server_script], cwd=self.cwd))
+        if self.transport == "sse":
+            return sse_client(self.url)
+        return streamablehttp_client(self.url)
+
+    async def _run(self):
+        try:
+            # stdio and SSE yield (read, write); streamable HTTP adds a session id getter
+            async with self._open() as streams:
+                async with ClientSession(streams[0], streams[1]) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+            logger.error(f"MCP connection ({self.transport}) failed: {e}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def connect(self):
+        """Open the connection unless it is open; returns the ClientSession"""
+        async with self._lock:
+            if self.session is not None and not self._task.done():
+                return self.session
+            self._ready, self._closing, self._error = asyncio.Event(), asyncio.Event(), None
+            self._task = asyncio.create_task(self._run())
+            await self._ready.wait()
+            if self.session is None:
+                raise ConnectionError(f"Could not connect to the farm control MCP server: {self._error}")
+            logger.info(f"Connected to the farm control MCP server ({self.transport} {self.url or self.server_script})")
+            return self.session
+
+    async def list_tools(self):
+        session = await self.connect()
+        return (await session.list_tools()).tools
+
+    async def call_tool(self, name, arguments):
+        """
+        Call a tool on the shared session.
+
+        A call whose request could not be sent because the connection had closed is
+        retried once on a new connection; a call that reached the server is never
+        repeated, since tools may have side effects.
+        """
+        session = await self.connect()
+        try:
+            return await session.call_tool(name, arguments)
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            logger.warning(f"MCP connection closed before calling {name}; reconnecting")
+            await self.close()
+            session = await self.connect()
+            return await session.call_tool(name, arguments)
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._closing.set()
+        try:
+            await self._task
+        finally:
+            self._task = None
+            self.session = None
@@ -0,0 +1,26 @@
+def to_number(value, default=0.0):
+    """
+    Read a numeric measurement stored in a JSON column.
+
+    Values appear as plain numbers, numeric strings, {"value": x, "unit": ...}
+    dictionaries or lists of such dictionaries (the first entry wins).
+    """
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get("value")
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def with_number(original, number):
+    """Return `number` stored in the same shape as `original` (keeps {"value", "unit"} dictionaries)"""
+    if isinstance(original, dict):
+        return {**original, "value": number}
+    if isinstance(original, list) and original and isinstance(original[0], dict):
+        return [{**original[0], "value": number}] + original[1:]
+    return number
@@ -2,6 +2,7 @@ import os
 import requests
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,6 +14,7 @@ USERNAME = "tenant@thingsboard.org"
 PASSWORD = "tenant"
 
 jwt_token = None
+device_token_cache = {}
 
 def get_jwt_token():
     """Authenticate with ThingsBoard and retrieve a JWT token."""
@@ -53,6 +55,60 @@ def send_telemetry(device_token, telemetry_data):
         return False
     return True
 
+def get_cached_device_token(jwt_token, device_id):
+    """Return the device token for a device, fetching it only on the first lookup."""
+    if device_id in device_token_cache:
+        return device_token_cache[device_id]
+    device_token = get_device_token(jwt_token, device_id)
+    if device_token:
+        device_token_cache[device_id] = device_token
+    return device_token
+
+def _send_device_telemetry(jwt_token, device_id, payload):
+    """Look up the device token and send one device's telemetry; False on any failure"""
+    try:
+        device_token = get_cached_device_token(jwt_token, device_id)
+        if not device_token:
+            return False
+        return send_telemetry(device_token, payload)
+    except Exception as e:
+        logging.error(f"Failed to send telemetry for {device_id}: {e}")
+        return False
+
+def send_telemetry_batch(telemetry_by_device, max_workers=8):
+    """
+    Send telemetry for many devices with a single authentication.
+
+    The device HTTP API takes one device per request, so the per-device requests
+    (token lookup, then telemetry) are sent concurrently, up to `max_workers` at
+    a time. Failures, including an unreachable ThingsBoard, never raise: the
+    devices concerned are reported as False.
+
+    Args:
+        telemetry_by_device: {thingsboard_device_id: payload}, where payload is a
+            values dict or a list of {"ts": ms, "values": {...}} entries
+        max_workers: concurrent device requests
+
+    Returns:
+        {thingsboard_device_id: True/False}
+    """
+    devices = {device_id: payload for device_id, payload in (telemetry_by_device or {}).items() if device_id}
+    if not devices:
+        return {}
+    try:
+        token = get_jwt_token()
+    except requests.RequestException as e:
+        logging.error(f"Failed to authenticate with ThingsBoard: {e}")
+        token = None
+    if not token:
+        return {device_id: False for device_id in devices}
+    if len(devices) == 1:
+        return {device_id: _send_device_telemetry(token, device_id, payload) for device_id, payload in devices.items()}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(devices)), thread_name_prefix="tb-telemetry") as pool:
+        futures = {device_id: pool.submit(_send_device_telemetry, token, device_id, payload)
+                   for device_id, payload in devices.items()}
+        return {device_id: future.result() for device_id, future in futures.items()}
+
 def create_or_update_device_on_thingsboard(jwt_token, device_data, device_type="actuator"):
     """Create or reuse a device on ThingsBoard."""
     url = f"{THINGSBOARD_URL}/api/device"
@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import threading
+from services.actuator_command_queue import ActuatorCommandQueue
+
+
+class RecordingService:
+    """Stands in for FarmControlService; the first batch blocks until released"""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def update_actuator_statuses(self, actuator_ids, new_status, cause="command"):
+        self.batches.append((sorted(actuator_ids), new_status))
+        self.started.set()
+        if len(self.batches) == 1:
+            self.release.wait(5)
+        return {"results": {actuator_id: {"id": actuator_id, "status": new_status} for actuator_id in actuator_ids}}
+
+
+def test_commands_are_coalesced_deduplicated_and_ordered():
+    service = RecordingService()
+    queue = ActuatorCommandQueue(service, workers=2)
+
+    first = queue.submit("V1", "open")
+    # V1 is now running; the next two wait, and the close supersedes the repeated open
+    assert service.started.wait(5)
+    repeated = queue.submit("V1", "open", idempotency_key="retry-1")
+    assert queue.submit("V1", "open", idempotency_key="retry-1")["command_id"] == repeated["command_id"]
+    final = queue.submit("V1", "close")
+    other = queue.submit("V2", "open")
+
+    # V2 runs in parallel with the blocked V1 batch
+    assert queue.wait(other["command_id"], timeout=5)["state"] == "applied"
+    service.release.set()
+
+    assert queue.wait(first["command_id"], timeout=5)["state"] == "applied"
+    # Waiting on a superseded command follows it to the command that replaced it
+    followed = queue.wait(repeated["command_id"], timeout=5)
+    assert followed["command_id"] == final["command_id"] and followed["state"] == "applied"
+    assert queue.get(repeated["command_id"])["state"] == "superseded"
+
+    v1_batches = [status for ids, status in service.batches if ids == ["V1"]]
+    assert v1_batches == ["open", "close"]
+    stats = queue.get_stats()
+    assert (stats["coalesced"], stats["duplicates"], stats["applied"], stats["queue_depth"]) == (1, 1, 3, 0)
+    assert stats["time_to_apply_ms"]["max"] > 0
+    queue.stop(timeout=1)
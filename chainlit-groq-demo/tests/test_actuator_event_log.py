@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import pytest
+from models.models import init_db, get_session_factory
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+T0 = datetime.datetime(2025, 6, 2, 6, 0, 0)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "events.db")))
+    TopologyImporter(session_factory).import_topology(
+        generate_farm_topology(fields_per_farm=1, valves_per_field=2, dispensers_per_field=0))
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def at(service, monkeypatch, minutes):
+    class Clock(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return T0 + datetime.timedelta(minutes=minutes)
+    monkeypatch.setattr(farm_control_service.datetime, "datetime", Clock)
+
+
+def test_transitions_are_logged_and_replayed(service, monkeypatch):
+    log = service.event_log
+    assert log.ensure_baseline(now=T0 - datetime.timedelta(hours=1)) == 3
+    assert log.ensure_baseline() == 0
+
+    at(service, monkeypatch, 0)
+    service.update_actuator_statuses(["V0000-00000-00", "V0000-00000-01"], "open")
+    at(service, monkeypatch, 10)
+    service.update_actuator_statuses(["V0000-00000-00"], "close")
+    at(service, monkeypatch, 30)
+    service.update_actuator_statuses(["V0000-00000-01"], "close")
+
+    stream = log.read(after_seq=3)
+    assert [(e["actuator_id"], e["to"], e["cause"]) for e in stream["events"]] == [
+        ("V0000-00000-00", "open", "command"), ("V0000-00000-01", "open", "command"),
+        ("P0000-00000-00", "open", "interlock"), ("V0000-00000-00", "close", "command"),
+        ("V0000-00000-01", "close", "command"), ("P0000-00000-00", "close", "interlock")]
+    assert stream["next_seq"] == 9 and not stream["has_more"]
+
+    state = log.state_at(T0 + datetime.timedelta(minutes=20))
+    assert {actuator_id: s["status"] for actuator_id, s in state.items()} == {
+        "P0000-00000-00": "open", "V0000-00000-00": "close", "V0000-00000-01": "open"}
+
+    # Runtime is clipped to the window
+    runtime = log.runtime(T0 + datetime.timedelta(minutes=5), T0 + datetime.timedelta(hours=1))
+    assert runtime == {"V0000-00000-00": 300.0, "V0000-00000-01": 1500.0, "P0000-00000-00": 1500.0}
+    assert log.runtime(T0, T0 + datetime.timedelta(hours=1), ["V0000-00000-00"]) == {"V0000-00000-00": 600.0}
+
+
+def test_consumer_cursor(service):
+    log = service.event_log
+    log.ensure_baseline()
+    batch = log.consume("thingsboard", limit=2)
+    assert [e["seq"] for e in batch["events"]] == [1, 2] and batch["has_more"]
+    log.commit_cursor("thingsboard", batch["next_seq"])
+
+    assert not log.wait(log.head(), timeout=0.01)
+    service.update_actuator_statuses(["V0000-00000-00"], "open")
+    batch = log.consume("thingsboard", timeout=1)
+    assert [e["seq"] for e in batch["events"]] == [3, 4, 5]
+    assert log.get_stats()["consumer_lag"] == {"thingsboard": 3}
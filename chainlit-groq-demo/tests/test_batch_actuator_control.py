@@ -0,0 +1,168 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import pytest
+from models.models import init_db, get_session_factory, Actuator, Resource, UsageRollup
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+NOW = datetime.datetime.now().replace(microsecond=0)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    flushes = []
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch",
+                        lambda telemetry: flushes.append(telemetry) or {device: True for device in telemetry})
+    session_factory = get_session_factory(init_db(str(tmp_path / "batch.db")))
+    topology = generate_farm_topology(fields_per_farm=2, valves_per_field=2, dispensers_per_field=0, now=NOW)
+    TopologyImporter(session_factory).import_topology(topology)
+    service = farm_control_service.FarmControlService(session_factory)
+    service.telemetry_flushes = flushes
+    return service
+
+
+def test_batch_open_and_close_resolves_interlocks(service):
+    valves = ["V0000-00000-00", "V0000-00000-01"]
+    opened = service.update_actuator_statuses(valves + ["V404"], "open")
+
+    assert opened["changed"] == 2
+    assert opened["results"]["V404"] == {"error": "Actuator V404 not found"}
+    assert opened["interlocked_pumps"] == [{"id": "P0000-00000-00", "from": "close", "to": "open"}]
+    assert len(service.telemetry_flushes) == 1
+
+    # Closing one valve keeps the pump running, closing both stops it
+    assert service.update_actuator_statuses(valves[:1], "close")["interlocked_pumps"] == []
+    closed = service.update_actuator_statuses(valves, "close")
+    assert closed["changed"] == 1
+    assert closed["interlocked_pumps"] == [{"id": "P0000-00000-00", "from": "open", "to": "close"}]
+    with service.session_factory() as session:
+        assert session.get(Actuator, "P0000-00000-00").status == "close"
+
+
+def test_batch_close_settles_consumption(service):
+    opened_at = NOW - datetime.timedelta(hours=1)
+    with service.session_factory() as session:
+        for actuator_id in ("V0000-00000-00", "V0000-00000-01"):
+            valve = session.get(Actuator, actuator_id)
+            valve.status, valve.last_state_change, valve.base_speed = "open", opened_at, {"value": 360, "unit": "L/h"}
+        tank = session.get(Resource, "R0000-W000")
+        level = tank.current_level["value"]
+        session.commit()
+
+    result = service.update_actuator_statuses(["V0000-00000-00", "V0000-00000-01"], "close")
+
+    update = next(u for u in result["resource_updates"] if u["resource_id"] == "R0000-W000")
+    assert update["consumption"] == pytest.approx(720, abs=1)
+    with service.session_factory() as session:
+        stored = session.get(Resource, "R0000-W000").current_level
+        assert stored["unit"] == "L"
+        assert stored["value"] == pytest.approx(max(level - 720, 0), abs=1)
+
+
+def test_single_update_keeps_level_shape_and_survives_thingsboard_outage(service, monkeypatch):
+    def unreachable(telemetry):
+        raise ConnectionError("ThingsBoard is down")
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", unreachable)
+    opened_at = NOW - datetime.timedelta(hours=1)
+    with service.session_factory() as session:
+        valve = session.get(Actuator, "V0000-00000-00")
+        valve.status, valve.last_state_change, valve.base_speed = "open", opened_at, {"value": 360, "unit": "L/h"}
+        session.commit()
+
+    # Open -> open is a no-op and keeps the open timer running
+    assert service.update_actuator_status("V0000-00000-00", "open")["status_change"]["changed"] is False
+    result = service.update_actuator_status("V0000-00000-00", "close")
+
+    assert "error" not in result
+    assert result["status_change"]["verified"] is True
+    assert result["status_change"]["thingsboard_synced"] is False
+    assert result["resource_updates"][0]["consumption"] == pytest.approx(360, abs=1)
+    with service.session_factory() as session:
+        assert session.get(Actuator, "V0000-00000-00").status == "close"
+        assert set(session.get(Resource, "R0000-W000").current_level) == {"value", "unit"}
+
+
+def test_emergency_stop_settles_in_background(service):
+    opened_at = NOW - datetime.timedelta(hours=1)
+    with service.session_factory() as session:
+        for actuator_id in ("P0000-00000-00", "V0000-00000-00"):
+            actuator = session.get(Actuator, actuator_id)
+            actuator.status, actuator.last_state_change = "open", opened_at
+        session.get(Actuator, "V0000-00000-00").base_speed = {"value": 360, "unit": "L/h"}
+        session.get(Actuator, "P0000-00000-00").base_speed = {"value": 0, "unit": "L/h"}
+        level = session.get(Resource, "R0000-W000").current_level["value"]
+        session.commit()
+    events = []
+    service.add_change_listener(lambda event_type, payload: events.append(event_type))
+
+    result = service.emergency_stop()
+
+    assert result["stopped"] == 2
+    assert result["stopped_by_type"] == {"pumps": 1, "water_valves": 1}
+    assert service.get_actuator_by_id("V0000-00000-00")["status"] == "close"
+    assert service.wait_for_background(timeout=10)
+    assert "actuator_status" in events and len(service.telemetry_flushes) == 1
+    with service.session_factory() as session:
+        valve = session.get(Actuator, "V0000-00000-00")
+        assert valve.status == "close" and valve.last_state_change > opened_at
+        assert session.get(Resource, "R0000-W000").current_level["value"] == pytest.approx(max(level - 360, 0), abs=1)
+    assert service.emergency_stop()["stopped"] == 0
+
+
+def test_emergency_stop_settles_actuators_reopened_before_settlement(service, monkeypatch):
+    opened_at = NOW - datetime.timedelta(hours=1)
+    with service.session_factory() as session:
+        valve = session.get(Actuator, "V0000-00000-00")
+        valve.status, valve.last_state_change, valve.base_speed = "open", opened_at, {"value": 360, "unit": "L/h"}
+        level = session.get(Resource, "R0000-W000").current_level["value"]
+        session.commit()
+    deferred = []
+    monkeypatch.setattr(service, "_run_in_background", lambda fn, *args: deferred.append((fn, args)))
+
+    service.emergency_stop()
+    service.update_actuator_statuses(["V0000-00000-00"], "open")
+    with service.session_factory() as session:
+        reopened_at = session.get(Actuator, "V0000-00000-00").last_state_change
+    for fn, args in deferred:
+        fn(*args)
+
+    # The hour before the stop is settled; the new run keeps its open timer
+    with service.session_factory() as session:
+        valve = session.get(Actuator, "V0000-00000-00")
+        assert valve.status == "open" and valve.last_state_change == reopened_at
+        assert session.get(Resource, "R0000-W000").current_level["value"] == pytest.approx(max(level - 360, 0), abs=1)
+    assert service.get_actuator_by_id("V0000-00000-00")["status"] == "open"
+    events = service.event_log.read(actuator_id="V0000-00000-00")["events"]
+    assert [(event["from"], event["to"]) for event in events if event["from"]] == [("open", "close"), ("close", "open")]
+    with service.session_factory() as session:
+        rollups = session.query(UsageRollup).filter_by(scope="actuator", key="V0000-00000-00").all()
+        assert sum(rollup.runtime_seconds for rollup in rollups) == pytest.approx(3600, abs=5)
+
+
+def test_emergency_stop_settles_while_thingsboard_is_down(service, monkeypatch, caplog):
+    def unreachable(telemetry):
+        raise ConnectionError("ThingsBoard is down")
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", unreachable)
+    opened_at = NOW - datetime.timedelta(hours=1)
+    with service.session_factory() as session:
+        valve = session.get(Actuator, "V0000-00000-00")
+        valve.status, valve.last_state_change, valve.base_speed = "open", opened_at, {"value": 360, "unit": "L/h"}
+        level = session.get(Resource, "R0000-W000").current_level["value"]
+        session.commit()
+    events = []
+    service.add_change_listener(lambda event_type, payload: events.append(event_type))
+
+    with caplog.at_level("INFO"):
+        assert service.emergency_stop()["stopped"] == 1
+        assert service.wait_for_background(timeout=10)
+
+    # Settlement completes, is published and reports the devices as unsynced
+    assert "Background task failed" not in caplog.text
+    assert "0/0 devices synced" in caplog.text
+    assert "actuator_status" in events
+    assert service.get_resource_levels(["R0000-W000"])["R0000-W000"]["current_level"]["value"] == pytest.approx(max(level - 360, 0), abs=1)
+    with service.session_factory() as session:
+        assert session.get(Actuator, "V0000-00000-00").last_state_change > opened_at
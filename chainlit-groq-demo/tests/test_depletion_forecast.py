@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import pytest
+from models.models import init_db, get_session_factory, Actuator, Resource
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "forecast.db")))
+    topology = generate_farm_topology(fields_per_farm=2, valves_per_field=1, dispensers_per_field=0,
+                                      water_tanks_per_farm=2, fertilizer_tanks_per_farm=0)
+    TopologyImporter(session_factory).import_topology(topology)
+    with session_factory() as session:
+        for actuator in session.query(Actuator):
+            actuator.base_speed = {"value": 3600 if actuator.type == "water_valves" else 0, "unit": "L/h"}
+        session.get(Resource, "R0000-W000").current_level = {"value": 7200, "unit": "L"}
+        session.get(Resource, "R0000-W001").current_level = {"value": 1800, "unit": "L"}
+        session.commit()
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def test_forecast_follows_transitions(service):
+    assert service.forecast.get_depletion_forecast(5)["forecast"] == []
+    alerts = []
+    service.forecast.add_alert_listener(alerts.append)
+
+    # Field 0 drains W000 (7200 L at 1 L/s), field 1 drains W001 (1800 L at 1 L/s)
+    service.update_actuator_statuses(["V0000-00000-00", "V0000-00001-00"], "open")
+    forecast = service.forecast.get_depletion_forecast(5)["forecast"]
+    assert [entry["resource_id"] for entry in forecast] == ["R0000-W001", "R0000-W000"]
+    assert forecast[0]["hours_until_empty"] == pytest.approx(0.5, abs=0.01)
+    assert forecast[1]["consumption_rate_per_hour"] == 3600
+    # Only W001 runs dry within the one hour horizon
+    assert [alert["resource_id"] for alert in alerts] == ["R0000-W001"]
+
+    # A tick settles consumption without moving the projection
+    service.update_all_open_actuator_resources()
+    after_tick = service.forecast.soonest(1)[0]
+    assert after_tick["depletes_at"][:19] == forecast[0]["depletes_at"][:19]
+
+    service.update_actuator_statuses(["V0000-00001-00"], "close")
+    assert [entry["resource_id"] for entry in service.forecast.soonest(5)] == ["R0000-W000"]
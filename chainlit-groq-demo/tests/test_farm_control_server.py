@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import asyncio
+import json
+import pytest
+from models.models import init_db, get_session_factory
+from services.tool_cache import ToolResultCache
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    # The server opens farm_control.db in the working directory when imported
+    monkeypatch.chdir(tmp_path)
+    server = pytest.importorskip("farm_control_server", exc_type=ImportError)
+    session_factory = get_session_factory(init_db(str(tmp_path / "server.db")))
+    TopologyImporter(session_factory).import_topology(generate_farm_topology(fields_per_farm=2))
+    service = farm_control_service.FarmControlService(session_factory)
+    cache = ToolResultCache(service.topology)
+    service.add_change_listener(cache.on_change)
+    monkeypatch.setattr(server, "farm_service", service)
+    monkeypatch.setattr(server, "tool_cache", cache)
+    return server
+
+
+def test_active_actuator_changes_respect_filters(server):
+    version = json.loads(server.get_active_actuators())["version"]
+    server.farm_service.update_actuator_statuses(["V0000-00000-00", "V0000-00001-00"], "open")
+    server.farm_service.update_actuator_statuses(["V0000-00001-00"], "close")
+
+    delta = json.loads(server.get_active_actuators(field_id="F0000-00000", since_version=version))
+    assert delta["full"] is False
+    # The valve and the pump it switched on; the other field's valve is not reported
+    assert {actuator["id"] for actuator in delta["actuators"]} == {"V0000-00000-00", "P0000-00000-00"}
+    assert delta["removed"] == []
+
+    delta = json.loads(server.get_active_actuators(actuator_type="water_valves", since_version=version))
+    assert [actuator["id"] for actuator in delta["actuators"]] == ["V0000-00000-00"]
+    assert delta["removed"] == ["V0000-00001-00"]
+
+
+def test_only_applied_commands_become_active_operations(server, monkeypatch):
+    monkeypatch.setattr(server, "active_operations", {})
+
+    failed = json.loads(server.control_actuator("V404", "open"))
+    assert failed["state"] == "failed"
+    applied = json.loads(server.control_actuator("V0000-00000-00", "open"))
+    assert applied["state"] == "applied"
+    assert list(server.active_operations) == ["V0000-00000-00"]
+
+    snapshot = server.farm_service.topology.snapshot()
+    server.field_irrigation_control(snapshot.fields["F0000-00001"]["name"], "start")
+    irrigation = {actuator["id"] for actuator in snapshot.actuators_for_field("F0000-00001")
+                  if actuator["type"] in ("pumps", "water_valves")}
+    assert set(server.active_operations) == irrigation | {"V0000-00000-00"}
+    server.farm_service.commands.stop()
+
+
+def call_tool(server, name, arguments):
+    """Call a tool through FastMCP, with argument validation, and decode its JSON text"""
+    content = asyncio.run(server.mcp.call_tool(name, arguments))
+    return json.loads(content[0].text)
+
+
+def test_run_batch_through_mcp(server):
+    field_name = server.farm_service.topology.snapshot().fields["F0000-00000"]["name"]
+    calls = [
+        {"tool": "find_field_by_name", "args": {"field_name": field_name}},
+        {"tool": "get_actuator_status", "args": {"actuator_id": "V0000-00000-00"}},
+        {"tool": ["find_field_by_name"]},
+        {"tool": "get_actuator_status", "args": ["V0000-00000-00"]},
+        {"tool": "run_batch", "args": {"calls": []}},
+        {"tool": "get_actuator_status", "args": {"actuator": "V0000-00000-00"}}
+    ]
+
+    batch = call_tool(server, "run_batch", {"calls": calls, "stop_on_error": False})
+
+    assert batch["failed"] == 4
+    assert batch["results"][0]["result"]["id"] == "F0000-00000"
+    assert batch["results"][1]["result"]["id"] == "V0000-00000-00"
+    assert [result["error"] for result in batch["results"][2:5]] == [
+        "tool must be a tool name", "args must be an object", "Tool run_batch cannot be batched"]
+    assert batch["results"][5]["error"].startswith("Invalid arguments")
+
+    # Clients may send the list as JSON text; the remaining calls are skipped after an error
+    batch = call_tool(server, "run_batch", {"calls": json.dumps(calls[1:4])})
+    assert [sorted(result) for result in batch["results"]] == [["result", "tool"], ["error", "tool"], ["skipped", "tool"]]
+    assert batch["results"][2]["tool"] == "get_actuator_status"
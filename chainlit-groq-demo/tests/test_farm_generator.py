@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import json
+from models.models import init_db, get_session_factory, Actuator, Resource
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+
+NOW = datetime.datetime(2025, 6, 1, 6, 0, 0)
+
+
+def test_generator_is_deterministic():
+    first = generate_farm_topology(farms=2, fields_per_farm=5, open_fraction=0.5, now=NOW)
+    second = generate_farm_topology(farms=2, fields_per_farm=5, open_fraction=0.5, now=NOW)
+    assert json.dumps(first) == json.dumps(second)
+    assert len(first["fields"]) == 10
+
+
+def test_import_resolves_associations(tmp_path):
+    session_factory = get_session_factory(init_db(str(tmp_path / "import.db")))
+    topology = generate_farm_topology(farms=1, fields_per_farm=3, valves_per_field=2, now=NOW)
+    report = TopologyImporter(session_factory).import_topology(topology)
+
+    assert report["status"] == "imported"
+    assert report["tables"]["pump_valve_association"] == 3 * 3
+    with session_factory() as session:
+        pump = session.get(Actuator, "P0000-00000-00")
+        assert {valve.id for valve in pump.linked_valves} == {"V0000-00000-00", "V0000-00000-01", "D0000-00000-00"}
+        assert session.get(Resource, "R0000-W000").capacity["unit"] == "L"
+
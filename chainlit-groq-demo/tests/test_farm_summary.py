@@ -0,0 +1,76 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models.models import init_db, get_session_factory, Field
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "summary.db")))
+    topology = generate_farm_topology(farms=2, fields_per_farm=3, open_fraction=0.5)
+    # A field and a resource that belong to no farm
+    topology["fields"].append({"id": "F-LOOSE", "name": "Loose Field",
+                               "actuators": [{"id": "V-LOOSE", "name": "Valve", "type": "water_valves", "status": "open"}]})
+    topology["resources"].append({"id": "R-LOOSE", "name": "Barrel", "fields": ["F-LOOSE"],
+                                  "capacity": {"value": 100, "unit": "L"}, "current_level": {"value": 50, "unit": "L"}})
+    TopologyImporter(session_factory).import_topology(topology)
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def baseline_summary(service):
+    """The per-field ORM walk get_farm_summary replaced"""
+    with service.session_factory() as session:
+        fields = session.query(Field).all()
+        summary = {"total_fields": len(fields), "total_actuators": 0, "total_sensors": 0, "total_resources": 0}
+        for field in fields:
+            summary["total_actuators"] += len(field.actuators)
+            summary["total_sensors"] += len(field.sensors)
+            summary["total_resources"] += len(field.resources)
+            summary["active_devices"] = service.get_active_actuators(include_related=False)
+            summary["inactive_devices"] = service.get_inactive_actuators(include_related=False)
+        return summary
+
+
+def test_summary_matches_baseline_walk(service):
+    expected = baseline_summary(service)
+    summary = service.get_farm_summary()
+
+    for key in ("total_fields", "total_actuators", "total_sensors", "total_resources"):
+        assert summary[key] == expected[key], key
+    for key in ("active_devices", "inactive_devices"):
+        assert sorted(summary[key], key=lambda a: a["id"]) == sorted(expected[key], key=lambda a: a["id"]), key
+    assert summary["active_actuators"] == len(expected["active_devices"])
+
+    # Fields and resources without a farm count in the totals but not as a farm
+    assert summary["total_farms"] == 2
+    assert [farm["farm_id"] for farm in summary["farms"]] == ["FM0000", "FM0001"]
+    assert "R-LOOSE" in {resource["id"] for resource in summary["resources"]}
+
+
+def test_summary_for_one_farm(service):
+    summary = service.get_farm_summary(farm_id="FM0001", include_fields=True)
+
+    assert summary["total_farms"] == 1
+    assert {field["farm_id"] for field in summary["fields"]} == {"FM0001"}
+    assert all(device["field_id"].startswith("F0001") for device in summary["active_devices"] + summary["inactive_devices"])
+    assert summary["active_actuators"] == len(summary["active_devices"])
+
+
+def test_summary_takes_two_statements(service):
+    service.topology.snapshot()
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", listener)
+    try:
+        service.get_farm_summary(include_fields=True)
+    finally:
+        event.remove(Engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 2
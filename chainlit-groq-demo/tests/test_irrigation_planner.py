@@ -0,0 +1,90 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import pytest
+from models.models import init_db, get_session_factory, Actuator, Resource, IrrigationSchedule
+from services.topology_importer import TopologyImporter
+from services.irrigation_scheduler import IrrigationScheduler
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+MONDAY_5AM = datetime.datetime(2025, 6, 2, 5, 0, 0)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "planner.db")))
+    topology = generate_farm_topology(fields_per_farm=3, valves_per_field=1, dispensers_per_field=0,
+                                      water_tanks_per_farm=1, fertilizer_tanks_per_farm=0)
+    # All three fields hang off the first field's pump, which can feed one valve at a time
+    topology["pump_valve_association"] = [{"pump_id": "P0000-00000-00", "valve_id": a["id"]}
+                                          for a in topology["actuators"] if a["type"] == "water_valves"]
+    for actuator in topology["actuators"]:
+        actuator["base_speed"] = {"value": 1000 if actuator["type"] == "pumps" else 600, "unit": "L/h"}
+    topology["actuator_resource_association"] = [row for row in topology["actuator_resource_association"]
+                                                 if not row["actuator_id"].startswith("P")]
+    for resource in topology["resources"]:
+        resource["capacity"] = {"value": 1000, "unit": "L"}
+        resource["current_level"] = {"value": 1000, "unit": "L"}
+    TopologyImporter(session_factory).import_topology(topology)
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def test_plan_staggers_shared_pump_and_respects_tank_reserve(service):
+    demands = [{"field_id": f"F0000-{i:05d}", "volume": 300, "priority": i} for i in range(3)]
+    demands.append({"field_name": "Nowhere", "volume": 10})
+    demands.append("F0000-00000")
+    plan = service.planner.plan(demands, start=MONDAY_5AM)
+
+    # 300 L at 600 L/h is two 15-minute slots; highest priority goes first
+    assert [(run["field_id"], run["start"][11:16]) for run in plan["scheduled"]] == [
+        ("F0000-00002", "05:00"), ("F0000-00001", "05:30"), ("F0000-00000", "06:00")]
+    assert plan["pump_peak_utilization"] == {"P0000-00000-00": 0.6}
+    assert plan["tank_usage"]["R0000-W000"] == {"planned": 900.0, "available": 900.0}
+    assert [entry["reason"] for entry in plan["unscheduled"]] == ["field not found", "demand must be an object"]
+    assert "error" in service.planner.plan({"field_id": "F0000-00000", "volume": 300})
+
+    # With half the tank held in reserve only one 300 L run fits
+    demands = [{"field_id": "F0000-00000", "duration_minutes": 30}, {"field_id": "F0000-00001", "duration_minutes": 30}]
+    plan = service.planner.plan(demands, start=MONDAY_5AM, reserve_fraction=0.5)
+    assert [run["field_id"] for run in plan["scheduled"]] == ["F0000-00000"]
+    assert plan["unscheduled"] == [{"field_id": "F0000-00001", "reason": "insufficient tank volume",
+                                    "resources": ["R0000-W000"]}]
+
+
+def test_plan_reports_invalid_and_oversized_demands(service):
+    demands = [
+        {"field_id": "F0000-00000", "duration_minutes": 90, "window": {"start": "05:00", "end": "06:00"}},
+        {"field_id": "F0000-00001", "duration_minutes": "long"},
+        {"field_id": "F0000-00001", "volume": 100, "priority": "high"},
+        {"field_id": "F0000-00002"}
+    ]
+    plan = service.planner.plan(demands, start=MONDAY_5AM)
+
+    assert plan["scheduled"] == []
+    assert plan["unscheduled"][-1] == {"field_id": "F0000-00000", "reason": "run longer than window"}
+    assert [entry["reason"].split(":")[0] for entry in plan["unscheduled"][:3]] == ["invalid demand"] * 3
+
+
+def test_plan_window_and_execution(service):
+    service.scheduler = IrrigationScheduler(service, clock=lambda: MONDAY_5AM)
+    demands = [{"field_id": "F0000-00000", "duration_minutes": 30},
+               {"field_id": "F0000-00001", "duration_minutes": 30, "window": {"start": "22:00", "end": "02:00"}}]
+
+    plan = service.plan_irrigation(demands, execute=True, start=MONDAY_5AM)
+
+    assert [run["start"] for run in plan["scheduled"]] == ["2025-06-02T05:00:00", "2025-06-02T22:00:00"]
+    assert len(plan["execution"]["started_now"]) == 1
+    with service.session_factory() as session:
+        assert session.get(Actuator, "V0000-00000-00").status == "open"
+        assert session.get(Actuator, "V0000-00001-00").status == "close"
+        assert session.query(IrrigationSchedule).filter(IrrigationSchedule.once == True).count() == 2
+
+    # The one-off run stops and completes instead of recurring
+    service.scheduler.run_pending(MONDAY_5AM + datetime.timedelta(minutes=30))
+    with service.session_factory() as session:
+        assert session.get(Actuator, "V0000-00000-00").status == "close"
+        started = session.get(IrrigationSchedule, plan["execution"]["started_now"][0])
+        assert started.status == "completed" and started.next_run_at is None
@@ -0,0 +1,129 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import pytest
+from models.models import init_db, get_session_factory, Actuator, IrrigationSchedule
+from services.topology_importer import TopologyImporter
+from services.irrigation_scheduler import IrrigationScheduler, next_occurrence
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+MONDAY_5AM = datetime.datetime(2025, 6, 2, 5, 0, 0)
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "schedule.db")))
+    TopologyImporter(session_factory).import_topology(
+        generate_farm_topology(fields_per_farm=3, valves_per_field=1, dispensers_per_field=0))
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def statuses(service, field_index):
+    with service.session_factory() as session:
+        return {a.type: a.status for a in session.query(Actuator).filter(Actuator.field_id == f"F0000-{field_index:05d}")}
+
+
+def test_next_occurrence_honours_days():
+    assert next_occurrence("06:00", ["wednesday"], MONDAY_5AM) == datetime.datetime(2025, 6, 4, 6, 0)
+    assert next_occurrence("06:00", None, datetime.datetime(2025, 6, 2, 6, 0)) == datetime.datetime(2025, 6, 3, 6, 0)
+
+
+def test_due_schedules_run_as_one_batch(service):
+    clock = Clock(MONDAY_5AM)
+    scheduler = service.scheduler = IrrigationScheduler(service, clock=clock)
+    for field_index in range(3):
+        created = service.create_irrigation_schedule(
+            f"F0000-{field_index:05d}", {"start_time": "06:00", "duration": 30, "jitter_seconds": 0})
+        assert created["next_run_at"] == datetime.datetime(2025, 6, 2, 6, 0)
+    assert "error" in service.create_irrigation_schedule("F0000-00000", '{"start_time": "25:00", "duration": 5}')
+
+    clock.now = datetime.datetime(2025, 6, 2, 6, 0, 0)
+    dispatch = scheduler.run_pending()
+    assert len(dispatch["started"]) == 3 and dispatch["results"]["open"]["changed"] == 6
+    assert statuses(service, 1) == {"pumps": "open", "water_valves": "open"}
+
+    paused = scheduler.list_schedules("F0000-00002")[0]
+    scheduler.set_paused(paused["id"])
+    clock.now = datetime.datetime(2025, 6, 2, 6, 30, 0)
+    assert len(scheduler.run_pending()["stopped"]) == 3
+    assert statuses(service, 2) == {"pumps": "close", "water_valves": "close"}
+    assert [s["status"] for s in scheduler.list_schedules()].count("paused") == 1
+
+
+def test_overlapping_schedules_keep_shared_actuators_open(service):
+    clock = Clock(MONDAY_5AM)
+    scheduler = service.scheduler = IrrigationScheduler(service, clock=clock)
+    for start_time in ("06:00", "06:30"):
+        service.create_irrigation_schedule("F0000-00000", {"start_time": start_time, "duration": 60, "jitter_seconds": 0})
+
+    for hour, minute in ((6, 0), (6, 30)):
+        clock.now = datetime.datetime(2025, 6, 2, hour, minute, 0)
+        assert len(scheduler.run_pending()["started"]) == 1
+
+    # The first run ends while the second still needs the valve
+    clock.now = datetime.datetime(2025, 6, 2, 7, 0, 0)
+    assert len(scheduler.run_pending()["stopped"]) == 1
+    assert statuses(service, 0) == {"pumps": "open", "water_valves": "open"}
+
+    clock.now = datetime.datetime(2025, 6, 2, 7, 30, 0)
+    assert len(scheduler.run_pending()["stopped"]) == 1
+    assert statuses(service, 0) == {"pumps": "close", "water_valves": "close"}
+
+
+def test_emergency_stop_ends_running_schedules(service):
+    clock = Clock(MONDAY_5AM)
+    scheduler = service.scheduler = IrrigationScheduler(service, clock=clock)
+    for field_index, start_time, duration in ((0, "06:00", 30), (1, "06:00", 60), (2, "06:30", 30)):
+        service.create_irrigation_schedule(
+            f"F0000-{field_index:05d}", {"start_time": start_time, "duration": duration, "jitter_seconds": 0})
+    clock.now = datetime.datetime(2025, 6, 2, 6, 0, 0)
+    assert len(scheduler.run_pending()["started"]) == 2
+
+    clock.now = datetime.datetime(2025, 6, 2, 6, 10, 0)
+    assert service.emergency_stop()["stopped"] == 4
+    assert service.wait_for_background(timeout=10)
+
+    # Starting the third schedule does not reopen the second one's pump and valve
+    clock.now = datetime.datetime(2025, 6, 2, 6, 30, 0)
+    dispatch = scheduler.run_pending()
+    assert len(dispatch["started"]) == 1 and dispatch["stopped"] == []
+    assert dispatch["results"]["open"]["changed"] == 2
+    assert statuses(service, 1) == {"pumps": "close", "water_valves": "close"}
+    assert statuses(service, 2) == {"pumps": "open", "water_valves": "open"}
+    assert [s["active_until"] is None for s in scheduler.list_schedules()].count(True) == 2
+
+
+def test_restart_catches_up_missed_window(service):
+    clock = Clock(MONDAY_5AM)
+    service.scheduler = IrrigationScheduler(service, clock=clock)
+    schedule_id = service.create_irrigation_schedule("F0000-00000", {"start_time": "06:00", "duration": 60})["id"]
+    skipped_id = service.create_irrigation_schedule(
+        "F0000-00001", {"start_time": "06:00", "duration": 60, "catch_up": "skip"})["id"]
+
+    # "Restart" at 06:20: the 06:00 start was missed while no dispatcher ran
+    clock.now = datetime.datetime(2025, 6, 2, 6, 20, 0)
+    restarted = IrrigationScheduler(service, clock=clock)
+    report = restarted.load()
+
+    assert report["caught_up"] == 1 and report["skipped"] == 1
+    assert statuses(service, 0)["water_valves"] == "open"
+    assert statuses(service, 1)["water_valves"] == "close"
+    with service.session_factory() as session:
+        caught_up = session.get(IrrigationSchedule, schedule_id)
+        assert caught_up.active_until == datetime.datetime(2025, 6, 2, 7, 0)
+        assert caught_up.next_run_at == datetime.datetime(2025, 6, 3, 6, 0)
+        assert session.get(IrrigationSchedule, skipped_id).active_until is None
+
+    assert restarted.delete_schedule(schedule_id)["stopped_running_irrigation"]
+    assert statuses(service, 0)["water_valves"] == "close"
@@ -0,0 +1,98 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import asyncio
+import contextlib
+import socket
+import threading
+import time
+import pytest
+
+fastmcp = pytest.importorskip("mcp.server.fastmcp", exc_type=ImportError)
+uvicorn = pytest.importorskip("uvicorn")
+import anyio
+from utils.mcp_connection import MCPConnection
+
+APPS = {"streamable-http": ("/mcp", "streamable_http_app"), "sse": ("/sse", "sse_app")}
+
+
+def echo_server():
+    """A FastMCP server with one tool that records the server session of each call"""
+    server = fastmcp.FastMCP("echo")
+    sessions = []
+
+    @server.tool()
+    def echo(text: str, ctx: fastmcp.Context) -> str:
+        sessions.append(ctx.session)
+        return text
+
+    return server, sessions
+
+
+@contextlib.contextmanager
+def serving(app):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           timeout_graceful_shutdown=1))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("Test server did not start")
+        time.sleep(0.05)
+    try:
+        yield port
+    finally:
+        server.should_exit = True
+        thread.join(10)
+
+
+@pytest.mark.parametrize("transport", ["streamable-http", "sse"])
+def test_concurrent_calls_share_one_session(transport):
+    server, sessions = echo_server()
+    path, app = APPS[transport]
+
+    async def scenario(url):
+        connection = MCPConnection(url=url)
+        assert connection.transport == transport
+        results = await asyncio.gather(*(connection.call_tool("echo", {"text": str(i)}) for i in range(8)))
+        session = connection.session
+        assert await connection.connect() is session
+        await connection.close()
+        assert connection.session is None
+        return [result.content[0].text for result in results]
+
+    with serving(getattr(server, app)()) as port:
+        texts = asyncio.run(scenario(f"http://127.0.0.1:{port}{path}"))
+
+    assert texts == [str(i) for i in range(8)]
+    assert len({id(session) for session in sessions}) == 1
+
+
+def test_reconnects_when_the_connection_drops():
+    server, sessions = echo_server()
+
+    async def scenario(url):
+        connection = MCPConnection(url=url)
+        await connection.call_tool("echo", {"text": "a"})
+
+        # The transport ended (server went away): the next call opens a new session
+        connection._closing.set()
+        await connection._task
+        await connection.call_tool("echo", {"text": "b"})
+
+        # A request that could not be sent is retried once on a new connection
+        async def closed(*args, **kwargs):
+            raise anyio.ClosedResourceError
+        connection.session.call_tool = closed
+        result = await connection.call_tool("echo", {"text": "c"})
+        await connection.close()
+        return result.content[0].text
+
+    with serving(server.streamable_http_app()) as port:
+        assert asyncio.run(scenario(f"http://127.0.0.1:{port}/mcp")) == "c"
+
+    assert len({id(session) for session in sessions}) == 3
@@ -0,0 +1,107 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import pytest
+from models.models import init_db, get_session_factory, Actuator, pump_valve_association
+from services.pump_interlock import PumpInterlockIndex
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    session_factory = get_session_factory(init_db(str(tmp_path / "interlock.db")))
+    TopologyImporter(session_factory).import_topology(
+        generate_farm_topology(fields_per_farm=2, valves_per_field=2, dispensers_per_field=0))
+    with session_factory() as session:
+        # A dangling link and a valve->valve link must not enter the graph
+        session.execute(pump_valve_association.insert(), [{"pump_id": "P404", "valve_id": "V0000-00000-00"},
+                                                          {"pump_id": "V0000-00001-00", "valve_id": "V0000-00000-00"}])
+        session.get(Actuator, "V0000-00000-00").status = "open"
+        session.commit()
+    return session_factory
+
+
+def test_rebuild_validates_graph_and_counts_open_valves(session_factory):
+    index = PumpInterlockIndex(session_factory)
+    report = index.rebuild()
+
+    assert report["pumps"] == 2 and report["links"] == 4
+    assert [link["reason"] for link in report["invalid_links"]] == [
+        "missing actuator", "V0000-00001-00 is not a pump (water_valves)"]
+    assert report["inconsistent_pumps"] == [{"pump_id": "P0000-00000-00", "status": "close", "open_valves": 1}]
+    assert index.open_valve_count("P0000-00000-00") == 1
+
+    with index.transaction():
+        assert index.apply([("V0000-00000-01", "open")]) == {}
+        assert index.apply([("V0000-00000-00", "close")]) == {}
+        # Closing the last open valve shuts the pump down; reopening in the same call cancels out
+        assert index.apply([("V0000-00000-01", "close")]) == {"P0000-00000-00": "close"}
+        assert index.apply([("V0000-00000-00", "open"), ("V0000-00000-00", "close")]) == {}
+
+    with pytest.raises(RuntimeError):
+        index.apply([("V0000-00000-00", "open")])
+
+
+def test_failed_transaction_restores_counters(session_factory):
+    index = PumpInterlockIndex(session_factory)
+    with pytest.raises(ValueError):
+        with index.transaction():
+            assert index.apply([("V0000-00000-00", "close")]) == {"P0000-00000-00": "close"}
+            raise ValueError("rollback")
+    assert index.open_valve_count("P0000-00000-00") == 1
+
+
+def test_single_update_uses_index_without_relationship_walks(session_factory, monkeypatch):
+    flushes = []
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: flushes.append(telemetry) or {})
+    monkeypatch.setattr(farm_control_service.FarmControlService, "_sync_resource_with_thingsboard", lambda *args: None)
+    service = farm_control_service.FarmControlService(session_factory)
+
+    # The pump was already off, so the first crossing to zero has nothing to switch
+    service.update_actuator_status("V0000-00000-00", "close")
+    service.update_actuator_status("V0000-00000-01", "open")
+    service.update_actuator_status("V0000-00000-00", "open")
+    assert service.interlocks.open_valve_count("P0000-00000-00") == 2
+    service.update_actuator_status("V0000-00000-00", "close")
+    service.update_actuator_status("V0000-00000-01", "close")
+
+    assert service.interlocks.open_valve_count("P0000-00000-00") == 0
+    # The pump is in the flush of each switch, with the tank level the pump drew from on shutdown
+    pump_flushes = [flush for flush in flushes if "tb-P0000-00000-00" in flush]
+    assert [flush["tb-P0000-00000-00"] for flush in pump_flushes] == [{"deviceState": 1}, {"deviceState": 0}]
+    assert "tb-R0000-W000" in pump_flushes[1]
+    with session_factory() as session:
+        assert session.get(Actuator, "P0000-00000-00").status == "close"
+    assert "error" in service.update_actuator_status("V404", "open")
+
+
+def test_changing_state_valve_leaves_its_pump_running(session_factory, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    service = farm_control_service.FarmControlService(session_factory)
+    service.update_actuator_status("V0000-00000-00", "close")
+    service.update_actuator_status("V0000-00000-01", "open")
+
+    # As with the relationship walk, the valve no longer counts as open but the pump keeps running
+    service.update_actuator_status("V0000-00000-01", "changing state")
+    assert service.interlocks.open_valve_count("P0000-00000-00") == 0
+    assert service.get_actuator_by_id("P0000-00000-00")["status"] == "open"
+
+    service.update_actuator_status("V0000-00000-01", "close")
+    assert service.get_actuator_by_id("P0000-00000-00")["status"] == "close"
+
+
+def test_failed_emergency_stop_keeps_counters(session_factory, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    service = farm_control_service.FarmControlService(session_factory)
+    service.update_actuator_status("V0000-00000-00", "open")
+
+    def fail(session, transitions):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(service.event_log, "append", fail)
+
+    assert "error" in service.emergency_stop()
+    assert service.interlocks.open_valve_count("P0000-00000-00") == 1
+    with session_factory() as session:
+        assert session.get(Actuator, "V0000-00000-00").status == "open"
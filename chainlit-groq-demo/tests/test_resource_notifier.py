@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import asyncio
+from collections import Counter
+import pytest
+from models.models import init_db, get_session_factory
+from services.resource_notifier import ResourceNotifier, RESOURCE_LEVELS_URI
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+
+class RecordingSession:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.updates = []
+
+    async def send_resource_updated(self, uri):
+        if self.fail:
+            raise ConnectionError("client went away")
+        self.updates.append(uri)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "notify.db")))
+    TopologyImporter(session_factory).import_topology(generate_farm_topology(fields_per_farm=2))
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def test_bursts_are_coalesced_per_resource(service):
+    notifier = ResourceNotifier(service.topology, window=0.3)
+    service.add_change_listener(notifier.on_change)
+    session, gone = RecordingSession(), RecordingSession(fail=True)
+    valve, other = "actuators://V0000-00000-00", "actuators://V0000-00001-00"
+    field = "fields://F0000-00000/state"
+    resource_id = next(iter(service.topology.snapshot().resources))
+
+    def burst():
+        service.update_actuator_statuses(["V0000-00000-00"], "open")
+        service.update_actuator_statuses(["V0000-00000-00"], "close")
+        notifier.on_change("resource_level", {"resources": [{"resource_id": resource_id}]})
+        service.wait_for_background()
+
+    async def scenario():
+        for uri in (valve, other, field, RESOURCE_LEVELS_URI):
+            notifier.subscribe(uri, session)
+        notifier.subscribe(valve, gone)
+        await asyncio.to_thread(burst)
+        await asyncio.sleep(0.8)
+        first = Counter(session.updates)
+        # Structural changes notify every subscription
+        notifier.on_change("topology", {"entity": "field", "id": "F0000-00000"})
+        await asyncio.sleep(0.8)
+        return first
+
+    first = asyncio.run(scenario())
+    assert first == Counter({valve: 1, field: 1, RESOURCE_LEVELS_URI: 1})
+    assert Counter(session.updates) - first == Counter({valve: 1, other: 1, field: 1, RESOURCE_LEVELS_URI: 1})
+    stats = notifier.get_stats()
+    assert (stats["failed"], stats["subscriptions"], stats["pending"]) == (1, 4, 0)
+    assert stats["coalesced"] >= 1
@@ -0,0 +1,50 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import pytest
+from models.models import init_db, get_session_factory, Actuator, Resource
+from services.topology_cache import TopologyCache
+from services.resource_tick_engine import ResourceTickEngine
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+
+NOW = datetime.datetime(2025, 6, 1, 6, 0, 0)
+
+
+def seed(tmp_path):
+    session_factory = get_session_factory(init_db(str(tmp_path / "tick.db")))
+    topology = generate_farm_topology(fields_per_farm=2, valves_per_field=2, dispensers_per_field=0,
+                                      water_tanks_per_farm=1, now=NOW)
+    TopologyImporter(session_factory).import_topology(topology)
+    with session_factory() as session:
+        for actuator in session.query(Actuator):
+            actuator.base_speed = {"value": 3600, "unit": "L/h"}
+        for actuator_id in ("V0000-00000-00", "V0000-00001-00"):
+            valve = session.get(Actuator, actuator_id)
+            valve.status, valve.last_state_change = "open", NOW
+        tank = session.get(Resource, "R0000-W000")
+        tank.current_level = {"value": 1000, "unit": "L"}
+        session.commit()
+    return session_factory
+
+
+def test_tick_spreads_consumption_through_incidence(tmp_path):
+    session_factory = seed(tmp_path)
+    ticks = []
+    engine = ResourceTickEngine(session_factory, TopologyCache(session_factory), on_tick=ticks.append)
+
+    # Two valves at 1 L/s for 100 s on the same tank
+    result = engine.tick(now=NOW + datetime.timedelta(seconds=100))
+
+    assert result["actuators_updated"] == 2
+    assert [u["new_level"] for u in result["resource_updates"]] == [800.0]
+    assert sorted(result["reset_actuator_ids"]) == ["V0000-00000-00", "V0000-00001-00"]
+    assert len(ticks) == 1 and ticks[0]["thingsboard_ids"] == {"R0000-W000": "tb-R0000-W000"}
+
+    # Timers were reset, so the next tick only charges the new interval and clamps at zero
+    result = engine.tick(now=NOW + datetime.timedelta(seconds=1100))
+    assert result["resource_updates"][0]["consumption"] == pytest.approx(2000)
+    with session_factory() as session:
+        assert session.get(Resource, "R0000-W000").current_level == {"value": 0.0, "unit": "L"}
+        assert session.get(Actuator, "V0000-00000-00").last_state_change == NOW + datetime.timedelta(seconds=1100)
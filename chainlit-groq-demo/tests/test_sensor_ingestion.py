@@ -0,0 +1,88 @@
+import sys
+import os
+import threading
+from sqlalchemy import text
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+from models.models import init_db, get_session_factory, Sensor, SensorReading
+from services.sensor_ingestion import SensorIngestionPipeline
+
+
+def make_session_factory(tmp_path, sensor_count=10):
+    session_factory = get_session_factory(init_db(str(tmp_path / "ingest.db")))
+    with session_factory() as session:
+        session.add_all([Sensor(id=f"S{i}", type="soil_moisture") for i in range(sensor_count)])
+        session.commit()
+    return session_factory
+
+
+def test_ingest_validates_and_writes(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    pipeline = SensorIngestionPipeline(session_factory, batch_size=100, forward_to_thingsboard=False)
+    readings = [{"sensor_id": f"S{i % 10}", "key": "moisture", "value": i, "ts": 1718000000000 + i} for i in range(1000)]
+    readings.append({"sensor_id": "missing", "key": "moisture", "value": 1})
+    readings.append({"sensor_id": "S1", "key": "moisture", "value": "wet"})
+    readings.append({"sensor_id": "S2", "values": {"temperature": 21.5, "humidity": 60}})
+    # Malformed readings are rejected, not raised
+    readings.extend(["S3", {"sensor_id": "S3", "values": [1, 2]}, {"sensor_id": ["S3"], "value": 1}])
+
+    result = pipeline.ingest(readings)
+    pipeline.flush()
+    pipeline.stop()
+
+    # Counts are in readings; the last accepted reading holds two values
+    assert result["accepted"] == 1001 and result["rows"] == 1002
+    assert result["rejected"] == 5
+    assert [error["index"] for error in result["errors"]] == [1000, 1001, 1003, 1004, 1005]
+    with session_factory() as session:
+        assert session.query(SensorReading).count() == 1002
+    stats = pipeline.get_stats()
+    assert stats["stages"]["write"]["items"] == 1002
+
+
+def test_ingest_reports_backpressure_without_dropping(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    pipeline = SensorIngestionPipeline(session_factory, batch_size=10, max_pending_batches=1, forward_to_thingsboard=False)
+    pipeline.refresh_sensor_index()
+    release = threading.Event()
+
+    def blocked_session_factory():
+        release.wait()
+        return session_factory()
+
+    # Stall the writer so the bounded write queue fills up
+    pipeline.session_factory = blocked_session_factory
+    # Three values per reading: batches of 10 rows must not split a reading
+    readings = [{"sensor_id": "S0", "values": {"a": i, "b": i, "c": i}} for i in range(100)]
+    result = pipeline.ingest(readings, timeout=0.2)
+    assert result["backpressure"] is True
+    assert result["deferred"] == len(result["deferred_indices"]) > 0
+    assert result["accepted"] == 100 - result["deferred"]
+    assert result["rows"] == 3 * result["accepted"]
+    assert result["deferred_indices"] == list(range(100 - result["deferred"], 100))
+
+    release.set()
+    pipeline.flush()
+    pipeline.stop()
+    with session_factory() as session:
+        assert session.query(SensorReading).count() == result["rows"]
+
+
+def test_rows_the_database_refuses_are_isolated_and_dropped(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    with session_factory() as session:
+        session.execute(text("CREATE TRIGGER refuse_s9 BEFORE INSERT ON sensor_readings WHEN NEW.sensor_id = 'S9' "
+                             "BEGIN SELECT RAISE(ABORT, 'refused'); END"))
+        session.commit()
+    pipeline = SensorIngestionPipeline(session_factory, batch_size=50, forward_to_thingsboard=False, retry_delay=0)
+    readings = [{"sensor_id": f"S{i % 10}", "key": "moisture", "value": i} for i in range(200)]
+
+    result = pipeline.ingest(readings)
+    pipeline.flush()
+    pipeline.stop()
+
+    # The writer gives up on the refused rows instead of retrying them forever
+    assert result["accepted"] == 200
+    with session_factory() as session:
+        assert session.query(SensorReading).count() == 180
+    write = pipeline.get_stats()["stages"]["write"]
+    assert write["items"] == 180 and write["failed"] == 20
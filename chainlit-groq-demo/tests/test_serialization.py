@@ -0,0 +1,123 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import json
+import numpy as np
+import pytest
+from sqlalchemy.orm import joinedload
+from models.models import init_db, get_session_factory, Farm, Field
+from services.topology_importer import TopologyImporter
+from services import serialization
+from services.farm_control_service import FarmControlService
+from utils.farm_generator import generate_farm_topology
+
+NOW = datetime.datetime(2025, 6, 1, 6, 0, 0)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    session_factory = get_session_factory(init_db(str(tmp_path / "serialization.db")))
+    TopologyImporter(session_factory).import_topology(
+        generate_farm_topology(farms=2, fields_per_farm=3, open_fraction=0.5, now=NOW))
+    return session_factory
+
+
+def _sorted(value):
+    """Order nested lists by id so relationship order does not matter"""
+    if isinstance(value, list):
+        return sorted((_sorted(item) for item in value), key=lambda item: item["id"])
+    if isinstance(value, dict):
+        return {key: _sorted(item) for key, item in value.items()}
+    return value
+
+
+def test_full_tree_matches_to_dict(session_factory):
+    with session_factory() as session:
+        farms = session.query(Farm).options(
+            joinedload(Farm.fields).joinedload(Field.sensors),
+            joinedload(Farm.fields).joinedload(Field.actuators),
+            joinedload(Farm.fields).joinedload(Field.resources)
+        ).all()
+        expected = [farm.to_dict(include_related=True) for farm in farms]
+        tree = serialization.load_tree(session, "farm")
+
+    assert serialization.dumps(_sorted(tree)) == serialization.dumps(_sorted(expected))
+
+
+def test_projection_selects_only_requested_fields(session_factory):
+    with session_factory() as session:
+        tree = serialization.load_tree(session, "farm", "name, fields.crop, fields.actuators.status",
+                                       where=[Farm.id == "FM0001"])
+
+    assert len(tree) == 1 and set(tree[0]) == {"name", "fields"}
+    assert len(tree[0]["fields"]) == 3
+    assert set(tree[0]["fields"][0]) == {"crop", "actuators"}
+    assert {actuator["status"] for field in tree[0]["fields"] for actuator in field["actuators"]} <= {"open", "close"}
+    with pytest.raises(ValueError):
+        serialization.parse_fields("farm", ["fields.nope"])
+    with pytest.raises(ValueError):
+        serialization.Projection("field", ["id", "colour"])
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_encodes_consistently(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    value = {"ts": datetime.datetime(2025, 6, 1, 6, 30), "day": datetime.date(2025, 6, 1),
+             "hours": float("inf"), "rate": np.float64(2.5), "ids": {"A"}}
+
+    assert json.loads(serialization.dumps(value)) == {
+        "ts": "2025-06-01T06:30:00", "day": "2025-06-01", "hours": None, "rate": 2.5, "ids": ["A"]}
+
+
+def test_stream_json_respects_byte_cap_and_resumes(session_factory):
+    pages = []
+    after = None
+    while True:
+        with session_factory() as session:
+            records = serialization.iter_tree(session, "field", after=after, batch_size=2)
+            body = b"".join(serialization.stream_json(records, max_bytes=12000, collection="fields"))
+        assert len(body) <= 12000
+        page = json.loads(body)
+        pages.append(page)
+        after = serialization.decode_cursor(page["next_cursor"])
+        if after is None:
+            break
+
+    assert len(pages) > 1
+    assert [field["id"] for page in pages for field in page["fields"]] == sorted(
+        f"F{farm:04d}-{field:05d}" for farm in range(2) for field in range(3))
+
+
+def test_stream_json_skips_records_that_never_fit():
+    records = [{"id": "a", "blob": "x" * 10}, {"id": "b", "blob": "x" * 500}, {"id": "c"}]
+    page = json.loads(b"".join(serialization.stream_json(iter(records), max_bytes=200, head={"farm": "FM1"})))
+
+    assert page == {"farm": "FM1", "items": [{"id": "a", "blob": "x" * 10}, {"id": "c"}],
+                    "skipped": ["b"], "next_cursor": None}
+    with pytest.raises(ValueError):
+        serialization.decode_cursor("not a cursor")
+
+
+def test_service_filters_and_pages_in_sql(session_factory):
+    service = FarmControlService(session_factory)
+    pages = []
+    after = None
+    while True:
+        records = service.iter_actuators("name,status", after=after, limit=3, actuator_type="water_valves",
+                                         field_id="F0000-00001")
+        page = json.loads(b"".join(serialization.stream_json(records, collection="actuators", limit=2)))
+        pages.append(page["actuators"])
+        after = serialization.decode_cursor(page["next_cursor"])
+        if after is None:
+            break
+
+    assert [len(page) for page in pages] == [2, 2]
+    assert all(set(actuator) == {"id", "name", "status"} for page in pages for actuator in page)
+    assert [actuator["id"] for page in pages for actuator in page] == [f"V0000-00001-{i:02d}" for i in range(4)]
+
+    assert [farm["id"] for farm in service.iter_farms("id", name_contains="ARM 1")] == ["FM0001"]
+    assert list(service.iter_farms("id", name_prefix="Farm _")) == []
@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import threading
+import pytest
+from models.models import init_db, get_session_factory
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "shared.db")))
+    TopologyImporter(session_factory).import_topology(generate_farm_topology(fields_per_farm=2))
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def test_reads_share_one_session_and_snapshot(service):
+    valve = "V0000-00000-00"
+    before = service.get_actuator_by_id(valve)["status"]
+    sessions = []
+
+    with service.read_snapshot() as snapshot:
+        for _ in range(2):
+            with service.session_factory() as session:
+                sessions.append(session)
+        assert sessions[0] is sessions[1]
+        assert sessions[0].connection().connection.driver_connection.in_transaction
+
+        # A status published by another thread is not seen inside the scope
+        seen_outside = []
+        def publish():
+            service.topology.patch_actuators({valve: {"status": "open" if before != "open" else "close"}})
+            seen_outside.append(service.get_actuator_by_id(valve)["status"])
+        worker = threading.Thread(target=publish)
+        worker.start()
+        worker.join(5)
+
+        assert service.get_actuator_by_id(valve)["status"] == before
+        assert service.topology.snapshot() is snapshot
+        assert seen_outside and seen_outside[0] != before
+
+    # Outside the scope: fresh sessions and the current snapshot
+    with service.session_factory() as first, service.session_factory() as second:
+        assert first is not second and first is not sessions[0]
+    assert service.get_actuator_by_id(valve)["status"] != before
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import pytest
+from models.models import init_db, get_session_factory
+from services.state_versions import StateVersions
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+
+def test_changes_since_token():
+    versions = StateVersions()
+    start = versions.token
+    versions.touch("actuator", ["A1", "A2"])
+    middle = versions.token
+    versions.touch("resource", ["R1"])
+    versions.touch("actuator", ["A2"])
+
+    assert versions.changes("actuator", start) == (versions.token, {"A1", "A2"})
+    assert versions.changes("actuator", middle)[1] == {"A2"}
+    assert versions.changes("actuator", versions.token)[1] == set()
+    # Missing, foreign and future tokens ask for a full answer
+    assert versions.changes("actuator", None)[1] is None
+    assert versions.changes("actuator", "other.1")[1] is None
+    assert versions.changes("actuator", f"{versions.epoch}.99")[1] is None
+
+    versions.on_change("topology", {"entity": "field", "id": "F1"})
+    assert versions.changes("resource", middle)[1] is None
+    assert versions.changes("resource", versions.token)[1] == set()
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "versions.db")))
+    TopologyImporter(session_factory).import_topology(generate_farm_topology(fields_per_farm=2, valves_per_field=2))
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def test_writes_advance_the_version(service):
+    first = service.get_resource_levels_since()
+    assert first["full"] and len(first["resources"]) == 3
+    assert service.get_resource_levels_since(first["version"]) == {"version": first["version"], "not_modified": True}
+
+    token, _ = service.versions.changes("actuator")
+    service.update_actuator_statuses(["V0000-00000-00"], "open")
+    _, changed = service.versions.changes("actuator", token)
+    # The valve and the pump it switched on
+    assert changed == {"V0000-00000-00", "P0000-00000-00"}
+
+    token, _ = service.versions.changes("actuator")
+    service.emergency_stop()
+    assert service.versions.changes("actuator", token)[1] == {"V0000-00000-00", "P0000-00000-00"}
+    service.wait_for_background()
@@ -0,0 +1,52 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import threading
+import requests
+import utils.thingsboard as thingsboard
+
+
+class _Response:
+    status_code = 200
+    text = "ok"
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+def test_batch_reports_unreachable_thingsboard_per_device(monkeypatch):
+    def unreachable(url, **kwargs):
+        raise requests.ConnectionError("connection refused")
+
+    monkeypatch.setattr(thingsboard, "jwt_token", None)
+    monkeypatch.setattr(thingsboard.requests, "post", unreachable)
+    assert thingsboard.send_telemetry_batch({"tb-1": {"level": 1}, "tb-2": {"level": 2}}) == {"tb-1": False, "tb-2": False}
+
+
+def test_batch_sends_devices_concurrently_and_isolates_failures(monkeypatch):
+    threads = set()
+
+    def get(url, **kwargs):
+        if "tb-bad" in url:
+            raise requests.ConnectionError("timed out")
+        return _Response({"credentialsId": url.split("/")[-2] + "-token"})
+
+    def post(url, **kwargs):
+        threads.add(threading.current_thread().name)
+        return _Response({})
+
+    monkeypatch.setattr(thingsboard, "jwt_token", "jwt")
+    monkeypatch.setattr(thingsboard, "device_token_cache", {})
+    monkeypatch.setattr(thingsboard.requests, "get", get)
+    monkeypatch.setattr(thingsboard.requests, "post", post)
+
+    devices = {f"tb-{i}": {"level": i} for i in range(4)}
+    devices["tb-bad"] = {"level": 0}
+    results = thingsboard.send_telemetry_batch(devices)
+
+    assert results == {**{f"tb-{i}": True for i in range(4)}, "tb-bad": False}
+    assert all(name.startswith("tb-telemetry") for name in threads)
+    assert thingsboard.send_telemetry_batch({}) == {}
@@ -0,0 +1,60 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import pytest
+from models.models import init_db, get_session_factory
+from services.tool_cache import ToolResultCache
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "cache.db")))
+    TopologyImporter(session_factory).import_topology(generate_farm_topology(farms=2, fields_per_farm=2))
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def test_hits_expiry_and_lru_bound(service):
+    cache = ToolResultCache(service.topology, max_bytes=20, ttls={"short": 0.0})
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert cache.get_or_compute("tool", {"a": 1, "b": 2}, lambda: compute("x" * 8)) == "x" * 8
+    # Argument order does not matter
+    assert cache.get_or_compute("tool", {"b": 2, "a": 1}, lambda: compute("never")) == "x" * 8
+    cache.get_or_compute("short", {}, lambda: compute("y"))
+    cache.get_or_compute("short", {}, lambda: compute("y"))
+    # Over 20 bytes: the least recently used entry goes
+    cache.get_or_compute("tool", {"a": 2}, lambda: compute("z" * 12))
+
+    stats = cache.get_stats()
+    assert calls == ["x" * 8, "y", "y", "z" * 12]
+    assert (stats["hits"], stats["misses"], stats["expired"], stats["evictions"]) == (1, 4, 1, 1)
+    assert stats["tools"]["tool"] == {"hits": 1, "misses": 2}
+    assert stats["bytes"] <= 20
+
+
+def test_writes_invalidate_only_affected_entries(service):
+    cache = ToolResultCache(service.topology)
+    service.add_change_listener(cache.on_change)
+    for farm_id in ("FM0000", "FM0001"):
+        cache.get_or_compute("get_farm_details", {"farm_id": farm_id}, lambda: farm_id, [("farm", farm_id)])
+    cache.get_or_compute("find_field_by_name", {"field_name": "Field 1-1"}, lambda: "F1", [("field", "F0001-00001")])
+
+    service.update_actuator_statuses(["V0000-00001-00"], "open")
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["invalidated"]) == (2, 1)
+
+    service.update_actuator_statuses(["V0001-00001-00"], "open")
+    assert cache.get_stats()["entries"] == 0
+
+    # A result computed while an invalidation ran is not stored
+    cache.get_or_compute("get_farm_details", {"farm_id": "FM0000"},
+                         lambda: cache.invalidate([("farm", "FM0001")]) or "stale", [("farm", "FM0000")])
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import asyncio
+import inspect
+import threading
+from services.tool_executor import ToolExecutor
+
+
+def test_slow_admin_tool_does_not_block_other_calls():
+    executor = ToolExecutor(lanes={"default": 2, "admin": 1})
+    started, release = threading.Event(), threading.Event()
+
+    def sync_devices():
+        started.set()
+        release.wait(5)
+        return "synced"
+
+    def get_status(actuator_id: str, verbose: bool = False) -> str:
+        """Status of one actuator"""
+        return f"{actuator_id}:{threading.current_thread().name}"
+
+    slow = executor.wrap(sync_devices, lane="admin", max_concurrent=1)
+    fast = executor.wrap(get_status)
+    # FastMCP builds the tool from the wrapper's name, docstring and signature
+    assert inspect.iscoroutinefunction(fast)
+    assert (fast.__name__, fast.__doc__) == ("get_status", "Status of one actuator")
+    assert list(inspect.signature(fast).parameters) == ["actuator_id", "verbose"]
+
+    async def scenario():
+        admin_calls = [asyncio.ensure_future(slow()) for _ in range(2)]
+        assert await asyncio.to_thread(started.wait, 5)
+        # Reads finish on the default lane while the admin lane is busy and its second call waits
+        results = await asyncio.wait_for(asyncio.gather(fast("V1"), fast("V2", verbose=True)), 2)
+        assert [r.split(":")[0] for r in results] == ["V1", "V2"]
+        assert all(r.split(":")[1].startswith("tool-default") for r in results)
+        stats = executor.get_stats()
+        assert stats["lanes"]["admin"] == {"workers": 1, "running": 1, "queued": 1}
+        release.set()
+        return await asyncio.gather(*admin_calls)
+
+    assert asyncio.run(scenario()) == ["synced", "synced"]
+    stats = executor.get_stats()
+    assert stats["tools"]["get_status"]["calls"] == 2
+    assert stats["tools"]["sync_devices"]["queue_time_ms"]["max"] > stats["tools"]["get_status"]["queue_time_ms"]["max"]
+    assert stats["lanes"]["admin"]["queued"] == 0
+    executor.shutdown()
+
+
+def test_errors_are_counted_and_raised():
+    executor = ToolExecutor()
+
+    def broken():
+        raise ValueError("bad input")
+
+    async def scenario():
+        try:
+            await executor.wrap(broken)()
+        except ValueError as e:
+            return str(e)
+
+    assert asyncio.run(scenario()) == "bad input"
+    tool_stats = executor.get_stats()["tools"]["broken"]
+    assert (tool_stats["calls"], tool_stats["errors"], tool_stats["running"]) == (1, 1, 0)
+    executor.shutdown()
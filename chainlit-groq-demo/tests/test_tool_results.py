@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import asyncio
+import datetime
+import json
+from types import SimpleNamespace
+import pytest
+from models.models import init_db, get_session_factory
+from services.tool_cache import ToolResultCache
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+types = pytest.importorskip("mcp.types", exc_type=ImportError)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    # The server opens farm_control.db in the working directory when imported
+    monkeypatch.chdir(tmp_path)
+    server = pytest.importorskip("farm_control_server", exc_type=ImportError)
+    session_factory = get_session_factory(init_db(str(tmp_path / "tools.db")))
+    TopologyImporter(session_factory).import_topology(generate_farm_topology(fields_per_farm=2))
+    service = farm_control_service.FarmControlService(session_factory)
+    cache = ToolResultCache(service.topology)
+    service.add_change_listener(cache.on_change)
+    monkeypatch.setattr(server, "farm_service", service)
+    monkeypatch.setattr(server, "tool_cache", cache)
+    return server
+
+
+def call(server, name, arguments):
+    """Call a tool through FastMCP and wrap its content the way the client receives it"""
+    content = asyncio.run(server.mcp.call_tool(name, arguments))
+    return types.CallToolResult(content=list(content), isError=False)
+
+
+def test_tools_return_compact_json(server):
+    result = call(server, "get_actuator_status", {"actuator_id": "V0000-00000-00"})
+
+    assert len(result.content) == 1
+    text = result.content[0].text
+    actuator = json.loads(text)
+    assert text == json.dumps(actuator, separators=(",", ":"), ensure_ascii=False)
+    assert actuator["id"] == "V0000-00000-00"
+    datetime.datetime.fromisoformat(actuator["created_at"])
+
+    missing = call(server, "find_field_by_name", {"field_name": "Nowhere"})
+    assert json.loads(missing.content[0].text) == {"error": "Field 'Nowhere' not found"}
+
+
+def test_client_reads_tool_json_once(server):
+    app = pytest.importorskip("app", exc_type=ImportError)
+    result = call(server, "get_field_actuators", {"field_id": "F0000-00000", "fields": "id,status"})
+    text = result.content[0].text
+
+    # The LLM gets the server's text unchanged; display code gets it parsed
+    assert app.tool_message_content(result) == text
+    parsed = app.serialize_tool_result(result)
+    assert parsed == json.loads(text)
+    assert {tuple(actuator) for actuator in parsed["actuators"]} == {("id", "status")}
+
+    formatted = app.format_farm_response("get_field_actuators", result, "which valves are open?")
+    heading, body = formatted.split("\n\n", 1)
+    assert heading == "⚙️ **Control Action**"
+    assert json.loads(body) == parsed
+
+
+def test_client_prefers_structured_content_and_keeps_plain_text():
+    app = pytest.importorskip("app", exc_type=ImportError)
+    structured = SimpleNamespace(structuredContent={"status": "open"},
+                                 content=[types.TextContent(type="text", text='{"status":"open"}')])
+    assert app.serialize_tool_result(structured) == {"status": "open"}
+
+    plain = types.CallToolResult(content=[types.TextContent(type="text", text="Pump started")], isError=False)
+    assert app.serialize_tool_result(plain) == {"type": "text", "text": "Pump started"}
+    assert app.tool_message_content(plain) == "Pump started"
+    assert app.format_farm_response("speak", plain, "") == "ℹ️ **Speak**\n\nPump started"
@@ -0,0 +1,108 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import threading
+import pytest
+from sqlalchemy import update
+from models.models import init_db, get_session_factory, Actuator
+from services.topology_cache import TopologyCache, OverlayMap
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+
+VALVE, PUMP, FIELD = "V0000-00000-00", "P0000-00000-00", "F0000-00000"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    session_factory = get_session_factory(init_db(str(tmp_path / "topology.db")))
+    TopologyImporter(session_factory).import_topology(generate_farm_topology(fields_per_farm=2, valves_per_field=2))
+    return session_factory
+
+
+def _set_status(session_factory, actuator_id, status):
+    with session_factory() as session:
+        session.execute(update(Actuator).where(Actuator.id == actuator_id).values(status=status))
+        session.commit()
+
+
+def test_lookups(session_factory):
+    snapshot = TopologyCache(session_factory).snapshot()
+
+    assert snapshot.field_ids_by_name(snapshot.fields[FIELD]["name"]) == (FIELD,)
+    pump = snapshot.actuator_dict(PUMP)
+    assert {valve["id"] for valve in pump["linked_valves"]} == {VALVE, "V0000-00000-01", "D0000-00000-00"}
+    assert snapshot.actuator_dict(VALVE)["linked_pumps"] == [{"id": PUMP, "name": pump["name"]}]
+    field = snapshot.field_dict(FIELD)
+    assert {a["id"] for a in field["actuators"]} == {a["id"] for a in snapshot.actuators_for_field(FIELD)}
+    assert len(field["sensors"]) == 4 and len(field["resources"]) == 2
+    assert snapshot.sensors_for_field(FIELD)[0]["field"]["id"] == FIELD
+    assert snapshot.actuator_dict("missing") is None and snapshot.field_dict("missing") is None
+
+    # Records are copied on access
+    snapshot.actuator_dict(VALVE)["status"] = "broken"
+    assert snapshot.actuators[VALVE]["status"] != "broken"
+
+
+def test_invalidate_and_max_age_reload(session_factory):
+    cache = TopologyCache(session_factory)
+    first = cache.snapshot()
+    _set_status(session_factory, VALVE, "open")
+    assert cache.snapshot() is first
+
+    cache.invalidate()
+    second = cache.snapshot()
+    assert second is not first and second.version > first.version
+    assert second.actuators[VALVE]["status"] == "open"
+
+    # Writes from another process are picked up once the snapshot is max_age old
+    cache.max_age = 0.0
+    _set_status(session_factory, VALVE, "close")
+    assert cache.snapshot().actuators[VALVE]["status"] == "close"
+
+
+def test_pinned_snapshot_is_per_thread(session_factory):
+    cache = TopologyCache(session_factory)
+    with cache.pinned() as pinned:
+        cache.patch_actuators({VALVE: {"status": "open"}})
+        assert cache.snapshot() is pinned
+        assert pinned.actuators[VALVE]["status"] == "close"
+
+        seen = []
+        worker = threading.Thread(target=lambda: seen.append(cache.snapshot()))
+        worker.start()
+        worker.join(5)
+        assert seen[0] is not pinned and seen[0].actuators[VALVE]["status"] == "open"
+
+        with cache.pinned() as nested:
+            assert nested is pinned
+    assert cache.snapshot() is seen[0]
+
+
+def test_patches_share_unchanged_records(session_factory):
+    cache = TopologyCache(session_factory)
+    base = cache.snapshot()
+    actuator_ids = list(base.actuators)
+
+    for i in range(200):
+        cache.patch_actuators({actuator_ids[i % 3]: {"status": "open" if i % 2 else "close"}})
+    snapshot = cache.snapshot()
+
+    assert snapshot.version == base.version + 200
+    assert snapshot.actuators.depth <= 8
+    assert [snapshot.actuators[aid]["status"] for aid in actuator_ids[:3]] == ["close", "open", "open"]
+    assert dict(snapshot.actuators).keys() == dict(base.actuators).keys()
+    assert snapshot.actuators[actuator_ids[3]] is base.actuators[actuator_ids[3]]
+    assert base.actuators[actuator_ids[1]]["status"] == "close"
+
+    # Unknown ids are ignored
+    cache.patch_resources({"missing": {"current_level": 1}})
+    assert "missing" not in cache.snapshot().resources
+
+
+def test_overlay_map_folds_layers_into_base():
+    overlay = OverlayMap({key: {"n": 0} for key in range(16)})
+    for key in range(8):
+        overlay = overlay.replaced({key: {"n": key}})
+    assert overlay.depth == 0
+    assert [overlay[key]["n"] for key in range(10)] == [0, 1, 2, 3, 4, 5, 6, 7, 0, 0]
+    assert overlay.replaced({99: {"n": 1}}) is overlay
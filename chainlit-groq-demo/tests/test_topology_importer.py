@@ -0,0 +1,143 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import csv
+import json
+import datetime
+from models.models import (
+    init_db, get_session_factory, Farm, Field, Actuator, Resource, SensorReading, IrrigationSchedule, ActuatorEvent
+)
+from services.topology_importer import TopologyImporter
+
+TOPOLOGY = {
+    "farms": [{
+        "id": "FM1", "name": "Farm",
+        "fields": [{
+            "id": "F1", "name": "North Field",
+            "sensors": [{"id": "S1", "type": "soil_moisture"}],
+            "actuators": [
+                {"id": "P1", "name": "Pump", "type": "pumps", "linked_valves": ["V1", "D1"], "resources": ["R1"]},
+                {"id": "V1", "name": "Valve", "type": "water_valves", "status": "close"},
+                {"id": "D1", "name": "Dispenser", "type": "fertilizer_dispensers", "resources": ["R2"]}
+            ],
+            "resources": [{"id": "R1", "name": "Tank", "capacity": {"value": 1000, "unit": "L"}}]
+        }]
+    }],
+    "resources": [{"id": "R2", "name": "Fertilizer", "farm_id": "FM1", "fields": ["F1"]}]
+}
+
+
+def _importer(tmp_path):
+    session_factory = get_session_factory(init_db(str(tmp_path / "import.db")))
+    return session_factory, TopologyImporter(session_factory)
+
+
+def test_import_nested_json(tmp_path):
+    session_factory, importer = _importer(tmp_path)
+    path = tmp_path / "topology.json"
+    path.write_text(json.dumps(TOPOLOGY))
+
+    report = importer.import_file(str(path))
+
+    assert report["status"] == "imported"
+    assert report["tables"] == {
+        "farms": 1, "fields": 1, "sensors": 1, "actuators": 3, "resources": 2,
+        "field_resource_association": 2, "actuator_resource_association": 2, "pump_valve_association": 2
+    }
+    with session_factory() as session:
+        assert session.get(Field, "F1").farm_id == "FM1"
+        assert {valve.id for valve in session.get(Actuator, "P1").linked_valves} == {"V1", "D1"}
+        tank = session.get(Resource, "R1")
+        assert (tank.farm_id, tank.field_id, tank.capacity["unit"]) == ("FM1", "F1", "L")
+
+
+def test_import_csv_directory(tmp_path):
+    session_factory, importer = _importer(tmp_path)
+    tables = {
+        "farms": [{"id": "FM1", "name": "Farm", "gps_lat": "45.5", "gps_long": ""}],
+        "fields": [{"id": "F1", "farm_id": "FM1", "name": "North Field"}],
+        "actuators": [
+            {"id": "P1", "field_id": "F1", "name": "Pump", "type": "pumps", "linked_valves": "V1;V2", "base_speed": ""},
+            {"id": "V1", "field_id": "F1", "name": "Valve", "type": "water_valves", "linked_valves": "", "base_speed": ""},
+            {"id": "V2", "field_id": "F1", "name": "Valve", "type": "water_valves", "linked_valves": "",
+             "base_speed": json.dumps({"value": 10, "unit": "L/min"})}
+        ],
+        "resources": [{"id": "R1", "farm_id": "FM1", "name": "Tank", "current_level": json.dumps({"value": 500, "unit": "L"})}],
+        "field_resource_association": [{"field_id": "F1", "resource_id": "R1"}]
+    }
+    for name, rows in tables.items():
+        with open(tmp_path / f"{name}.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    report = importer.import_file(str(tmp_path))
+
+    assert report["status"] == "imported"
+    assert report["tables"]["pump_valve_association"] == 2
+    with session_factory() as session:
+        farm = session.get(Farm, "FM1")
+        assert (farm.gps_lat, farm.gps_long) == (45.5, None)
+        assert session.get(Actuator, "V2").base_speed == {"value": 10, "unit": "L/min"}
+        assert session.get(Resource, "R1").current_level["value"] == 500
+
+
+def test_import_rejects_dangling_references(tmp_path):
+    session_factory, importer = _importer(tmp_path)
+    topology = {
+        "farms": [{"id": "FM1", "name": "Farm"}],
+        "fields": [{"id": "F1", "farm_id": "FM1", "name": "North Field",
+                    "actuators": [{"id": "P1", "name": "Pump", "type": "pumps", "linked_valves": ["V404"]}]}]
+    }
+    report = importer.import_topology(topology)
+
+    assert "error" in report
+    with session_factory() as session:
+        assert session.query(Actuator).count() == 0
+
+
+def test_reimport_requires_replace(tmp_path):
+    session_factory, importer = _importer(tmp_path)
+    assert importer.import_topology(TOPOLOGY)["status"] == "imported"
+
+    report = importer.import_topology(TOPOLOGY)
+    assert "duplicate id FM1" in report["details"][0]
+
+    report = importer.import_topology(TOPOLOGY, replace=True)
+    assert report["status"] == "imported"
+    with session_factory() as session:
+        assert session.query(Actuator).count() == 3
+
+
+def test_rows_without_id_fail_validation(tmp_path):
+    session_factory, importer = _importer(tmp_path)
+    topology = {
+        "farms": [{"name": "Farm", "fields": [{"name": "North Field", "actuators": [{"name": "Pump", "type": "pumps"}],
+                                               "resources": [{"name": "Tank"}]}]}],
+        "pump_valve_association": [{"pump_id": "P1"}]
+    }
+    report = importer.import_topology(topology)
+
+    assert report["error"] == "Topology validation failed"
+    for message in ("farms: row without id", "fields: row without id", "actuators: row without id",
+                    "resources: row without id", "pump_valve_association: row without valve_id"):
+        assert any(detail.startswith(message) for detail in report["details"]), message
+
+
+def test_replace_clears_data_recorded_against_the_old_topology(tmp_path):
+    session_factory, importer = _importer(tmp_path)
+    importer.import_topology(TOPOLOGY)
+    now = datetime.datetime.now()
+    with session_factory() as session:
+        session.add(SensorReading(sensor_id="S1", key="moisture", value=40.0, ts=now))
+        session.add(IrrigationSchedule(id="IS1", field_id="F1", start_time="06:00", duration_minutes=30))
+        session.add(ActuatorEvent(actuator_id="V1", field_id="F1", from_status="close", to_status="open", ts=now))
+        session.commit()
+
+    report = importer.import_topology(TOPOLOGY, replace=True)
+
+    assert report["cleared"] == {"sensor_readings": 1, "irrigation_schedules": 1, "actuator_events": 1,
+                                 "event_cursors": 0, "usage_rollups": 0}
+    with session_factory() as session:
+        for model in (SensorReading, IrrigationSchedule, ActuatorEvent):
+            assert session.query(model).count() == 0
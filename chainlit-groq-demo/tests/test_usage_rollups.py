@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datetime
+import pytest
+from models.models import init_db, get_session_factory, Actuator, UsageRollup
+from services.topology_importer import TopologyImporter
+from utils.farm_generator import generate_farm_topology
+import services.farm_control_service as farm_control_service
+
+LATE = datetime.datetime(2025, 6, 2, 23, 0, 0)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(farm_control_service, "send_telemetry_batch", lambda telemetry: {})
+    session_factory = get_session_factory(init_db(str(tmp_path / "usage.db")))
+    topology = generate_farm_topology(fields_per_farm=1, valves_per_field=2, dispensers_per_field=0)
+    for actuator in topology["actuators"]:
+        actuator["base_speed"] = {"value": 3600, "unit": "L/h"}
+    TopologyImporter(session_factory).import_topology(topology)
+    return farm_control_service.FarmControlService(session_factory)
+
+
+def test_intervals_are_split_per_day_and_scope(service):
+    with service.session_factory() as session:
+        with session.begin():
+            service.usage.record(session, [
+                ("V0000-00000-00", LATE, LATE + datetime.timedelta(hours=2), {"value": 3600, "unit": "L/h"}),
+                ("P0000-00000-00", LATE, LATE + datetime.timedelta(hours=2), {"value": 3600, "unit": "L/h"})])
+            # A later settlement of the same day adds up
+            service.usage.record(session, [
+                ("V0000-00000-00", LATE + datetime.timedelta(hours=3), LATE + datetime.timedelta(hours=4), 3600)])
+        rows = {(r.scope, r.key, r.day): (r.runtime_seconds, r.volume) for r in session.query(UsageRollup)}
+
+    assert rows[("actuator", "V0000-00000-00", "2025-06-02")] == (3600, 3600)
+    assert rows[("actuator", "V0000-00000-00", "2025-06-03")] == (7200, 7200)
+    # Pump time counts as field runtime but its volume is delivered through the valves
+    assert rows[("field", "F0000-00000", "2025-06-03")] == (3600 + 7200, 7200)
+    assert rows[("resource", "R0000-W000", "2025-06-02")] == (7200, 7200)
+
+    now = LATE + datetime.timedelta(hours=5)
+    usage = service.usage.usage("actuator", ["V0000-00000-00", "P0000-00000-00"],
+                                datetime.date(2025, 6, 3), datetime.date(2025, 6, 3), now=now)
+    assert usage == {"V0000-00000-00": {"runtime_seconds": 7200, "volume": 7200},
+                     "P0000-00000-00": {"runtime_seconds": 3600, "volume": 3600}}
+    with pytest.raises(ValueError):
+        service.usage.usage("farm", ["FM0000"], now.date(), now.date())
+
+
+def test_closing_and_ticks_feed_rollups(service):
+    opened_at = datetime.datetime.now() - datetime.timedelta(minutes=30)
+    with service.session_factory() as session:
+        valve = session.get(Actuator, "V0000-00000-00")
+        valve.status, valve.last_state_change = "open", opened_at
+        session.commit()
+
+    service.update_all_open_actuator_resources()
+    service.update_actuator_statuses(["V0000-00000-00"], "close")
+
+    report = service.get_usage_report("actuator", field_name="Field 0-0", actuator_type="water_valves", days=2)
+    runtime = {entry["id"]: entry["runtime_seconds"] for entry in report["usage"]}
+    assert runtime["V0000-00000-00"] == pytest.approx(1800, abs=5)
+    assert runtime["V0000-00000-01"] == 0
+    assert "error" in service.get_usage_report("field", field_name="Nowhere")